@@ -2,24 +2,66 @@
 Optimized LangChain Agent with Google Calendar Tools
 """
 
-from langchain.agents import initialize_agent, AgentType
+from langchain.agents import initialize_agent, AgentType, AgentExecutor
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.tools import tool
 from langchain.memory import ConversationBufferMemory
-from langchain.schema import HumanMessage
-from datetime import datetime, timedelta
+from langchain.schema import HumanMessage, AIMessage
+from langchain_core.chat_history import BaseChatMessageHistory
+from datetime import datetime, timedelta, timezone
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import os
 import json
 import tempfile
+import time
+import heapq
+import uuid
 from dotenv import load_dotenv
 from typing import Optional
+from model_router import ModelRouter, RoutedChatModel
+from calendar_client import CalendarReader
+from event_store import EventStore
+from prefetch import Prefetcher, adjacent_window
+from snapshot import Snapshot
+from availability import (BusyIndex, find_free_slots, get_availability_calendars, merge_busy, parallel_map,
+                          parse_working_hours, plan_moves)
+from zoneinfo import ZoneInfo
+from meeting_solver import PREFERENCES, WorkingHours, solve_meeting_time
+from idempotency import IdempotencyStore, booking_key, deterministic_event_id
+from calendar_watch import WatchManager
+from ics import import_events, iter_ics, iter_ics_events
+from state import get_state
+from prompt_builder import PREFIX, PromptBuilder
+from jobs import JobQueue
 
 load_dotenv()
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Gemini models in preference order; the router tracks latency and errors per model
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-2.0-flash-lite,gemini-1.5-flash").split(",") if m.strip()]
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "1"))
+GEMINI_HEDGING = os.getenv("GEMINI_HEDGING", "false").lower() == "true"
+
+# Free-time search settings
+CALENDAR_TIMEZONE = ZoneInfo(os.getenv("CALENDAR_TIMEZONE", "UTC"))
+WORK_START, WORK_END = parse_working_hours(os.getenv("WORKING_HOURS", "09:00-17:00"))
+WORKING_DAYS = [int(d) for d in os.getenv("WORKING_DAYS", "0,1,2,3,4").split(",")]
+MEETING_BUFFER_MINUTES = int(os.getenv("MEETING_BUFFER_MINUTES", "0"))
+MAX_SEARCH_DAYS = 60
+ORGANIZER_HOURS = WorkingHours(CALENDAR_TIMEZONE, WORK_START, WORK_END, WORKING_DAYS)
+# Optional per-attendee hours: {"alice@example.com": {"timezone": "Europe/London", "hours": "09:00-17:00", "days": "0,1,2,3,4"}}
+ATTENDEE_HOURS = {
+    email: WorkingHours(
+        ZoneInfo(spec.get("timezone", str(CALENDAR_TIMEZONE))),
+        *parse_working_hours(spec.get("hours", os.getenv("WORKING_HOURS", "09:00-17:00"))),
+        [int(d) for d in str(spec.get("days", "0,1,2,3,4")).split(",")]
+    )
+    for email, spec in json.loads(os.getenv("ATTENDEE_WORKING_HOURS", "{}")).items()
+}
+
 def get_credentials():
     """Get credentials from file or environment variable"""
     # First try environment variable (for Railway deployment)
@@ -43,9 +85,9 @@ def get_credentials():
     
     raise FileNotFoundError("No valid credentials found. Set GOOGLE_CREDENTIALS_JSON environment variable or place credentials.json file.")
 
-def get_calendar_service():
+def get_calendar_service(credentials=None):
     """Get Google Calendar service with cached credentials"""
-    credentials = get_credentials()
+    credentials = credentials or get_credentials()
     return build('calendar', 'v3', credentials=credentials)
 
 def get_calendar_id(service):
@@ -59,37 +101,62 @@ def get_calendar_id(service):
     except:
         return 'primary'
 
-calendar_service = get_calendar_service()
+calendar_credentials = get_credentials()
+calendar_service = get_calendar_service(calendar_credentials)
+calendar_reader = CalendarReader(calendar_service, calendar_credentials)
+event_store = EventStore(calendar_reader, ttl=float(os.getenv("CALENDAR_CACHE_TTL", "60")))
+SNAPSHOT_PATH = os.getenv("CALENDAR_SNAPSHOT_PATH", "calendar_snapshot.db")
+SNAPSHOT_INTERVAL = float(os.getenv("CALENDAR_SNAPSHOT_INTERVAL", "60"))
+calendar_snapshot = Snapshot(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+if calendar_snapshot:
+    try:
+        loaded = calendar_snapshot.load(event_store)
+        print(f"📦 Loaded {loaded} events from calendar snapshot in {calendar_snapshot.load_ms} ms")
+    except Exception as e:
+        print(f"⚠️ Could not load calendar snapshot: {e}")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+idempotency_store = IdempotencyStore(ttl=IDEMPOTENCY_TTL, state=get_state())
 CALENDAR_ID = get_calendar_id(calendar_service)
+AVAILABILITY_CALENDARS = get_availability_calendars(calendar_service, CALENDAR_ID, os.getenv("AVAILABILITY_CALENDARS", ""))
+prefetcher = Prefetcher(event_store, budget=int(os.getenv("PREFETCH_BUDGET", "20")))
 
-def format_datetime(datetime_str: str) -> str:
-    """Format datetime string for display with improved error handling"""
-    try:
-        if 'T' in datetime_str:
-            dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-            return dt.strftime('%B %d, %Y at %I:%M %p')
-        return datetime_str
-    except (ValueError, AttributeError):
-        return datetime_str
-
-def get_time_status(event_start: str, current_time: datetime) -> str:
-    """Get time status for an event (past, present, future)"""
-    try:
-        if 'T' not in event_start:
-            return ""
-        
-        event_dt = datetime.fromisoformat(event_start.replace('Z', '+00:00')).replace(tzinfo=None)
-        event_end_dt = event_dt + timedelta(hours=1)
-        
-        if event_end_dt < current_time:
-            return " (already finished)"
-        elif event_dt <= current_time <= event_end_dt:
-            return " (happening now!)"
-        elif event_dt > current_time:
-            return " (upcoming)"
-        return ""
-    except (ValueError, AttributeError):
-        return ""
+def query_snapshot(time_min: str, time_max: str, limit: Optional[int] = None):
+    """Read-only fallback when the Calendar API fails: (events, as_of, covered) as last seen, or None.
+
+    covered is False when part of the range was never fetched, so an empty result there means unknown, not free.
+    """
+    results = [event_store.query_local(calendar_id, time_min, time_max, limit) for calendar_id in AVAILABILITY_CALENDARS]
+    known = [as_of for _, as_of, _ in results if as_of is not None]
+    if not known:
+        return None
+    merged = list(heapq.merge(*(events for events, _, _ in results), key=lambda e: e.start))
+    return (merged[:limit] if limit else merged), min(known), all(covered for _, _, covered in results)
+
+def prefetch_around(day):
+    """Warm the neighbouring days and the rest of the week so follow-up questions are answered locally"""
+    prefetcher.prefetch(AVAILABILITY_CALENDARS, *adjacent_window(day, CALENDAR_TIMEZONE))
+
+def utc_timestamp(moment: datetime) -> str:
+    """RFC 3339 UTC string for an aware datetime, as the Calendar API expects for timeMin/timeMax"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def get_busy_intervals(time_min: str, time_max: str) -> list:
+    """Merged busy time across all availability calendars from a single freebusy request"""
+    return merge_busy(calendar_reader.freebusy(AVAILABILITY_CALENDARS, time_min, time_max))
+
+def query_all_calendars(time_min: str, time_max: str, limit: Optional[int] = None) -> list:
+    """Events from every availability calendar, fetched concurrently and merged by start time"""
+    def query_one(calendar_id):
+        try:
+            return event_store.query(calendar_id, time_min, time_max, limit=limit)
+        except Exception as e:
+            if calendar_id == CALENDAR_ID:
+                raise
+            print(f"⚠️ Skipping calendar {calendar_id}: {e}")
+            return []
+    
+    merged = list(heapq.merge(*parallel_map(query_one, AVAILABILITY_CALENDARS), key=lambda e: e.start))
+    return merged[:limit] if limit else merged
 
 # Define LangChain tools using the @tool decorator
 @tool
@@ -103,49 +170,162 @@ def check_calendar_availability(date_str: Optional[str] = None) -> str:
             time_max = (datetime.utcnow() + timedelta(days=30)).isoformat() + 'Z'
             query_description = "all upcoming meetings (next 30 days)"
         elif date_str:
-            target_date = datetime.strptime(date_str, '%Y-%m-%d')
-            time_min = target_date.replace(hour=0, minute=0, second=0).isoformat() + 'Z'
-            time_max = target_date.replace(hour=23, minute=59, second=59).isoformat() + 'Z'
+            # The day in the calendar's timezone, the same one slot suggestions and bookings use
+            target_date = datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE)
+            time_min = utc_timestamp(target_date)
+            time_max = utc_timestamp(target_date + timedelta(days=1))
             query_description = f"events on {date_str}"
         else:
             time_min = datetime.utcnow().isoformat() + 'Z'
             time_max = (datetime.utcnow() + timedelta(days=7)).isoformat() + 'Z'
             query_description = "upcoming events (next 7 days)"
         
-        events_result = calendar_service.events().list(
-            calendarId=CALENDAR_ID,
-            timeMin=time_min,
-            timeMax=time_max,
-            maxResults=10,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+        stale_note = ""
+        try:
+            events = query_all_calendars(time_min, time_max, limit=10)
+        except Exception as e:
+            # Google is slow or down: answer from the last known copy, clearly marked as such
+            fallback = query_snapshot(time_min, time_max, limit=10)
+            if fallback is None:
+                raise
+            events, as_of, covered = fallback
+            if not events and not covered:
+                return f"⚠️ Google Calendar is unreachable ({str(e)}) and there is no saved data for {query_description}. Please try again shortly."
+            saved = datetime.fromtimestamp(as_of, CALENDAR_TIMEZONE).strftime('%B %d at %I:%M %p')
+            stale_note = (f"\n\n⚠️ Google Calendar is unreachable ({str(e)}). This is a saved copy from {saved}"
+                          f" and may be out of date{'' if covered else '; part of this range was never saved, so other events may be missing'}.")
+        else:
+            if date_str and "all" not in query_description:
+                prefetch_around(target_date.date())
         
         if not events:
             if "all" in query_description:
-                return "📅 Great news! You have no meetings or events scheduled. Your calendar is completely free!"
+                return "📅 Great news! You have no meetings or events scheduled. Your calendar is completely free!" + stale_note
             elif date_str and date_str != "all":
-                return f"📅 Your calendar is completely free on {date_str}! No events scheduled."
+                return f"📅 Your calendar is completely free on {date_str}! No events scheduled." + stale_note
             else:
-                return "📅 Your calendar looks clear for the next week. No upcoming events found."
+                return "📅 Your calendar looks clear for the next week. No upcoming events found." + stale_note
         
-        current_time = datetime.now()
+        current_time = datetime.now(timezone.utc)
         response = f"Found {len(events)} event(s):\n"
         
         for event in events:
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            summary = event.get('summary', 'No Title')
-            formatted_time = format_datetime(start)
-            time_status = get_time_status(start, current_time)
-            response += f"• {summary} on {formatted_time}{time_status}\n"
+            response += f"• {event.title} on {event.format_start()}{event.time_status(current_time)}\n"
         
-        return response.strip()
+        return response.strip() + stale_note
     
     except Exception as e:
         return f"Error checking calendar: {str(e)}"
 
+def search_free_slots(start_date, days: int, duration_minutes: int, **kwargs) -> list:
+    """Free slots within working hours across all availability calendars"""
+    origin = datetime.combine(start_date, datetime.min.time(), tzinfo=CALENDAR_TIMEZONE)
+    busy = get_busy_intervals(
+        origin.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        (origin + timedelta(days=days)).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    )
+    options = dict(
+        tz=CALENDAR_TIMEZONE,
+        work_start=WORK_START,
+        work_end=WORK_END,
+        workdays=WORKING_DAYS,
+        buffer_minutes=MEETING_BUFFER_MINUTES,
+        not_before=datetime.now(timezone.utc)
+    )
+    options.update(kwargs)
+    return find_free_slots(busy, start_date, days, duration_minutes, **options)
+
+@tool
+def find_available_time(search: str) -> str:
+    """
+    Find free gaps of any length over a date range. Format: "minutes|YYYY-MM-DD|days" (date and days optional)
+    Example: "90|2025-07-07|30" finds 90-minute gaps in the 30 days from July 7.
+    """
+    try:
+        parts = [p.strip() for p in search.split('|')]
+        duration_minutes = int(parts[0])
+        start_date = datetime.strptime(parts[1], '%Y-%m-%d').date() if len(parts) > 1 and parts[1] else datetime.now(CALENDAR_TIMEZONE).date()
+        days = min(int(parts[2]) if len(parts) > 2 and parts[2] else 7, MAX_SEARCH_DAYS)
+        
+        slots = search_free_slots(start_date, days, duration_minutes, limit=5)
+        
+        if not slots:
+            return f"No {duration_minutes}-minute gaps found in the {days} days from {start_date.isoformat()}. Try a longer range or shorter duration?"
+        
+        response = f"First {len(slots)} free {duration_minutes}-minute gap(s) from {start_date.strftime('%B %d, %Y')}:\n"
+        for i, slot in enumerate(slots, 1):
+            response += f"{i}. {slot.start.strftime('%a %B %d, %I:%M %p')} - {slot.end.strftime('%I:%M %p')} (free until {slot.gap_end.strftime('%I:%M %p')})\n"
+        
+        return response.strip()
+    
+    except Exception as e:
+        return f"Error finding available time: {str(e)}"
+
+@tool
+def find_meeting_time(request: str) -> str:
+    """
+    Find a time when several people are all free. Format: "minutes|email1,email2|YYYY-MM-DD|days|preference"
+    Preference: earliest, fewest_gaps or working_hours. Example: "30|alice@x.com,bob@y.com|2025-07-07|5|earliest"
+    """
+    try:
+        parts = [p.strip() for p in request.split('|')]
+        if len(parts) < 2:
+            return "❌ Invalid format. Please provide: minutes|email1,email2|YYYY-MM-DD|days|preference (last three are optional)"
+        
+        duration_minutes = int(parts[0])
+        attendees = [email.strip() for email in parts[1].split(',') if email.strip()]
+        start_date = datetime.strptime(parts[2], '%Y-%m-%d').date() if len(parts) > 2 and parts[2] else datetime.now(CALENDAR_TIMEZONE).date()
+        days = min(int(parts[3]) if len(parts) > 3 and parts[3] else 7, MAX_SEARCH_DAYS)
+        preference = parts[4] if len(parts) > 4 and parts[4] else "earliest"
+        if preference not in PREFERENCES:
+            return f"❌ Unknown preference '{preference}'. Use one of: {', '.join(PREFERENCES)}"
+        
+        origin = datetime.combine(start_date, datetime.min.time(), tzinfo=CALENDAR_TIMEZONE)
+        busy, errors = calendar_reader.freebusy_with_errors(
+            AVAILABILITY_CALENDARS + [a for a in attendees if a not in AVAILABILITY_CALENDARS],
+            utc_timestamp(origin),
+            utc_timestamp(origin + timedelta(days=days))
+        )
+        # Attendees whose calendar could not be read are left out rather than assumed free
+        unknown = [a for a in attendees if a in errors]
+        attendees = [a for a in attendees if a not in errors]
+        busy_by_attendee = {a: merge_busy({a: busy[a]}) for a in attendees}
+        busy_by_attendee["me"] = merge_busy({c: busy[c] for c in AVAILABILITY_CALENDARS if c in busy})
+        unknown_note = ""
+        if unknown:
+            unknown_note = "\n⚠️ Availability unknown for " + ", ".join(
+                f"{a} ({', '.join(errors[a])})" for a in unknown) + "; these times ignore their calendars."
+        if any(c in errors for c in AVAILABILITY_CALENDARS):
+            unknown_note += "\n⚠️ Some of your own calendars could not be read: " + ", ".join(
+                c for c in AVAILABILITY_CALENDARS if c in errors) + "."
+        who = ', '.join(attendees) if attendees else "nobody else with a readable calendar"
+        
+        slots = solve_meeting_time(
+            busy_by_attendee, start_date, days, duration_minutes, ORGANIZER_HOURS,
+            attendee_hours=ATTENDEE_HOURS,
+            preference=preference,
+            buffer_minutes=MEETING_BUFFER_MINUTES,
+            limit=3,
+            not_before=datetime.now(timezone.utc)
+        )
+        
+        if not slots:
+            return f"No {duration_minutes}-minute slot found where you and {who} are all free in the {days} days from {start_date.isoformat()}.{unknown_note}"
+        
+        response = f"Best {duration_minutes}-minute slots for you and {who} ({preference}):\n"
+        for i, slot in enumerate(slots, 1):
+            notes = []
+            if slot.outside_hours:
+                notes.append(f"outside working hours for {slot.outside_hours}")
+            if slot.fragments:
+                notes.append(f"leaves short gaps for {slot.fragments}")
+            response += f"{i}. {slot.start.strftime('%a %B %d, %I:%M %p')} - {slot.end.strftime('%I:%M %p')}{' (' + '; '.join(notes) + ')' if notes else ''}\n"
+        
+        return response.strip() + unknown_note
+    
+    except Exception as e:
+        return f"Error finding meeting time: {str(e)}"
+
 @tool
 def suggest_available_time_slots(date_str: str) -> str:
     """
@@ -153,42 +333,38 @@ def suggest_available_time_slots(date_str: str) -> str:
     """
     try:
         target_date = datetime.strptime(date_str, '%Y-%m-%d')
-        suggestions = []
-        
-        business_hours = [9, 11, 13, 15]
-        
-        for hour in business_hours:
-            slot_start = target_date.replace(hour=hour, minute=0, second=0, microsecond=0)
-            slot_end = slot_start + timedelta(hours=1)
-            
-            events_result = calendar_service.events().list(
-                calendarId=CALENDAR_ID,
-                timeMin=slot_start.isoformat() + 'Z',
-                timeMax=slot_end.isoformat() + 'Z',
-                singleEvents=True
-            ).execute()
-            
-            if not events_result.get('items', []):
-                suggestions.append({
-                    'start_time': slot_start.strftime('%I:%M %p'),
-                    'end_time': slot_end.strftime('%I:%M %p')
-                })
-                
-            if len(suggestions) >= 3:
-                break
+        # An explicitly requested date is searched even if it is not a working day
+        suggestions = search_free_slots(target_date.date(), 1, 60, step_minutes=60, limit=3, workdays=range(7))
+        prefetch_around(target_date.date())
         
         if not suggestions:
-            return f"No available slots found for {date_str} during business hours (9 AM - 5 PM). Try a different date?"
+            return f"No available slots found for {date_str} during business hours. Try a different date?"
         
         response = f"Available time slots for {target_date.strftime('%B %d, %Y')}:\n"
         for i, slot in enumerate(suggestions, 1):
-            response += f"{i}. {slot['start_time']} - {slot['end_time']}\n"
+            response += f"{i}. {slot.start.strftime('%I:%M %p')} - {slot.end.strftime('%I:%M %p')}\n"
         
         return response
     
     except Exception as e:
         return f"Error suggesting time slots: {str(e)}"
 
+def insert_event_idempotently(calendar_id: str, event: dict, key: str) -> dict:
+    """Insert under a deterministic id; a 409 means an earlier attempt already created it"""
+    try:
+        return calendar_reader.execute_write(calendar_service.events().insert(calendarId=calendar_id, body=event))
+    except HttpError as e:
+        if e.resp.status != 409:
+            raise
+    
+    existing = calendar_reader.execute(calendar_service.events().get(calendarId=calendar_id, eventId=event['id']))
+    if existing.get('status') != 'cancelled':
+        return existing
+    
+    # The id belongs to a booking that was cancelled since; book again under a fresh id
+    event = dict(event, id=deterministic_event_id(key, salt=uuid.uuid4().hex))
+    return calendar_reader.execute_write(calendar_service.events().insert(calendarId=calendar_id, body=event))
+
 @tool
 def book_appointment(appointment_details: str) -> str:
     """
@@ -206,38 +382,59 @@ def book_appointment(appointment_details: str) -> str:
         duration_hours = int(parts[3].strip()) if len(parts) > 3 and parts[3].strip() else 1
         description = parts[4].strip() if len(parts) > 4 else ""
         
-        appointment_date = datetime.strptime(f"{date_str} {start_time}", '%Y-%m-%d %H:%M')
+        # Times are wall-clock in CALENDAR_TIMEZONE, as shown by the slot-finding tools
+        appointment_date = datetime.strptime(f"{date_str} {start_time}", '%Y-%m-%d %H:%M').replace(tzinfo=CALENDAR_TIMEZONE)
         end_time = appointment_date + timedelta(hours=duration_hours)
         
-        events_result = calendar_service.events().list(
-            calendarId=CALENDAR_ID,
-            timeMin=appointment_date.isoformat() + 'Z',
-            timeMax=end_time.isoformat() + 'Z',
-            singleEvents=True
-        ).execute()
-        
-        existing_events = events_result.get('items', [])
-        
-        if existing_events:
-            return f"⚠️ Time slot conflicts with existing event: {existing_events[0].get('summary', 'Unnamed event')}. Please choose a different time."
-        
-        event = {
-            'summary': summary,
-            'description': description or f'Appointment booked via AI Assistant: {summary}',
-            'start': {
-                'dateTime': appointment_date.isoformat() + 'Z',
-                'timeZone': 'UTC',
-            },
-            'end': {
-                'dateTime': end_time.isoformat() + 'Z',
-                'timeZone': 'UTC',
-            },
-        }
-        
-        created_event = calendar_service.events().insert(calendarId=CALENDAR_ID, body=event).execute()
-        
-        formatted_date = appointment_date.strftime('%B %d, %Y at %I:%M %p')
-        return f"✅ Successfully booked '{summary}' for {formatted_date} (Duration: {duration_hours} hour{'s' if duration_hours != 1 else ''})\n\nEvent ID: {created_event.get('id')}\nCalendar Link: {created_event.get('htmlLink', 'N/A')}"
+        # Retries of the same booking (resent chat messages, agent retries) reuse one key and event id
+        key = booking_key(summary, appointment_date, end_time)
+        with idempotency_store.lock(key):
+            previous = idempotency_store.get(key)
+            if previous:
+                # Deleted outside this agent (e.g. in Google Calendar) since it was booked: book it again
+                still_there = any(e.id == previous['event_id'] for e in event_store.query(
+                    CALENDAR_ID, utc_timestamp(appointment_date), utc_timestamp(end_time)))
+                if still_there:
+                    return previous['response']
+                idempotency_store.invalidate_event(previous['event_id'])
+            
+            event_id = deterministic_event_id(key)
+            busy = get_busy_intervals(utc_timestamp(appointment_date), utc_timestamp(end_time))
+            
+            if busy:
+                existing_events = event_store.query(
+                    CALENDAR_ID,
+                    utc_timestamp(appointment_date),
+                    utc_timestamp(end_time),
+                    fresh=True
+                )
+                already_booked = next((e for e in existing_events if e.id == event_id), None)
+                if already_booked is None:
+                    conflict = existing_events[0].title if existing_events else 'a busy block on another calendar'
+                    return f"⚠️ Time slot conflicts with existing event: {conflict}. Please choose a different time."
+                created_event = already_booked.raw
+            else:
+                event = {
+                    'id': event_id,
+                    'summary': summary,
+                    'description': description or f'Appointment booked via AI Assistant: {summary}',
+                    'start': {
+                        'dateTime': appointment_date.isoformat(),
+                        'timeZone': str(CALENDAR_TIMEZONE),
+                    },
+                    'end': {
+                        'dateTime': end_time.isoformat(),
+                        'timeZone': str(CALENDAR_TIMEZONE),
+                    },
+                }
+                created_event = insert_event_idempotently(CALENDAR_ID, event, key)
+                event_store.upsert(CALENDAR_ID, created_event)
+                prefetch_around(appointment_date.date())
+            
+            formatted_date = appointment_date.strftime('%B %d, %Y at %I:%M %p')
+            response = f"✅ Successfully booked '{summary}' for {formatted_date} (Duration: {duration_hours} hour{'s' if duration_hours != 1 else ''})\n\nEvent ID: {created_event.get('id')}\nCalendar Link: {created_event.get('htmlLink', 'N/A')}"
+            idempotency_store.put(key, {'event_id': created_event.get('id'), 'response': response})
+            return response
     
     except Exception as e:
         return f"❌ Error booking appointment: {str(e)}"
@@ -251,18 +448,11 @@ def remove_event(event_identifier: str) -> str:
         now = datetime.utcnow().isoformat() + 'Z'
         future_date = (datetime.utcnow() + timedelta(days=30)).isoformat() + 'Z'
         
-        events_result = calendar_service.events().list(
-            calendarId=CALENDAR_ID,
-            timeMin=now,
-            timeMax=future_date,
-            maxResults=50,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        upcoming_events = event_store.query(CALENDAR_ID, now, future_date, limit=50)
         
         matching_events = [
-            event for event in events_result.get('items', [])
-            if event_identifier.lower() in event.get('summary', '').lower()
+            event for event in upcoming_events
+            if event_identifier.lower() in event.title.lower()
         ]
         
         if not matching_events:
@@ -270,21 +460,21 @@ def remove_event(event_identifier: str) -> str:
         
         if len(matching_events) == 1:
             event_to_delete = matching_events[0]
-            calendar_service.events().delete(calendarId=CALENDAR_ID, eventId=event_to_delete['id']).execute()
+            try:
+                calendar_reader.execute_write(calendar_service.events().delete(calendarId=CALENDAR_ID, eventId=event_to_delete.id))
+            except HttpError as e:
+                # Already deleted by an earlier attempt of this request
+                if e.resp.status not in (404, 410):
+                    raise
+            event_store.remove(CALENDAR_ID, event_to_delete.raw)
+            idempotency_store.invalidate_event(event_to_delete.id)
             
-            event_summary = event_to_delete.get('summary', 'Unnamed Event')
-            start_time = event_to_delete['start'].get('dateTime', event_to_delete['start'].get('date'))
-            formatted_time = format_datetime(start_time)
-                
-            return f"✅ Successfully cancelled '{event_summary}' scheduled for {formatted_time}"
+            return f"✅ Successfully cancelled '{event_to_delete.title}' scheduled for {event_to_delete.format_start()}"
         
         else:
             response = f"Found {len(matching_events)} events matching '{event_identifier}':\n"
             for i, event in enumerate(matching_events, 1):
-                summary = event.get('summary', 'Unnamed Event')
-                start_time = event['start'].get('dateTime', event['start'].get('date'))
-                formatted_time = format_datetime(start_time)
-                response += f"{i}. {summary} on {formatted_time}\n"
+                response += f"{i}. {event.title} on {event.format_start()}\n"
             
             response += "\nPlease be more specific about which event you want to cancel."
             return response
@@ -292,46 +482,244 @@ def remove_event(event_identifier: str) -> str:
     except Exception as e:
         return f"❌ Error removing event: {str(e)}"
 
-def create_booking_agent():
-    """Create an optimized LangChain agent with calendar tools and memory"""
+MAX_RESCHEDULE_EVENTS = 50
+
+@tool
+def reschedule_events(request: str) -> str:
+    """
+    Move matching events into a target window in one step. Format: "title|from|to|target_date|days"
+    title is matched as a substring ("*" for all); from/to select the current dates; the target window
+    starts on target_date and spans days. Example: "1:1|2025-07-07|2025-07-11|2025-07-14|5"
+    """
+    try:
+        parts = [p.strip() for p in request.split('|')]
+        if len(parts) < 4:
+            return "❌ Invalid format. Please provide: title|YYYY-MM-DD|YYYY-MM-DD|target YYYY-MM-DD|days"
+        title = parts[0].lower()
+        source_start = datetime.strptime(parts[1], '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE)
+        source_end = datetime.strptime(parts[2], '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE) + timedelta(days=1)
+        target_date = datetime.strptime(parts[3], '%Y-%m-%d').date()
+        days = min(int(parts[4]) if len(parts) > 4 and parts[4] else 5, MAX_SEARCH_DAYS)
+        
+        selected = [
+            e for e in event_store.query(CALENDAR_ID, source_start.isoformat(), source_end.isoformat(), fresh=True)
+            if not e.all_day and (title == '*' or title in e.title.lower())
+        ]
+        if not selected:
+            return f"❌ No events matching '{parts[0]}' between {parts[1]} and {parts[2]}."
+        if len(selected) > MAX_RESCHEDULE_EVENTS:
+            return f"❌ {len(selected)} events match; please narrow the selection to at most {MAX_RESCHEDULE_EVENTS}."
+        
+        # One busy map for the whole target window: other calendars via freebusy, the primary from the
+        # store so the events being moved can be left out
+        target_origin = datetime.combine(target_date, datetime.min.time(), tzinfo=CALENDAR_TIMEZONE)
+        time_min = target_origin.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        time_max = (target_origin + timedelta(days=days)).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        moving = {e.id for e in selected}
+        busy = BusyIndex()
+        others = [c for c in AVAILABILITY_CALENDARS if c != CALENDAR_ID]
+        if others:
+            busy.update(merge_busy(calendar_reader.freebusy(others, time_min, time_max)))
+        for event in event_store.query(CALENDAR_ID, time_min, time_max, fresh=True):
+            if event.id not in moving and not event.all_day and event.raw.get('transparency') != 'transparent':
+                busy.add(event.start, event.end)
+        
+        plan = plan_moves(selected, busy, target_date, days, tz=CALENDAR_TIMEZONE, work_start=WORK_START,
+                          work_end=WORK_END, workdays=WORKING_DAYS, buffer_minutes=MEETING_BUFFER_MINUTES,
+                          not_before=datetime.now(timezone.utc))
+        moves = [(event, slot) for event, slot in plan if slot is not None]
+        unplaced = [event for event, slot in plan if slot is None]
+        
+        tz_name = str(CALENDAR_TIMEZONE)
+        results = calendar_reader.execute_batch([
+            calendar_service.events().patch(calendarId=CALENDAR_ID, eventId=event.id, body={
+                'start': {'dateTime': slot.start.isoformat(), 'timeZone': tz_name},
+                'end': {'dateTime': slot.end.isoformat(), 'timeZone': tz_name},
+            })
+            for event, slot in moves
+        ])
+        
+        response = ""
+        moved = 0
+        for (event, slot), (updated, error) in zip(moves, results):
+            if error is not None:
+                response += f"• ❌ {event.title}: {error}\n"
+                continue
+            event_store.upsert(CALENDAR_ID, updated)
+            # A retried booking of the old time must not report the moved event as booked there
+            idempotency_store.invalidate_event(event.id)
+            moved += 1
+            response += f"• {event.title}: {event.start.strftime('%a %b %d %I:%M %p')} → {slot.start.strftime('%a %b %d %I:%M %p')}\n"
+        for event in unplaced:
+            response += f"• ⚠️ {event.title}: no free slot in the target window\n"
+        return f"✅ Moved {moved} of {len(selected)} event(s):\n" + response.strip()
     
+    except ValueError as e:
+        return f"❌ Invalid request: {str(e)}. Use title|YYYY-MM-DD|YYYY-MM-DD|YYYY-MM-DD|days"
+    except Exception as e:
+        return f"❌ Error rescheduling events: {str(e)}"
+
+# Long operations run on the job queue so they survive the chat timeout and process restarts
+job_queue = JobQueue(os.getenv("JOB_DB_PATH", "jobs.db"), workers=int(os.getenv("JOB_WORKERS", "2")))
+
+def within_range(event, start: datetime, end: datetime) -> bool:
+    """Whether an event lies entirely inside [start, end); all-day events compare by calendar date"""
+    if event.all_day:
+        return event.start.date() >= start.date() and event.end.date() <= end.date()
+    return event.start >= start and event.end <= end
+
+def clear_range_job(job) -> dict:
+    """Delete the events lying entirely between two timestamps on the primary calendar; resumes from its checkpoint.
+
+    Events that only overlap an edge of the range are kept and reported as skipped.
+    """
+    deleted = set(job.checkpoint.get('deleted', []))
+    failed = []
+    start, end = datetime.fromisoformat(job.params['start']), datetime.fromisoformat(job.params['end'])
+    events, skipped = [], []
+    for e in event_store.query(CALENDAR_ID, job.params['start'], job.params['end'], fresh=True):
+        if not within_range(e, start, end):
+            skipped.append({'id': e.id, 'title': e.title, 'start': e.start.isoformat(), 'end': e.end.isoformat()})
+        elif e.id not in deleted:
+            events.append(e)
+    total = len(events) + len(deleted)
+    job.progress(len(deleted), total, f"Deleting {total} event(s)")
+    for offset in range(0, len(events), 50):
+        chunk = events[offset:offset + 50]
+        results = calendar_reader.execute_batch([
+            calendar_service.events().delete(calendarId=CALENDAR_ID, eventId=event.id) for event in chunk
+        ])
+        for event, (_, error) in zip(chunk, results):
+            status = getattr(getattr(error, 'resp', None), 'status', None)
+            if error is None or status in (404, 410):
+                event_store.remove(CALENDAR_ID, event.raw)
+                idempotency_store.invalidate_event(event.id)
+                deleted.add(event.id)
+            else:
+                failed.append({'id': event.id, 'title': event.title, 'error': str(error)})
+        job.save({'deleted': sorted(deleted)})
+        job.progress(len(deleted), total, f"Deleted {len(deleted)} of {total}")
+    return {'deleted': len(deleted), 'failed': failed, 'skipped_overlapping': skipped}
+
+job_queue.register('clear_range', clear_range_job)
+
+@tool
+def clear_calendar_range(date_range: str) -> str:
+    """
+    Delete ALL events in a date range as a background job. Only when the user explicitly asks to clear days.
+    Events that start before or end after the range are kept and listed in the job result.
+    Format: "YYYY-MM-DD|YYYY-MM-DD" (inclusive). Returns a job ID to check progress.
+    """
     try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-lite",
-            temperature=0.3
-        )
-        print("✅ Using Gemini 2.0 Flash-Lite")
+        first, last = [part.strip() for part in date_range.split('|')[:2]]
+        start = datetime.strptime(first, '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE)
+        end = datetime.strptime(last, '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE) + timedelta(days=1)
+        if end <= start:
+            return "❌ The end date must not be before the start date."
+        job_id = job_queue.submit('clear_range', {'start': start.isoformat(), 'end': end.isoformat()})
+        return (f"🗂️ Started clearing {first} to {last} in the background; events crossing the range edges are kept. "
+                f"Job ID: {job_id} (progress at /jobs/{job_id})")
+    except ValueError:
+        return "❌ Please use the format YYYY-MM-DD|YYYY-MM-DD."
     except Exception as e:
-        print(f"⚠️ Gemini 2.0 Flash-Lite unavailable, falling back to 1.5 Flash: {e}")
+        return f"❌ Error starting job: {str(e)}"
+
+def start_job_workers():
+    """Start background job workers; call once per server process"""
+    job_queue.start()
+
+def start_calendar_snapshots():
+    """Save the event store in the background so the next start loads it instead of refetching"""
+    if calendar_snapshot:
+        calendar_snapshot.start(event_store, SNAPSHOT_INTERVAL)
+
+def save_calendar_snapshot():
+    if calendar_snapshot:
+        calendar_snapshot.stop()
+        calendar_snapshot.save(event_store)
+
+def get_job(job_id: str) -> Optional[dict]:
+    return job_queue.get(job_id)
+
+def list_jobs(limit: int = 20) -> list:
+    return job_queue.recent(limit)
+
+def create_llm():
+    """Build a latency-aware router over the configured Gemini models"""
+    models = []
+    for model_name in GEMINI_MODELS:
         try:
-            llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                temperature=0.3
-            )
-            print("✅ Using Gemini 1.5 Flash (fallback)")
-        except Exception as e2:
-            raise Exception(f"No Gemini models available: {e2}")
+            # Keep client retries low so the router sees failures and can route around them
+            models.append((model_name, ChatGoogleGenerativeAI(
+                model=model_name,
+                temperature=0.3,
+                max_retries=GEMINI_MAX_RETRIES
+            )))
+        except Exception as e:
+            print(f"⚠️ {model_name} unavailable: {e}")
+    
+    if not models:
+        raise Exception("No Gemini models available")
+    
+    global model_router
+    model_router = ModelRouter(models, hedge=GEMINI_HEDGING)
+    print(f"✅ Using {', '.join(name for name, _ in models)} with latency-aware routing")
+    return RoutedChatModel(router=model_router)
+
+def create_booking_agent():
+    """Create an optimized LangChain agent with calendar tools; memory is attached per session"""
+    
+    llm = create_llm()
     
-    tools = [check_calendar_availability, suggest_available_time_slots, book_appointment, remove_event]
+    tools = [check_calendar_availability, suggest_available_time_slots, find_available_time, find_meeting_time, book_appointment, remove_event, reschedule_events, clear_calendar_range]
     
-    return initialize_agent(
+    agent = initialize_agent(
         tools=tools,
         llm=llm,
         agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
-        memory=conversation_memory,
+        agent_kwargs={"prefix": PREFIX},
         verbose=False,
         handle_parsing_errors=True,
         max_iterations=3,
         early_stopping_method="generate"
     )
+    prompt_builder.set_template(agent.agent.llm_chain.prompt.template)
+    return agent
+
+DEFAULT_SESSION = "default"
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "40"))
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+prompt_builder = PromptBuilder(budget=PROMPT_TOKEN_BUDGET)
+
+class SessionHistory(BaseChatMessageHistory):
+    """Chat history for one session kept in the shared state backend, so any worker can continue it.
+    
+    limit caps how many of the newest messages are shown to the agent; everything is still stored.
+    """
+    
+    def __init__(self, session_id: str, limit: Optional[int] = None):
+        self.key = f"chat:{session_id}"
+        self.limit = limit
+    
+    @property
+    def messages(self) -> list:
+        stored = get_state().get(self.key, [])
+        if self.limit is not None:
+            stored = stored[-self.limit:] if self.limit else []
+        return [HumanMessage(content=text) if role == "human" else AIMessage(content=text)
+                for role, text in stored]
+    
+    def add_messages(self, messages) -> None:
+        stored = list(get_state().get(self.key, []))
+        stored.extend(["human" if isinstance(m, HumanMessage) else "ai", str(m.content)] for m in messages)
+        get_state().set(self.key, stored[-MAX_HISTORY_MESSAGES:])
+    
+    def clear(self) -> None:
+        get_state().delete(self.key)
 
 booking_agent = None
-conversation_memory = ConversationBufferMemory(
-    memory_key="chat_history", 
-    return_messages=True,
-    input_key="input",
-    output_key="output"
-)
+model_router = None
 
 def get_agent():
     global booking_agent
@@ -339,44 +727,166 @@ def get_agent():
         booking_agent = create_booking_agent()
     return booking_agent
 
-def chat_with_agent(message: str) -> str:
-    """Chat with the booking agent with conversation memory"""
-    try:
-        agent = get_agent()
-        current_datetime = datetime.now()
-        current_date = current_datetime.strftime('%Y-%m-%d')
-        current_time_12h = current_datetime.strftime('%I:%M %p')
-        
-        enhanced_message = f"""Current: {current_date} {current_time_12h}
+def get_session_agent(session_id: str = DEFAULT_SESSION, history_limit: Optional[int] = None) -> AgentExecutor:
+    """Executor sharing the agent and tools, with memory bound to one session"""
+    base = get_agent()
+    memory = ConversationBufferMemory(
+        chat_memory=SessionHistory(session_id, limit=history_limit),
+        memory_key="chat_history", 
+        return_messages=True,
+        input_key="input",
+        output_key="output"
+    )
+    return AgentExecutor.from_agent_and_tools(
+        agent=base.agent,
+        tools=base.tools,
+        memory=memory,
+        verbose=False,
+        handle_parsing_errors=True,
+        max_iterations=3,
+        early_stopping_method="generate"
+    )
 
-{message}
+def get_model_stats() -> dict:
+    """Rolling latency, error rate and circuit state per Gemini model"""
+    return model_router.stats() if model_router else {}
 
-Tools: check_calendar_availability(date_or_"all"), suggest_available_time_slots(date), book_appointment("title|date|time|hours|desc"), remove_event(title)
-Format dates as YYYY-MM-DD, times as HH:MM (24h). Be concise."""
+WARMUP_CALENDAR_CONNECTIONS = int(os.getenv("WARMUP_CALENDAR_CONNECTIONS", "4"))
+
+def warm_up(run_tool_call: bool = False) -> dict:
+    """Build the agent and open Calendar and Gemini connections before the first request"""
+    timings = {}
+    
+    def timed(name, fn):
+        started = time.perf_counter()
+        result = fn()
+        timings[name] = round(time.perf_counter() - started, 3)
+        return result
+    
+    timed("agent", get_agent)
+    # Concurrent cheap reads refresh the OAuth token and open TLS connections on several pool threads
+    timed("calendar", lambda: parallel_map(
+        lambda _: calendar_reader.execute(calendar_service.calendarList().list(maxResults=1)),
+        range(WARMUP_CALENDAR_CONNECTIONS)))
+    models = timed("gemini", lambda: model_router.warm_up([HumanMessage(content="ping")]))
+    if run_tool_call:
+        timed("tool_call", lambda: check_calendar_availability.invoke({"date_str": datetime.now().strftime('%Y-%m-%d')}))
+    return {"timings": timings, "models": models}
+
+def get_prompt_stats() -> dict:
+    """Per-turn prompt token accounting against PROMPT_TOKEN_BUDGET"""
+    return prompt_builder.stats()
+
+calendar_watch = None
+
+def start_calendar_watch(address: str, token: Optional[str] = None) -> WatchManager:
+    """Register push channels for the availability calendars and keep the event store in sync"""
+    global calendar_watch
+    if calendar_watch is None:
+        # Backstop sync at the cache TTL, so an event missed by push is never served longer than a cache miss would be
+        sync_interval = float(os.getenv("CALENDAR_WATCH_SYNC_INTERVAL", str(event_store.ttl)))
+        calendar_watch = WatchManager(calendar_reader, event_store, address, token=token,
+                                      sync_interval=sync_interval, state=get_state())
+        calendar_watch.start(AVAILABILITY_CALENDARS)
+    return calendar_watch
+
+def get_calendar_stats() -> dict:
+    """Request coalescing and event store counters for calendar reads"""
+    stats = {**calendar_reader.stats(), **event_store.stats(), "idempotency": idempotency_store.stats(),
+             "state": get_state().stats(), "jobs": job_queue.stats(), "prefetch": prefetcher.stats()}
+    if calendar_snapshot:
+        stats["snapshot"] = calendar_snapshot.stats()
+    if calendar_watch:
+        stats["watch"] = calendar_watch.stats()
+    return stats
+
+def import_ics_events(chunks, skip_conflicts: bool = True):
+    """Stream VEVENTs from text chunks into the calendar, yielding per-event results and progress"""
+    events = iter_ics_events(chunks, default_tz=CALENDAR_TIMEZONE)
+    return import_events(events, calendar_reader, CALENDAR_ID, get_busy_intervals,
+                         store=event_store, skip_conflicts=skip_conflicts)
+
+EXPORT_FIELDS = ('id', 'iCalUID', 'summary', 'description', 'location', 'start', 'end', 'status',
+                 'transparency', 'recurrence', 'recurringEventId', 'originalStartTime')
+
+def series_events(events):
+    """Masters and exceptions as listed with singleEvents=False, dropping deleted one-off events.
+
+    Deleted occurrences stay as cancelled exceptions; those can come without an
+    iCalUID, so they are given their master's.
+    """
+    uids = {}
+    for event in events:
+        if event.get('recurrence'):
+            uids[event['id']] = event.get('iCalUID')
+        if event.get('status') == 'cancelled' and not event.get('recurringEventId'):
+            continue
+        master_id = event.get('recurringEventId')
+        if master_id and not event.get('iCalUID'):
+            if master_id not in uids:
+                master = calendar_reader.execute(calendar_service.events().get(calendarId=CALENDAR_ID, eventId=master_id))
+                uids[master_id] = master.get('iCalUID')
+            event = {**event, 'iCalUID': uids[master_id]}
+        yield event
+
+def export_events(start_date: str, end_date: str, fields: Optional[list] = None, expand: bool = True):
+    """Stream events from start_date through end_date (inclusive).
+
+    With expand, recurring events come as their individual occurrences; otherwise as
+    masters with their RRULEs plus modified or cancelled occurrences, as iCalendar needs.
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE)
+    end = datetime.strptime(end_date, '%Y-%m-%d').replace(tzinfo=CALENDAR_TIMEZONE) + timedelta(days=1)
+    if end <= start:
+        raise ValueError("end date must not be before start date")
+    if expand:
+        events = calendar_reader.iter_events(CALENDAR_ID, start.isoformat(), end.isoformat(),
+                                             fields=fields or EXPORT_FIELDS, singleEvents=True,
+                                             orderBy='startTime', maxResults=2500)
+    else:
+        events = series_events(calendar_reader.iter_events(CALENDAR_ID, start.isoformat(), end.isoformat(),
+                                                           fields=fields or EXPORT_FIELDS, singleEvents=False,
+                                                           showDeleted=True, maxResults=2500))
+    if not fields:
+        return events
+    return ({key: event[key] for key in fields if key in event} for event in events)
+
+def export_ics(start_date: str, end_date: str):
+    """Stream the same range as an iCalendar document"""
+    return iter_ics(export_events(start_date, end_date, expand=False), name=CALENDAR_ID)
+
+def chat_with_agent(message: str, session_id: str = DEFAULT_SESSION) -> str:
+    """Chat with the booking agent using the session's conversation memory"""
+    try:
+        get_agent()  # measures the static prompt on first use
+        turn = prompt_builder.build(message, SessionHistory(session_id).messages, datetime.now())
+        if turn.report["total"] > PROMPT_TOKEN_BUDGET:
+            print(f"⚠️ Prompt over budget: {turn.report}")
+        agent = get_session_agent(session_id, history_limit=turn.history_limit)
         
-        response = agent.run(enhanced_message)
+        response = agent.run(turn.input)
         
         return response
     
     except Exception as e:
         return f"I apologize, but I encountered an error: {str(e)}. Please try again or rephrase your request."
 
-def get_conversation_history() -> list:
-    """Get the current conversation history"""
-    return getattr(conversation_memory.chat_memory, 'messages', [])
+def get_conversation_history(session_id: str = DEFAULT_SESSION) -> list:
+    """Get the conversation history for a session"""
+    return SessionHistory(session_id).messages
 
-def clear_conversation_history():
-    """Clear the conversation history"""
+def clear_conversation_history(session_id: str = DEFAULT_SESSION):
+    """Clear the conversation history for a session"""
     try:
-        conversation_memory.clear()
+        SessionHistory(session_id).clear()
         print("✅ Conversation history cleared")
     except Exception as e:
         print(f"❌ Error clearing conversation history: {e}")
 
-def get_conversation_summary() -> str:
+def get_conversation_summary(session_id: str = DEFAULT_SESSION) -> str:
     """Get a summary of the conversation"""
     try:
-        messages = get_conversation_history()
+        messages = get_conversation_history(session_id)
         if not messages:
             return "No conversation history"
         
@@ -0,0 +1,183 @@
+"""
+Calendar operations exposed to Gemini function calling in the serverless entry point.
+
+Only googleapiclient and the standard library are used here, so the
+serverless bundle stays free of LangChain and numpy.
+"""
+
+import json
+import os
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from idempotency import booking_key, deterministic_event_id
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+CALENDAR_TIMEZONE = ZoneInfo(os.getenv("CALENDAR_TIMEZONE", "UTC"))
+WORK_HOURS = os.getenv("WORKING_HOURS", "09:00-17:00")
+EVENT_FIELDS = "items(id,summary,start,end,status)"
+
+# Built on first use and reused by every warm invocation of the same instance
+_service = None
+_calendar_id = None
+
+
+def get_calendar_service():
+    """Calendar client for this instance; credentials and discovery are only loaded once"""
+    global _service
+    if _service is None:
+        from google.oauth2 import service_account
+        from googleapiclient.discovery import build
+
+        credentials_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
+        if not credentials_json:
+            raise Exception("No credentials found")
+        credentials = service_account.Credentials.from_service_account_info(json.loads(credentials_json), scopes=SCOPES)
+        _service = build('calendar', 'v3', credentials=credentials, cache_discovery=False)
+    return _service
+
+
+def set_calendar_service(service, calendar_id: str = 'primary'):
+    """Use a prebuilt client, e.g. the fake Calendar in benchmarks"""
+    global _service, _calendar_id
+    _service, _calendar_id = service, calendar_id
+
+
+def get_calendar_id() -> str:
+    global _calendar_id
+    if _calendar_id is None:
+        _calendar_id = os.getenv("CALENDAR_ID", "primary")
+    return _calendar_id
+
+
+def _to_utc(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_time(value: dict) -> datetime:
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    return datetime.combine(date.fromisoformat(value['date']), time(), tzinfo=CALENDAR_TIMEZONE)
+
+
+def _day_bounds(day: date):
+    start = datetime.combine(day, time(), tzinfo=CALENDAR_TIMEZONE)
+    return start, start + timedelta(days=1)
+
+
+def _busy(time_min: datetime, time_max: datetime) -> list:
+    body = {'timeMin': _to_utc(time_min), 'timeMax': _to_utc(time_max), 'items': [{'id': get_calendar_id()}]}
+    response = get_calendar_service().freebusy().query(body=body).execute()
+    blocks = response.get('calendars', {}).get(get_calendar_id(), {}).get('busy', [])
+    return sorted((_parse_time({'dateTime': b['start']}), _parse_time({'dateTime': b['end']})) for b in blocks)
+
+
+def check_calendar(date: str = "") -> str:
+    """List calendar events on a date (YYYY-MM-DD), or the next 7 days when date is empty."""
+    try:
+        if date:
+            start, end = _day_bounds(datetime.strptime(date, '%Y-%m-%d').date())
+        else:
+            start = datetime.now(CALENDAR_TIMEZONE)
+            end = start + timedelta(days=7)
+        response = get_calendar_service().events().list(
+            calendarId=get_calendar_id(), timeMin=_to_utc(start), timeMax=_to_utc(end),
+            singleEvents=True, orderBy='startTime', maxResults=20, fields=EVENT_FIELDS).execute()
+        events = [e for e in response.get('items', []) if e.get('status') != 'cancelled']
+        if not events:
+            return f"📅 No events {'on ' + date if date else 'in the next 7 days'}."
+        lines = []
+        for event in events:
+            event_start = _parse_time(event['start']).astimezone(CALENDAR_TIMEZONE)
+            when = event_start.strftime('%B %d, %Y') if 'date' in event['start'] else event_start.strftime('%B %d, %Y at %I:%M %p')
+            lines.append(f"• {event.get('summary') or 'No Title'} on {when}")
+        return f"Found {len(events)} event(s):\n" + "\n".join(lines)
+    except Exception as e:
+        return f"Error checking calendar: {str(e)}"
+
+
+def suggest_time_slots(date: str, duration_minutes: int = 60) -> str:
+    """Suggest up to three free slots of duration_minutes within working hours on a date (YYYY-MM-DD)."""
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d').date()
+        work_start, work_end = [datetime.combine(day, time.fromisoformat(t.strip()), tzinfo=CALENDAR_TIMEZONE)
+                                for t in WORK_HOURS.split('-')]
+        cursor = max(work_start, datetime.now(CALENDAR_TIMEZONE))
+        length = timedelta(minutes=int(duration_minutes))
+        slots = []
+        for busy_start, busy_end in _busy(work_start, work_end) + [(work_end, work_end)]:
+            while cursor + length <= busy_start and len(slots) < 3:
+                slots.append((cursor, cursor + length))
+                cursor += length
+            cursor = max(cursor, busy_end)
+        if not slots:
+            return f"No free {duration_minutes}-minute slots on {date} during working hours."
+        return f"Available slots on {day.strftime('%B %d, %Y')}:\n" + "\n".join(
+            f"{i}. {s.strftime('%I:%M %p')} - {e.strftime('%I:%M %p')}" for i, (s, e) in enumerate(slots, 1))
+    except Exception as e:
+        return f"Error suggesting time slots: {str(e)}"
+
+
+def _find_booking(title: str, start: datetime, end: datetime):
+    """A live event with this title at exactly this time, if any"""
+    response = get_calendar_service().events().list(
+        calendarId=get_calendar_id(), timeMin=_to_utc(start), timeMax=_to_utc(end),
+        singleEvents=True, fields=EVENT_FIELDS).execute()
+    wanted = " ".join(title.split()).lower()
+    return next((e for e in response.get('items', [])
+                 if e.get('status') != 'cancelled' and " ".join((e.get('summary') or '').split()).lower() == wanted
+                 and 'dateTime' in e['start'] and _parse_time(e['start']) == start and _parse_time(e['end']) == end), None)
+
+
+def _insert_idempotently(event: dict, key: str) -> dict:
+    """Insert under a deterministic id; on a 409 the existing event is the booking unless it was cancelled"""
+    events = get_calendar_service().events()
+    try:
+        return events.insert(calendarId=get_calendar_id(), body=event).execute()
+    except Exception as e:
+        if getattr(getattr(e, 'resp', None), 'status', None) != 409:
+            raise
+    existing = events.get(calendarId=get_calendar_id(), eventId=event['id']).execute()
+    if existing.get('status') != 'cancelled':
+        return existing
+    # The id belongs to a booking that was cancelled since; book again under a fresh id
+    event = dict(event, id=deterministic_event_id(key, salt=uuid.uuid4().hex))
+    return events.insert(calendarId=get_calendar_id(), body=event).execute()
+
+
+def book_appointment(title: str, date: str, start_time: str, duration_minutes: int = 60, description: str = "") -> str:
+    """Book an event titled title on date (YYYY-MM-DD) at start_time (HH:MM, 24h) lasting duration_minutes."""
+    try:
+        start = datetime.strptime(f"{date} {start_time}", '%Y-%m-%d %H:%M').replace(tzinfo=CALENDAR_TIMEZONE)
+        end = start + timedelta(minutes=int(duration_minutes))
+        # A retried invocation (or the same booking made through the agent) reuses the event id,
+        # so it finds its own booking or gets a 409
+        key = booking_key(title, start, end)
+        event_id = deterministic_event_id(key)
+        if _busy(start, end):
+            try:
+                existing = get_calendar_service().events().get(calendarId=get_calendar_id(), eventId=event_id).execute()
+            except Exception:
+                existing = None
+            if not existing or existing.get('status') == 'cancelled':
+                # Rebooked under a salted id after the first booking was cancelled
+                existing = _find_booking(title, start, end)
+            if not existing:
+                return "⚠️ That time conflicts with an existing event. Please choose a different time."
+            return f"✅ Booked '{title}' for {start.strftime('%B %d, %Y at %I:%M %p')} (Event ID: {existing['id']})"
+        event = {
+            'id': event_id,
+            'summary': title,
+            'description': description or f'Appointment booked via AI Assistant: {title}',
+            'start': {'dateTime': start.isoformat(), 'timeZone': str(CALENDAR_TIMEZONE)},
+            'end': {'dateTime': end.isoformat(), 'timeZone': str(CALENDAR_TIMEZONE)},
+        }
+        created = _insert_idempotently(event, key)
+        return f"✅ Booked '{title}' for {start.strftime('%B %d, %Y at %I:%M %p')} (Event ID: {created['id']})"
+    except Exception as e:
+        return f"❌ Error booking appointment: {str(e)}"
+
+
+TOOLS = [check_calendar, suggest_time_slots, book_appointment]
+TOOLS_BY_NAME = {tool.__name__: tool for tool in TOOLS}
@@ -1,21 +1,22 @@
 """
 Lightweight FastAPI Backend for Vercel Deployment
-Optimized version with minimal dependencies
+Tool-calling chat without LangChain: Gemini function calling wired straight to the calendar
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from datetime import datetime
 import os
-import json
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
 
-# Configure Google AI
+from api.calendar_tools import CALENDAR_TIMEZONE, TOOLS, TOOLS_BY_NAME
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+GEMINI_MODEL = os.getenv("GEMINI_MODELS", "gemini-2.0-flash-lite").split(",")[0].strip()
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "4"))
+
+SYSTEM_INSTRUCTION = """You are a calendar booking assistant working on the user's Google Calendar.
+Use the functions to check events, suggest free slots and book appointments; never claim a booking you did not make.
+Each message starts with the current date and time. Answer concisely."""
 
 app = FastAPI(
     title="AI Calendar Booking Agent",
@@ -35,43 +36,46 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     message: str
 
-# Simplified calendar service
-def get_calendar_service():
-    """Get Google Calendar service"""
-    credentials_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
-    if not credentials_json:
-        raise Exception("No credentials found")
-    
-    credentials_dict = json.loads(credentials_json)
-    credentials = service_account.Credentials.from_service_account_info(
-        credentials_dict, 
-        scopes=['https://www.googleapis.com/auth/calendar']
-    )
-    return build('calendar', 'v3', credentials=credentials)
+# Created on the first chat and reused by every warm invocation; the SDK import is deferred
+# so /health and cold starts that never chat don't pay for it
+_model = None
 
-# Simple AI chat function
-def simple_chat(message: str) -> str:
-    """Simple AI chat using Google Gemini"""
-    try:
-        if not GOOGLE_API_KEY:
-            return "AI service is not configured. Please check your API key."
-        
-        model = GenerativeModel('gemini-2.0-flash-exp')
-        
-        # Simple calendar context
-        prompt = f"""You are an AI calendar assistant. The user said: "{message}"
-        
-        Respond helpfully about calendar management. If they want to:
-        - Check calendar: Say "I can help you check your calendar events"
-        - Book appointment: Say "I can help you schedule that appointment"
-        - General chat: Respond naturally about calendar management
-        
-        Keep responses brief and helpful."""
-        
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"I'm having trouble processing your request. Error: {str(e)}"
+def get_model():
+    global _model
+    if _model is None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=GOOGLE_API_KEY)
+        _model = genai.GenerativeModel(GEMINI_MODEL, tools=TOOLS, system_instruction=SYSTEM_INSTRUCTION)
+    return _model
+
+def set_model(model):
+    """Use a prebuilt model, e.g. a fake in benchmarks"""
+    global _model
+    _model = model
+
+def run_chat(message: str) -> dict:
+    """Send the message, run the function calls Gemini asks for and return its final answer"""
+    chat = get_model().start_chat()
+    now = datetime.now(CALENDAR_TIMEZONE)
+    response = chat.send_message(f"Current: {now.strftime('%Y-%m-%d %I:%M %p')}\n\n{message}")
+    tool_calls = []
+    for round_number in range(MAX_TOOL_ROUNDS + 1):
+        calls = [part.function_call for part in response.candidates[0].content.parts
+                 if getattr(part, 'function_call', None) and part.function_call.name]
+        if not calls:
+            return {"response": response.text, "tool_calls": tool_calls}
+        if round_number == MAX_TOOL_ROUNDS:
+            break
+        results = []
+        for call in calls:
+            tool = TOOLS_BY_NAME.get(call.name)
+            args = dict(call.args or {})
+            result = tool(**args) if tool else f"Unknown function {call.name}"
+            tool_calls.append({"name": call.name, "args": args})
+            results.append({"function_response": {"name": call.name, "response": {"result": result}}})
+        response = chat.send_message(results)
+    return {"response": "I couldn't finish that request. Please try rephrasing it.", "tool_calls": tool_calls}
 
 @app.get("/health")
 async def health_check():
@@ -79,7 +83,9 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "AI Calendar Booking Agent (Vercel)",
-        "version": "2.0.0"
+        "version": "2.0.0",
+        "model": GEMINI_MODEL,
+        "model_loaded": _model is not None
     }
 
 @app.get("/")
@@ -92,11 +98,12 @@ async def root():
     }
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
-    """Simple chat endpoint"""
+def chat_endpoint(request: ChatRequest):
+    """Chat endpoint; runs in the threadpool because Gemini and Calendar calls block"""
+    if not GOOGLE_API_KEY and _model is None:
+        return {"response": "AI service is not configured. Please check your API key."}
     try:
-        response = simple_chat(request.message)
-        return {"response": response}
+        return run_chat(request.message)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,187 @@
+"""
+Busy-time aggregation across several calendars and bitmap-based free-time search
+"""
+
+import bisect
+import heapq
+import math
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from recurrence import parse_timestamp
+
+Interval = Tuple[datetime, datetime]
+FreeSlot = namedtuple('FreeSlot', ['start', 'end', 'gap_end'])
+
+MINUTES_PER_DAY = 24 * 60
+
+calendar_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="calendar")
+
+
+def parallel_map(fn: Callable, items: Iterable) -> list:
+    """Run fn over items concurrently on the shared calendar pool, preserving order"""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(calendar_pool.map(fn, items))
+
+
+def get_availability_calendars(service, primary_id: str, configured: str = "") -> List[str]:
+    """Calendars whose busy time counts; AVAILABILITY_CALENDARS overrides calendarList"""
+    if configured:
+        ids = [c.strip() for c in configured.split(",") if c.strip()]
+    else:
+        try:
+            calendar_list = service.calendarList().list().execute()
+            ids = [cal['id'] for cal in calendar_list.get('items', [])
+                   if not cal.get('hidden') and not cal.get('deleted')]
+        except Exception:
+            ids = []
+    return [primary_id] + [c for c in dict.fromkeys(ids) if c != primary_id]
+
+
+def to_intervals(blocks: List[dict]) -> List[Interval]:
+    """Convert freebusy blocks ({'start', 'end'} timestamps) to datetime intervals"""
+    return [(parse_timestamp(block['start']), parse_timestamp(block['end'])) for block in blocks]
+
+
+def merge_busy(busy_by_calendar: Dict[str, List[dict]]) -> List[Interval]:
+    """Merge per-calendar busy lists (each sorted, as freebusy returns them) in one pass"""
+    merged: List[Interval] = []
+    streams = [to_intervals(blocks) for blocks in busy_by_calendar.values()]
+    for start, end in heapq.merge(*streams):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def is_free(busy: List[Interval], start: datetime, end: datetime) -> bool:
+    """Whether [start, end) avoids every merged busy interval"""
+    return not any(b_start < end and b_end > start for b_start, b_end in busy)
+
+
+class BusyIndex:
+    """Sorted, merged busy intervals supporting incremental inserts and overlap lookups"""
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+
+    def add(self, start: datetime, end: datetime):
+        lo = bisect.bisect_left(self.ends, start)
+        hi = bisect.bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def update(self, intervals: Iterable[Interval]):
+        for start, end in intervals:
+            self.add(start, end)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        i = bisect.bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def parse_working_hours(value: str) -> Tuple[int, int]:
+    """'09:00-17:00' -> (540, 1020) minutes after midnight"""
+    start, end = value.split('-')
+    to_minutes = lambda hhmm: int(hhmm.split(':')[0]) * 60 + int(hhmm.split(':')[1])
+    return to_minutes(start.strip()), to_minutes(end.strip())
+
+
+def _wall_minutes(moment: datetime, origin: datetime) -> float:
+    """Minutes from origin in the origin's local wall-clock time"""
+    local = moment.astimezone(origin.tzinfo).replace(tzinfo=None)
+    return (local - origin.replace(tzinfo=None)).total_seconds() / 60
+
+
+def rasterize(busy: Sequence[Interval], origin: datetime, days: int,
+              resolution: int = 5, buffer_minutes: int = 0) -> np.ndarray:
+    """Boolean busy grid of shape (days, slots_per_day); any overlap marks a slot busy"""
+    slots_per_day = MINUTES_PER_DAY // resolution
+    total = days * slots_per_day
+    diff = np.zeros(total + 1, dtype=np.int32)
+    if busy:
+        offsets = np.array([[_wall_minutes(s, origin), _wall_minutes(e, origin)] for s, e in busy])
+        starts = np.clip(np.floor((offsets[:, 0] - buffer_minutes) / resolution), 0, total).astype(np.int64)
+        ends = np.clip(np.ceil((offsets[:, 1] + buffer_minutes) / resolution), 0, total).astype(np.int64)
+        keep = ends > starts
+        np.add.at(diff, starts[keep], 1)
+        np.add.at(diff, ends[keep], -1)
+    return (np.cumsum(diff[:-1]) > 0).reshape(days, slots_per_day)
+
+
+def working_mask(origin: datetime, days: int, resolution: int = 5,
+                 work_start: int = 9 * 60, work_end: int = 17 * 60,
+                 workdays: Sequence[int] = (0, 1, 2, 3, 4)) -> np.ndarray:
+    """Boolean grid of slots that fall entirely within working hours on working days"""
+    slot_minutes = np.arange(MINUTES_PER_DAY // resolution) * resolution
+    in_hours = (slot_minutes >= work_start) & (slot_minutes + resolution <= work_end)
+    on_day = np.isin((origin.weekday() + np.arange(days)) % 7, list(workdays))
+    return on_day[:, None] & in_hours[None, :]
+
+
+def find_free_slots(busy: Sequence[Interval], start_date: date, days: int, duration_minutes: int,
+                    tz=timezone.utc, resolution: int = 5, work_start: int = 9 * 60, work_end: int = 17 * 60,
+                    workdays: Sequence[int] = (0, 1, 2, 3, 4), buffer_minutes: int = 0,
+                    step_minutes: Optional[int] = None, limit: Optional[int] = None,
+                    not_before: Optional[datetime] = None) -> List[FreeSlot]:
+    """Free slots of duration_minutes across days, earliest first.
+
+    Without step_minutes each free gap yields one slot at its start; with it,
+    slots are offered every step_minutes inside each gap.
+    """
+    origin = datetime.combine(start_date, time(), tzinfo=tz)
+    free = working_mask(origin, days, resolution, work_start, work_end, workdays) \
+        & ~rasterize(busy, origin, days, resolution, buffer_minutes)
+    flat = free.ravel()
+    if not_before is not None:
+        flat[:max(0, math.ceil(_wall_minutes(not_before, origin) / resolution))] = False
+
+    edges = np.diff(np.concatenate(([0], flat.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    need = math.ceil(duration_minutes / resolution)
+    long_enough = (run_ends - run_starts) >= need
+
+    to_datetime = lambda index: (origin.replace(tzinfo=None) + timedelta(minutes=int(index) * resolution)).replace(tzinfo=tz)
+    step = max(1, (step_minutes or 0) // resolution)
+    slots = []
+    for run_start, run_end in zip(run_starts[long_enough], run_ends[long_enough]):
+        starts = range(run_start, run_end - need + 1, step) if step_minutes else [run_start]
+        for index in starts:
+            slot_start = to_datetime(index)
+            slots.append(FreeSlot(slot_start, slot_start + timedelta(minutes=duration_minutes), to_datetime(run_end)))
+            if limit and len(slots) >= limit:
+                return slots
+    return slots
+
+
+def plan_moves(events: Sequence, busy: BusyIndex, start_date: date, days: int, **options) -> list:
+    """Place each event (anything with .start/.end) in the earliest free slot of the target window.
+
+    Planned slots are added to the busy index as they are chosen, so moved
+    events never collide with each other. Returns (event, FreeSlot or None).
+    """
+    plan = []
+    for event in sorted(events, key=lambda e: e.start):
+        minutes = math.ceil((event.end - event.start).total_seconds() / 60)
+        slots = find_free_slots(list(zip(busy.starts, busy.ends)), start_date, days, minutes, limit=1, **options)
+        slot = slots[0] if slots else None
+        if slot is not None:
+            busy.add(slot.start, slot.end)
+        plan.append((event, slot))
+    return plan
@@ -2,18 +2,27 @@
 Optimized FastAPI Backend for AI Calendar Booking Agent
 Handles chat requests and provides health monitoring
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 import os
 import sys
 import logging
-from fastapi.responses import RedirectResponse
+import json
+import codecs
+import asyncio
+import itertools
+import threading
+import time
+import re
+import tempfile
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi import Request
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 import pathlib
-from typing import Optional
+from typing import List, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -39,8 +48,23 @@ logger.info(f"GOOGLE_API_KEY set: {'Yes' if google_api_key else 'No'}")
 
 chat_with_agent = None
 clear_conversation_history = None
+get_model_stats = None
+get_prompt_stats = None
+warm_up = None
+start_job_workers = None
+get_job = None
+list_jobs = None
+start_calendar_snapshots = None
+save_calendar_snapshot = None
+get_calendar_stats = None
+start_calendar_watch = None
+import_ics_events = None
+export_events = None
+export_ics = None
 try:
-    from agent import chat_with_agent, clear_conversation_history
+    from agent import (chat_with_agent, clear_conversation_history, get_model_stats, get_calendar_stats,
+                       start_calendar_watch, import_ics_events, export_events, export_ics, get_prompt_stats, warm_up,
+                       start_job_workers, get_job, list_jobs, start_calendar_snapshots, save_calendar_snapshot)
     AGENT_AVAILABLE = True
     logger.info("✅ Agent imported successfully")
 except ImportError as e:
@@ -51,8 +75,10 @@ except Exception as e:
     AGENT_AVAILABLE = False
     logger.error(f"⚠️ Unexpected error importing agent: {e}")
 
-# In-memory user token store (for demo; use DB in production)
-user_tokens = {}
+import profiling
+
+# User tokens and chat memory live in the shared state backend (STATE_BACKEND_URL) so any worker can serve a user
+from state import get_state
 
 # Google OAuth2 client config
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -62,6 +88,25 @@ GOOGLE_DISCOVERY_URL = (
 )
 REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "https://ai-booking-agent.vercel.app/auth/callback")
 
+# Public HTTPS address of /calendar/notifications; enables push-based cache invalidation when set
+CALENDAR_WEBHOOK_URL = os.getenv("CALENDAR_WEBHOOK_URL")
+CALENDAR_WEBHOOK_TOKEN = os.getenv("CALENDAR_WEBHOOK_TOKEN")
+calendar_watch = None
+
+# Uploads are spooled to disk beyond this size, so large imports never sit in memory
+IMPORT_SPOOL_BYTES = 1024 * 1024
+IMPORT_READ_CHARS = 64 * 1024
+EXPORT_FIELD_PATTERN = re.compile(r"^[A-Za-z]+$")
+
+# Opt-in warm-up: /health answers 503 until the agent is built and connections are open
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+WARMUP_TOOL_CALL = os.getenv("WARMUP_TOOL_CALL", "false").lower() == "true"
+warmup_status = {"state": "pending" if WARMUP_ON_STARTUP else "disabled"}
+
+# /chat/batch limits; messages sharing a session run in order, others run concurrently
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+CHAT_BATCH_MAX_MESSAGES = int(os.getenv("CHAT_BATCH_MAX_MESSAGES", "500"))
+
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
 # Initialize FastAPI app
@@ -80,9 +125,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def register_calendar_watch():
+    """Open Calendar push channels so external edits invalidate cached calendar data"""
+    global calendar_watch
+    if AGENT_AVAILABLE and CALENDAR_WEBHOOK_URL and callable(start_calendar_watch):
+        try:
+            calendar_watch = start_calendar_watch(CALENDAR_WEBHOOK_URL, CALENDAR_WEBHOOK_TOKEN)
+            logger.info(f"✅ Watching calendars via {CALENDAR_WEBHOOK_URL}")
+        except Exception as e:
+            logger.error(f"⚠️ Calendar watch registration failed: {e}")
+
+def run_warm_up():
+    started = time.perf_counter()
+    try:
+        result = warm_up(run_tool_call=WARMUP_TOOL_CALL)
+        warmup_status.update(state="ready", **result)
+        logger.info(f"✅ Warm-up finished in {time.perf_counter() - started:.2f}s: {result['timings']}")
+    except Exception as e:
+        warmup_status.update(state="failed", error=str(e))
+        logger.error(f"⚠️ Warm-up failed, serving cold: {e}")
+    warmup_status["seconds"] = round(time.perf_counter() - started, 3)
+
+@app.on_event("startup")
+def start_warm_up():
+    """Warm up in the background so the server can answer /health (503) while it runs"""
+    if not WARMUP_ON_STARTUP:
+        return
+    if not AGENT_AVAILABLE or not callable(warm_up):
+        warmup_status.update(state="failed", error="AI agent is not available")
+        return
+    threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("startup")
+def start_jobs():
+    """Background workers for long calendar operations handed off by the agent"""
+    if AGENT_AVAILABLE and callable(start_job_workers):
+        start_job_workers()
+
+@app.on_event("startup")
+def start_snapshots():
+    """Periodically persist calendar state; it was loaded from the last snapshot when the agent was imported"""
+    if AGENT_AVAILABLE and callable(start_calendar_snapshots):
+        start_calendar_snapshots()
+
+@app.on_event("shutdown")
+def save_snapshot():
+    if AGENT_AVAILABLE and callable(save_calendar_snapshot):
+        try:
+            save_calendar_snapshot()
+        except Exception as e:
+            logger.error(f"⚠️ Could not save calendar snapshot: {e}")
+
 # Request models
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_.:-]{1,128}$"
+
 class ChatRequest(BaseModel):
     message: str
+    session_id: str = Field("default", pattern=SESSION_ID_PATTERN)
+
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None
+    message: str
+    session_id: str = Field("default", pattern=SESSION_ID_PATTERN)
+
+class BatchChatRequest(BaseModel):
+    messages: List[BatchChatItem]
+    concurrency: Optional[int] = Field(None, ge=1)
+
+class ResetRequest(BaseModel):
+    session_id: str = Field("default", pattern=SESSION_ID_PATTERN)
 
 # Health check endpoint - must be robust
 @app.get("/health")
@@ -94,10 +206,18 @@ async def health_check():
             "service": "AI Calendar Booking Agent",
             "version": "2.0.0",
             "agent_available": AGENT_AVAILABLE,
-            "endpoints": ["/health", "/chat", "/reset"],
+            "warmup": warmup_status,
+            "endpoints": ["/health", "/chat", "/chat/batch", "/reset", "/calendar/notifications", "/import/ics", "/export/ics", "/export/jsonl", "/jobs"],
             "environment": "production" if os.getenv("RAILWAY_ENVIRONMENT") else "development"
         }
         
+        if AGENT_AVAILABLE and callable(get_model_stats):
+            health_info["models"] = get_model_stats()
+        if AGENT_AVAILABLE and callable(get_prompt_stats):
+            health_info["prompt"] = get_prompt_stats()
+        if AGENT_AVAILABLE and callable(get_calendar_stats):
+            health_info["calendar_reads"] = get_calendar_stats()
+        
         # Add debugging information if agent is not available
         if not AGENT_AVAILABLE:
             health_info["debug"] = {
@@ -109,6 +229,12 @@ async def health_check():
                 "available_files": os.listdir(parent_dir) if os.path.exists(parent_dir) else "Directory not accessible"
             }
         
+        if warmup_status["state"] == "pending":
+            health_info["status"] = "warming_up"
+            return JSONResponse(status_code=503, content=health_info)
+        if warmup_status["state"] == "failed":
+            health_info["status"] = "degraded"
+        
         return health_info
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -120,7 +246,7 @@ async def health_check():
 
 # Main chat endpoint
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """Process chat messages through the AI agent"""
     try:
         if not AGENT_AVAILABLE:
@@ -143,8 +269,17 @@ async def chat_endpoint(request: ChatRequest):
                 status_code=503,
                 detail="AI agent function is not available"
             )
-        response = chat_with_agent(request.message)
-        return {"response": response}
+        # Opt-in: X-Profile: cprofile|sample with X-Admin-Token, or PROFILE_SAMPLE_RATE
+        profile_mode = profiling.requested_mode(http_request.headers.get("X-Profile"), http_request.headers.get("X-Admin-Token"))
+        # Run off the event loop so concurrent users don't serialize behind one agent call
+        if profile_mode is None:
+            response = await run_in_threadpool(chat_with_agent, request.message, request.session_id)
+            return {"response": response}
+        
+        response, profile_ids = await run_in_threadpool(
+            profiling.run_profiled, profile_mode, chat_with_agent, request.message, request.session_id)
+        logger.info(f"Profiled /chat ({profile_mode}): {profile_ids}")
+        return {"response": response, "profiles": profile_ids}
     except HTTPException:
         raise
     except Exception as e:
@@ -152,16 +287,174 @@ async def chat_endpoint(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
         return {"response": response, "status": "success"}
 
+# Batch chat endpoint for automated clients
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """Run many messages concurrently; streams one NDJSON result per message as each completes"""
+    if not AGENT_AVAILABLE or not callable(chat_with_agent):
+        raise HTTPException(status_code=503, detail="AI agent is not available")
+    if len(request.messages) > CHAT_BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX_MESSAGES} messages per batch")
+    
+    limit = min(request.concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY)
+    slots = asyncio.Semaphore(limit)
+    session_locks = {item.session_id: asyncio.Lock() for item in request.messages}
+    
+    async def run(index: int, item: BatchChatItem) -> dict:
+        # Taking the session lock first keeps same-session messages in order without holding a slot
+        async with session_locks[item.session_id], slots:
+            started = time.perf_counter()
+            result = {"index": index, "id": item.id, "session_id": item.session_id}
+            try:
+                result["response"] = await run_in_threadpool(chat_with_agent, item.message, item.session_id)
+                result["status"] = "success"
+            except Exception as e:
+                logger.error(f"Batch message {index} failed: {e}")
+                result.update(status="error", error=str(e))
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            return result
+    
+    async def results():
+        tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(request.messages)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+# Profiling artifacts (admin only)
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, http_request: Request):
+    """Download a saved .prof (pstats), .txt summary or .collapsed flamegraph stack file"""
+    if not profiling.is_admin(http_request.headers.get("X-Admin-Token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    path = profiling.artifact_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=profile_id, media_type="application/octet-stream")
+
+# Background jobs
+@app.get("/jobs")
+async def jobs_list(limit: int = 20):
+    """Most recent background jobs"""
+    if not AGENT_AVAILABLE or not callable(list_jobs):
+        raise HTTPException(status_code=503, detail="AI agent is not available")
+    return {"jobs": await run_in_threadpool(list_jobs, min(max(limit, 1), 100))}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status, progress and result of one background job"""
+    if not AGENT_AVAILABLE or not callable(get_job):
+        raise HTTPException(status_code=503, detail="AI agent is not available")
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Calendar push notifications (events().watch channels)
+@app.post("/calendar/notifications")
+async def calendar_notification(request: Request, background_tasks: BackgroundTasks):
+    """Receive a Calendar change notification and sync the affected calendar in the background"""
+    if calendar_watch is None:
+        raise HTTPException(status_code=503, detail="Calendar watch is not enabled")
+    
+    try:
+        calendar_id = calendar_watch.handle_notification(request.headers)
+    except PermissionError as e:
+        logger.warning(f"Rejected calendar notification: {e}")
+        raise HTTPException(status_code=403, detail="Unknown channel")
+    
+    if calendar_id:
+        background_tasks.add_task(calendar_watch.sync, calendar_id)
+    return {"status": "accepted"}
+
+def read_text_chunks(upload):
+    """Decode a spooled upload in fixed-size chunks"""
+    upload.seek(0)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    while True:
+        data = upload.read(IMPORT_READ_CHARS)
+        if not data:
+            break
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+# Bulk .ics import
+@app.post("/import/ics")
+async def import_ics(request: Request, conflicts: str = "skip"):
+    """Import a raw text/calendar body; streams NDJSON per-event results and batch progress"""
+    if not AGENT_AVAILABLE or not callable(import_ics_events):
+        raise HTTPException(status_code=503, detail="AI agent is not available")
+    if conflicts not in ("skip", "allow"):
+        raise HTTPException(status_code=400, detail="conflicts must be 'skip' or 'allow'")
+    
+    upload = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    
+    def results():
+        try:
+            for result in import_ics_events(read_text_chunks(upload), skip_conflicts=conflicts == "skip"):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            logger.error(f"ICS import failed: {e}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        finally:
+            upload.close()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+# Calendar export
+@app.get("/export/{export_format}")
+async def export_calendar(export_format: str, start: str, end: str, fields: Optional[str] = None):
+    """Stream a date range (YYYY-MM-DD, inclusive) as ICS or JSONL; fields projects JSONL output"""
+    if not AGENT_AVAILABLE or not callable(export_events):
+        raise HTTPException(status_code=503, detail="AI agent is not available")
+    if export_format not in ("ics", "jsonl"):
+        raise HTTPException(status_code=404, detail="Export format must be 'ics' or 'jsonl'")
+    
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if field_list and not all(EXPORT_FIELD_PATTERN.match(f) for f in field_list):
+        raise HTTPException(status_code=400, detail="fields must be comma-separated event field names")
+    
+    try:
+        if export_format == "ics":
+            chunks = export_ics(start, end)
+        else:
+            chunks = (json.dumps(event) + "\n" for event in export_events(start, end, field_list))
+        # Pull the first chunk up front so bad ranges and Calendar errors still map to a status code
+        first = await run_in_threadpool(next, chunks, "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Export failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Calendar export failed: {str(e)}")
+    
+    def stream():
+        try:
+            yield from itertools.chain([first], chunks)
+        except Exception as e:
+            logger.error(f"Export interrupted: {e}")
+    
+    media_type = "text/calendar" if export_format == "ics" else "application/x-ndjson"
+    filename = f"calendar_{start}_{end}.{export_format}"
+    return StreamingResponse(stream(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 # Reset conversation endpoint
 @app.post("/reset")
-async def reset_conversation():
-    """Reset conversation history"""
+async def reset_conversation(request: Optional[ResetRequest] = None):
+    """Reset conversation history for a session"""
     if not AGENT_AVAILABLE:
         raise HTTPException(status_code=503, detail="AI agent is not available")
     
     try:
         if 'clear_conversation_history' in globals() and callable(globals().get('clear_conversation_history')):
-            globals()['clear_conversation_history']()
+            session_id = request.session_id if request else "default"
+            await run_in_threadpool(globals()['clear_conversation_history'], session_id)
             return {"status": "success", "message": "Conversation history cleared"}
         else:
             raise HTTPException(status_code=503, detail="clear_conversation_history function is not available")
@@ -212,14 +505,14 @@ def auth_callback(request: Request, code: Optional[str] = None, state: Optional[
     service = build('oauth2', 'v2', credentials=credentials)
     user_info = service.userinfo().get().execute()
     user_id = user_info.get('email')
-    user_tokens[user_id] = {
+    get_state().set(f"tokens:{user_id}", {
         'token': credentials.token,
         'refresh_token': credentials.refresh_token,
         'token_uri': credentials.token_uri,
         'client_id': credentials.client_id,
         'client_secret': credentials.client_secret,
         'scopes': credentials.scopes
-    }
+    })
     return {"message": "Login successful", "user": user_id}
 
 # Main entry point
@@ -0,0 +1,278 @@
+"""
+Google Calendar read layer with request coalescing
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from resilience import ResilientExecutor, is_retryable
+
+FREEBUSY_MAX_CALENDARS = 50
+BATCH_MAX_REQUESTS = 50
+WINDOW_PAGE_SIZE = 2500
+NOT_MODIFIED = object()
+
+
+class SingleFlight:
+    """Share one in-flight call and its result among concurrent callers with the same key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() for key unless an identical call is already running, then wait for it"""
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+                "coalesce_rate": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+            }
+
+
+class CalendarReader:
+    """Executes Calendar reads, coalescing identical concurrent requests.
+
+    Results are shared between coalesced callers and must be treated as read-only.
+    """
+
+    def __init__(self, service, credentials=None, resilience: Optional[ResilientExecutor] = None):
+        self.service = service
+        self.credentials = credentials
+        self.flight = SingleFlight()
+        self._local = threading.local()
+        self.resilience = resilience or ResilientExecutor(
+            self._execute_once,
+            pool_size=16,
+            hedge=os.getenv("CALENDAR_HEDGING", "true").lower() == "true",
+            max_timeout=float(os.getenv("CALENDAR_MAX_TIMEOUT", "30"))
+        )
+
+    def _http(self):
+        """Per-thread authorized transport; httplib2 connections are not thread-safe"""
+        if self.credentials is None:
+            return None
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            # Socket timeout bounds calls abandoned by the adaptive timeout
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.resilience.max_timeout))
+            self._local.http = http
+        return http
+
+    def _execute_once(self, request):
+        http = self._http()
+        try:
+            return request.execute(http=http) if http is not None else request.execute()
+        except Exception as e:
+            # A conditional request answered 304 is a successful read, not an error to retry or count
+            if getattr(getattr(e, 'resp', None), 'status', None) == 304:
+                return NOT_MODIFIED
+            raise
+
+    def execute(self, request):
+        """Read: adaptive timeout, hedging and retries"""
+        return self.resilience.read(request)
+
+    def execute_write(self, request):
+        """Write: retried with jittered backoff on 429/5xx; callers must make it idempotent"""
+        return self.resilience.write(request)
+
+    def execute_batch(self, requests: list) -> list:
+        """Run writes as batch requests of up to 50; returns (response, error) per request.
+
+        A failed batch is retried as a whole and items that fail with a transient
+        status are retried one by one, so every request must be idempotent.
+        """
+        results = [(None, None)] * len(requests)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        for offset in range(0, len(requests), BATCH_MAX_REQUESTS):
+            chunk = range(offset, min(offset + BATCH_MAX_REQUESTS, len(requests)))
+            batch = self.service.new_batch_http_request(callback=callback)
+            for i in chunk:
+                batch.add(requests[i], request_id=str(i))
+            try:
+                self.resilience.write(batch)
+            except Exception as e:
+                for i in chunk:
+                    results[i] = (None, e)
+                continue
+            for i in chunk:
+                error = results[i][1]
+                if error is not None and is_retryable(error):
+                    try:
+                        results[i] = (self.execute_write(requests[i]), None)
+                    except Exception as e:
+                        results[i] = (None, e)
+        return results
+
+    def list_events(self, calendar_id: str, time_min: str, time_max: str, **params) -> list:
+        """List events in a window; with maxResults only the first page is returned"""
+        key = ("events", calendar_id, time_min, time_max, tuple(sorted(params.items())))
+        return self.flight.do(key, lambda: self._list_events(calendar_id, time_min, time_max, params))
+
+    def _list_events(self, calendar_id, time_min, time_max, params) -> list:
+        return self._paginate(
+            self.service.events(), 'list',
+            dict(calendarId=calendar_id, timeMin=time_min, timeMax=time_max, **params),
+            first_page_only='maxResults' in params)
+
+    def list_window(self, calendar_id: str, time_min: str, time_max: str, etag: Optional[str] = None,
+                    fields=None, **params):
+        """List a window conditionally; returns (items, etag), with items None when unchanged (304).
+
+        Only a window that fits on one page gets an etag back, since the
+        collection etag of the first page says nothing about later pages.
+        """
+        key = ("window", calendar_id, time_min, time_max, etag, tuple(fields or ()), tuple(sorted(params.items())))
+        return self.flight.do(key, lambda: self._list_window(calendar_id, time_min, time_max, etag, fields, params))
+
+    def _list_window(self, calendar_id, time_min, time_max, etag, fields, params):
+        events = self.service.events()
+        params = dict(calendarId=calendar_id, timeMin=time_min, timeMax=time_max, maxResults=WINDOW_PAGE_SIZE, **params)
+        if fields:
+            params['fields'] = f"etag,nextPageToken,items({','.join(fields)})"
+        request = events.list(**params)
+        if etag:
+            request.headers['If-None-Match'] = etag
+        response = self.execute(request)
+        if response is NOT_MODIFIED:
+            return None, etag
+        items = list(response.get('items', []))
+        request = events.list_next(request, response)
+        if request is None:
+            return items, response.get('etag')
+        while request is not None:
+            request.headers.pop('If-None-Match', None)
+            response = self.execute(request)
+            items.extend(response.get('items', []))
+            request = events.list_next(request, response)
+        return items, None
+
+    def iter_events(self, calendar_id: str, time_min: str, time_max: str, fields=None, **params):
+        """Yield events page by page without holding the whole window; fields limits the response"""
+        events = self.service.events()
+        params = dict(calendarId=calendar_id, timeMin=time_min, timeMax=time_max, **params)
+        if fields:
+            params['fields'] = f"nextPageToken,items({','.join(fields)})"
+        request = events.list(**params)
+        while request is not None:
+            response = self.execute(request)
+            yield from response.get('items', [])
+            request = events.list_next(request, response)
+
+    def list_instances(self, calendar_id: str, event_id: str, time_min: str, time_max: str) -> list:
+        """Server-side expansion of one recurring event within a window"""
+        key = ("instances", calendar_id, event_id, time_min, time_max)
+        return self.flight.do(key, lambda: self._paginate(
+            self.service.events(), 'instances',
+            dict(calendarId=calendar_id, eventId=event_id, timeMin=time_min, timeMax=time_max)))
+
+    def list_changes(self, calendar_id: str, sync_token: Optional[str] = None):
+        """Full (no token) or incremental event sync; returns (items, next_sync_token)"""
+        key = ("changes", calendar_id, sync_token)
+        return self.flight.do(key, lambda: self._list_changes(calendar_id, sync_token))
+
+    def _list_changes(self, calendar_id, sync_token):
+        events = self.service.events()
+        params = dict(calendarId=calendar_id, showDeleted=True, singleEvents=False, maxResults=2500)
+        if sync_token:
+            params['syncToken'] = sync_token
+        request = events.list(**params)
+        items = []
+        while True:
+            response = self.execute(request)
+            items.extend(response.get('items', []))
+            next_request = events.list_next(request, response)
+            if next_request is None:
+                return items, response.get('nextSyncToken')
+            request = next_request
+
+    def freebusy(self, calendar_ids: list, time_min: str, time_max: str) -> dict:
+        """Busy blocks per calendar for a window; calendars whose availability is unknown are left out"""
+        return self.freebusy_with_errors(calendar_ids, time_min, time_max)[0]
+
+    def freebusy_with_errors(self, calendar_ids: list, time_min: str, time_max: str):
+        """(busy, errors) per requested calendar id, one freebusy request per 50 calendars
+
+        errors maps each calendar the response could not vouch for (notFound, no access,
+        or missing from the response) to its error reasons.
+        """
+        key = ("freebusy", tuple(sorted(calendar_ids)), time_min, time_max)
+        return self.flight.do(key, lambda: self._freebusy(calendar_ids, time_min, time_max))
+
+    def _freebusy(self, calendar_ids, time_min, time_max):
+        busy, errors = {}, {}
+        for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+            chunk = calendar_ids[i:i + FREEBUSY_MAX_CALENDARS]
+            body = {
+                'timeMin': time_min,
+                'timeMax': time_max,
+                'items': [{'id': cal_id} for cal_id in chunk],
+            }
+            response = self.execute(self.service.freebusy().query(body=body))
+            # The response may normalize the case of email ids
+            calendars = {cal_id.lower(): info for cal_id, info in response.get('calendars', {}).items()}
+            for cal_id in chunk:
+                info = calendars.get(cal_id.lower())
+                if info is None:
+                    errors[cal_id] = ['notReturned']
+                elif info.get('errors'):
+                    errors[cal_id] = [error.get('reason', 'unknown') for error in info['errors']]
+                else:
+                    busy[cal_id] = info.get('busy', [])
+                    continue
+                print(f"⚠️ Free/busy unavailable for {cal_id}: {', '.join(errors[cal_id])}")
+        return busy, errors
+
+    def _paginate(self, collection, method: str, params: dict, first_page_only: bool = False) -> list:
+        request = getattr(collection, method)(**params)
+        items = []
+        while request is not None:
+            response = self.execute(request)
+            items.extend(response.get('items', []))
+            if first_page_only:
+                break
+            request = getattr(collection, method + '_next')(request, response)
+        return items
+
+    def stats(self) -> dict:
+        return {**self.flight.stats(), "resilience": self.resilience.stats()}
@@ -0,0 +1,64 @@
+"""
+Compact parsed view of a Calendar event, built once when the event is fetched
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from recurrence import instance_key, make_instance, parse_event_time
+
+
+class CalendarEvent:
+    """Concrete event with aware start/end; the API dict is kept by reference, not copied"""
+
+    __slots__ = ('id', 'title', 'start', 'end', 'all_day', 'recurring_id', '_raw', '_master')
+
+    def __init__(self, event_id: str, title: str, start: datetime, end: datetime, all_day: bool = False,
+                 recurring_id: Optional[str] = None, raw: Optional[dict] = None, master: Optional[dict] = None):
+        self.id = event_id
+        self.title = title
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+        self.recurring_id = recurring_id
+        self._raw = raw
+        self._master = master
+
+    @classmethod
+    def from_api(cls, event: dict) -> 'CalendarEvent':
+        return cls(event['id'], event.get('summary') or 'No Title',
+                   parse_event_time(event['start']), parse_event_time(event['end']),
+                   'date' in event['start'], event.get('recurringEventId'), raw=event)
+
+    def occurrence(self, start: datetime) -> 'CalendarEvent':
+        """Instance of this recurring master; the API-shaped dict is only built if asked for"""
+        instance_id = f"{self.id}_{start.strftime('%Y%m%d') if self.all_day else instance_key(start)}"
+        return CalendarEvent(instance_id, self.title, start, start + (self.end - self.start),
+                             self.all_day, self.id, master=self._raw)
+
+    @property
+    def raw(self) -> dict:
+        if self._raw is None:
+            self._raw = make_instance(self._master, self.start)
+        return self._raw
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        return self.start < end and self.end > start
+
+    def format_start(self) -> str:
+        if self.all_day:
+            return self.start.date().isoformat()
+        return self.start.strftime('%B %d, %Y at %I:%M %p')
+
+    def time_status(self, now: datetime) -> str:
+        """Past, ongoing or upcoming relative to an aware now, using the real end time"""
+        if self.all_day:
+            return ""
+        if self.end <= now:
+            return " (already finished)"
+        if self.start <= now:
+            return " (happening now!)"
+        return " (upcoming)"
+
+    def __repr__(self):
+        return f"CalendarEvent({self.id!r}, {self.title!r}, {self.start.isoformat()}, {self.end.isoformat()})"
@@ -0,0 +1,177 @@
+"""
+Calendar push-notification channels: registration, renewal and webhook handling
+"""
+
+import secrets
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Optional
+
+from state import MemoryBackend, StateStore
+
+
+class WatchManager:
+    """Keeps an events().watch channel open per calendar and syncs the event store on notifications
+
+    Channels are registered in a state store shared by all workers (see
+    state.get_state), so a notification is accepted by whichever worker it
+    reaches, and a calendar that already has a live channel is not watched again.
+    Each worker also runs an incremental sync every sync_interval as a backstop
+    for notifications that were lost or delivered to another worker.
+    """
+
+    def __init__(self, reader, store, address: str, token: Optional[str] = None,
+                 ttl_seconds: int = 7 * 24 * 3600, renew_margin: float = 3600.0,
+                 sync_interval: float = 300.0, state: Optional[StateStore] = None,
+                 clock: Callable[[], float] = time.time):
+        self.reader = reader
+        self.store = store
+        self.address = address
+        self.token = token or secrets.token_urlsafe(24)
+        self.ttl_seconds = ttl_seconds
+        self.renew_margin = renew_margin
+        self.sync_interval = sync_interval
+        self.state = state or StateStore(MemoryBackend())
+        self.clock = clock
+        # Channels opened by this process; the shared registry holds everyone's
+        self.channels: Dict[str, dict] = {}
+        self.calendar_ids = []
+        self.notifications = 0
+        self.syncs = 0
+        self.backstop_syncs = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._renewer = None
+
+    def _current(self, calendar_id: str) -> Optional[dict]:
+        return self.state.get(f"calendar_watch:calendar:{calendar_id}")
+
+    def start(self, calendar_ids: Iterable[str]):
+        """Open channels where no worker has a live one, sync each calendar and start the renewal thread"""
+        self.calendar_ids = list(calendar_ids)
+        for calendar_id in self.calendar_ids:
+            current = self._current(calendar_id)
+            try:
+                if current and current['expiration'] - self.clock() > self.renew_margin:
+                    self.sync(calendar_id)
+                else:
+                    self.watch(calendar_id)
+            except Exception as e:
+                print(f"⚠️ Could not watch calendar {calendar_id}: {e}")
+        if self._renewer is None:
+            self._renewer = threading.Thread(target=self._renew_loop, name="calendar-watch", daemon=True)
+            self._renewer.start()
+
+    def watch(self, calendar_id: str) -> dict:
+        body = {
+            'id': str(uuid.uuid4()),
+            'type': 'web_hook',
+            'address': self.address,
+            'token': self.token,
+            'params': {'ttl': str(self.ttl_seconds)},
+        }
+        response = self.reader.execute_write(self.reader.service.events().watch(calendarId=calendar_id, body=body))
+        expiration = int(response.get('expiration', 0)) / 1000 or self.clock() + self.ttl_seconds
+        channel = {'calendar_id': calendar_id, 'resource_id': response.get('resourceId'),
+                   'expiration': expiration, 'token': self.token}
+        with self._lock:
+            self.channels[body['id']] = channel
+        self.state.set(f"calendar_watch:channel:{body['id']}", channel)
+        self.state.set(f"calendar_watch:calendar:{calendar_id}", {'id': body['id'], **channel})
+        self.sync(calendar_id)
+        return channel
+
+    def stop(self, channel_id: str):
+        with self._lock:
+            channel = self.channels.pop(channel_id, None)
+        if channel is None:
+            channel = self.state.get(f"calendar_watch:channel:{channel_id}")
+        self.state.delete(f"calendar_watch:channel:{channel_id}")
+        if channel:
+            try:
+                self.reader.execute_write(self.reader.service.channels().stop(
+                    body={'id': channel_id, 'resourceId': channel['resource_id']}))
+            except Exception as e:
+                print(f"⚠️ Could not stop channel {channel_id}: {e}")
+
+    def handle_notification(self, headers) -> Optional[str]:
+        """Validate a push notification; returns the calendar to sync, or None for the initial 'sync' ping.
+
+        Raises PermissionError for unknown channels or a wrong channel token.
+        """
+        channel_id = headers.get('X-Goog-Channel-ID')
+        channel = self.state.get(f"calendar_watch:channel:{channel_id}") if channel_id else None
+        if channel is None or not secrets.compare_digest(headers.get('X-Goog-Channel-Token', ''), channel['token']):
+            raise PermissionError(f"Unknown channel or bad token: {channel_id}")
+        self.notifications += 1
+        if headers.get('X-Goog-Resource-State') == 'sync':
+            return None
+        return channel['calendar_id']
+
+    def sync(self, calendar_id: str) -> int:
+        """Incremental sync; affected windows and expansions are invalidated by the store"""
+        self.syncs += 1
+        return self.store.sync(calendar_id)
+
+    def renew_due(self):
+        """Replace channels that expire within the renewal margin.
+
+        A worker renews the channels it opened, and also any calendar whose current
+        channel has already expired (its owner is gone).
+        """
+        now = self.clock()
+        with self._lock:
+            due = [(cid, ch) for cid, ch in self.channels.items() if ch['expiration'] - now < self.renew_margin]
+        for channel_id, channel in list(due):
+            # Already replaced by another worker after it expired
+            if self.state.get(f"calendar_watch:channel:{channel_id}") is None:
+                with self._lock:
+                    self.channels.pop(channel_id, None)
+                due.remove((channel_id, channel))
+        for calendar_id in self.calendar_ids:
+            current = self._current(calendar_id)
+            if current is None or (current['expiration'] <= now and current['id'] not in self.channels):
+                due.append((current['id'] if current else None, current or {'calendar_id': calendar_id, 'expiration': now}))
+        for channel_id, channel in due:
+            try:
+                self.watch(channel['calendar_id'])
+            except Exception as e:
+                print(f"⚠️ Could not renew channel for {channel['calendar_id']}: {e}")
+                if channel['expiration'] <= now:
+                    self.store.desync(channel['calendar_id'])
+                continue
+            if channel_id:
+                self.stop(channel_id)
+
+    def sync_all(self):
+        """Backstop: incremental sync of every watched calendar, whichever worker got the notifications"""
+        for calendar_id in self.calendar_ids:
+            try:
+                self.sync(calendar_id)
+                self.backstop_syncs += 1
+            except Exception as e:
+                print(f"⚠️ Backstop sync failed for {calendar_id}: {e}")
+
+    def _renew_loop(self):
+        next_renewal = 0.0
+        while not self._stopped.wait(self.sync_interval):
+            self.sync_all()
+            if time.monotonic() >= next_renewal:
+                self.renew_due()
+                next_renewal = time.monotonic() + min(self.renew_margin / 2, 300)
+
+    def shutdown(self):
+        self._stopped.set()
+        for channel_id in list(self.channels):
+            self.stop(channel_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "channels": [{"id": cid, **{k: v for k, v in ch.items() if k != 'token'}}
+                             for cid, ch in self.channels.items()],
+                "notifications": self.notifications,
+                "syncs": self.syncs,
+                "backstop_syncs": self.backstop_syncs,
+            }
@@ -0,0 +1,384 @@
+"""
+Local event store that keeps recurring masters and expands instances lazily
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from calendar_event import CalendarEvent
+from recurrence import RecurrenceError, instance_key, occurrences, parse_event_time, parse_timestamp
+
+# Attributes the tools and recurrence expansion read; everything else is left out of window responses
+WINDOW_FIELDS = ('id', 'status', 'summary', 'start', 'end', 'recurrence', 'recurringEventId', 'originalStartTime',
+                 'transparency', 'etag', 'updated', 'htmlLink')
+ETAGS_PER_CALENDAR = 256
+COVERED_PER_CALENDAR = 256
+
+
+def event_bounds(event: dict):
+    """Aware (start, end) of a concrete event"""
+    return parse_event_time(event['start']), parse_event_time(event['end'])
+
+
+def overlaps(event: dict, start: datetime, end: datetime) -> bool:
+    """Whether an event intersects [start, end)"""
+    event_start, event_end = event_bounds(event)
+    return event_start < end and event_end > start
+
+
+class CalendarState:
+    """Raw events (singles, recurring masters and exceptions) and fetched windows of one calendar"""
+
+    def __init__(self):
+        self.events: Dict[str, dict] = {}
+        self.parsed: Dict[str, CalendarEvent] = {}
+        self.windows: List[list] = []
+        self.etags = OrderedDict()
+        self.sync_token: Optional[str] = None
+        self.synced = False
+        self.complete = False
+        self.as_of: Optional[float] = None
+        # [start, end, fetched] in epoch seconds for every window ever fetched, for answering offline
+        self.covered: List[list] = []
+        self.sync_lock = threading.Lock()
+
+
+class EventStore:
+    """Caches raw Calendar events per window and answers queries locally.
+
+    Windows are fetched with singleEvents=False so a recurring series costs one
+    master instead of one payload entry per instance; instances are expanded on
+    demand for the requested window and the expansions are memoized. Every
+    stored event is parsed into a CalendarEvent once, when it arrives.
+    """
+
+    def __init__(self, reader, ttl: float = 60.0, expansion_cache_size: int = 512,
+                 clock: Callable[[], float] = time.monotonic):
+        self.reader = reader
+        self.ttl = ttl
+        self.clock = clock
+        self.expansion_cache_size = expansion_cache_size
+        self._expansions = OrderedDict()
+        self._calendars: Dict[str, CalendarState] = {}
+        self._lock = threading.RLock()
+        self.window_hits = 0
+        self.window_misses = 0
+        self.prefetch_hits = 0
+        self.prefetch_used = 0
+        self.not_modified = 0
+        self.version = 0
+
+    def _state(self, calendar_id: str) -> CalendarState:
+        with self._lock:
+            return self._calendars.setdefault(calendar_id, CalendarState())
+
+    def _covering(self, state: CalendarState, start: datetime, end: datetime) -> Optional[list]:
+        """Fresh window containing [start, end); a synced calendar covers everything"""
+        if state.synced:
+            return [start, end, self.clock(), 0]
+        now = self.clock()
+        state.windows = [w for w in state.windows if now - w[2] < self.ttl]
+        return next((w for w in state.windows if w[0] <= start and w[1] >= end), None)
+
+    def covers(self, calendar_id: str, time_min: str, time_max: str) -> bool:
+        start, end = parse_timestamp(time_min), parse_timestamp(time_max)
+        with self._lock:
+            return self._covering(self._state(calendar_id), start, end) is not None
+
+    def query(self, calendar_id: str, time_min: str, time_max: str,
+              limit: Optional[int] = None, fresh: bool = False) -> List[CalendarEvent]:
+        """Concrete events overlapping the window, ordered by start time"""
+        start, end = parse_timestamp(time_min), parse_timestamp(time_max)
+        state = self._state(calendar_id)
+        with self._lock:
+            window = None if fresh else self._covering(state, start, end)
+            if window is not None and window[3]:
+                # Served by a speculatively fetched window; each window counts as used once
+                self.prefetch_hits += 1
+                self.prefetch_used += window[3] == 1
+                window[3] = 2
+        if window is not None:
+            self.window_hits += 1
+        else:
+            self.window_misses += 1
+            self.refresh(calendar_id, time_min, time_max)
+
+        with self._lock:
+            events = self._materialize(calendar_id, state, start, end)
+        events.sort(key=lambda e: e.start)
+        return events[:limit] if limit else events
+
+    def refresh(self, calendar_id: str, time_min: str, time_max: str, prefetched: bool = False):
+        """Fetch a window from the API and replace what the store knows about it.
+
+        Windows fetched before are re-requested with their etag; a 304 means the
+        events already stored are current and only the window's age is reset.
+        """
+        start, end = parse_timestamp(time_min), parse_timestamp(time_max)
+        state = self._state(calendar_id)
+        with self._lock:
+            etag = state.etags.get((time_min, time_max))
+        items, etag = self.reader.list_window(calendar_id, time_min, time_max, etag=etag,
+                                              fields=WINDOW_FIELDS, singleEvents=False)
+        fetched_at = self.clock()
+        with self._lock:
+            state.as_of = time.time()
+            state.covered.append([start.timestamp(), end.timestamp(), state.as_of])
+            if len(state.covered) > COVERED_PER_CALENDAR:
+                state.covered.pop(0)
+            if items is None:
+                self.not_modified += 1
+                state.windows.append([start, end, fetched_at, 1 if prefetched else 0])
+                return
+            state.etags.pop((time_min, time_max), None)
+            if etag:
+                state.etags[(time_min, time_max)] = etag
+                if len(state.etags) > ETAGS_PER_CALENDAR:
+                    state.etags.popitem(last=False)
+            returned = {item['id'] for item in items}
+            for event_id, event in list(state.events.items()):
+                if event_id not in returned and self._in_window(event, start, end):
+                    self._drop(state, event_id)
+            for item in items:
+                self._put(state, item)
+            state.windows.append([start, end, fetched_at, 1 if prefetched else 0])
+            # A newly fetched empty window is still news for the snapshot
+            self.version += 1
+
+    def _put(self, state: CalendarState, event: dict):
+        self.version += 1
+        state.events[event['id']] = event
+        if event.get('status') != 'cancelled' and 'start' in event and 'end' in event:
+            state.parsed[event['id']] = CalendarEvent.from_api(event)
+        else:
+            state.parsed.pop(event['id'], None)
+
+    def _drop(self, state: CalendarState, event_id: str):
+        self.version += 1
+        state.events.pop(event_id, None)
+        state.parsed.pop(event_id, None)
+
+    def _in_window(self, event: dict, start: datetime, end: datetime) -> bool:
+        if event.get('recurrence'):
+            try:
+                return bool(self._occurrences(event, start, end))
+            except RecurrenceError:
+                return True
+        if event.get('status') == 'cancelled':
+            return start <= parse_event_time(event['originalStartTime']) < end
+        return overlaps(event, start, end)
+
+    def _occurrences(self, master: dict, start: datetime, end: datetime) -> List[datetime]:
+        key = (master['id'], master.get('etag') or master.get('updated'), start, end)
+        cached = self._expansions.get(key)
+        if cached is not None:
+            self._expansions.move_to_end(key)
+            return cached
+        found = occurrences(master, start, end)
+        self._expansions[key] = found
+        if len(self._expansions) > self.expansion_cache_size:
+            self._expansions.popitem(last=False)
+        return found
+
+    def _materialize(self, calendar_id: str, state: CalendarState, start: datetime, end: datetime,
+                     local: bool = False) -> List[CalendarEvent]:
+        exceptions = {}
+        events = []
+        for event_id, event in state.events.items():
+            if event.get('recurringEventId') and event.get('originalStartTime'):
+                exceptions.setdefault(event['recurringEventId'], set()).add(
+                    instance_key(parse_event_time(event['originalStartTime'])))
+            if event.get('status') == 'cancelled' or event.get('recurrence'):
+                continue
+            parsed = state.parsed.get(event_id)
+            if parsed is not None and parsed.overlaps(start, end):
+                events.append(parsed)
+
+        for event in list(state.events.values()):
+            if not event.get('recurrence') or event.get('status') == 'cancelled':
+                continue
+            try:
+                found = self._occurrences(event, start, end)
+            except RecurrenceError:
+                # Local answers skip recurrences that need server-side expansion
+                if not local:
+                    events.extend(self._server_instances(calendar_id, event, start, end))
+                continue
+            skipped = exceptions.get(event['id'], ())
+            master = state.parsed[event['id']]
+            events.extend(master.occurrence(occurrence) for occurrence in found
+                          if instance_key(occurrence) not in skipped)
+        return events
+
+    def _server_instances(self, calendar_id: str, master: dict, start: datetime, end: datetime) -> List[CalendarEvent]:
+        """Fall back to API-side expansion for recurrences we cannot expand locally"""
+        return [
+            CalendarEvent.from_api(instance) for instance in self.reader.list_instances(calendar_id, master['id'], start.isoformat(), end.isoformat())
+            if instance.get('status') != 'cancelled' and instance['id'] not in self._state(calendar_id).events
+        ]
+
+    def sync(self, calendar_id: str) -> int:
+        """Pull changes since the last sync token (full sync without one) and apply them.
+
+        Once a calendar has been fully synced every window is answered locally
+        until desync() is called, e.g. when its push channel lapses.
+        """
+        state = self._state(calendar_id)
+        with state.sync_lock:
+            token = state.sync_token
+            try:
+                items, next_token = self.reader.list_changes(calendar_id, token)
+            except Exception as e:
+                # 410 Gone: the sync token expired, start over with a full sync
+                if token is None or getattr(getattr(e, 'resp', None), 'status', None) != 410:
+                    raise
+                token = None
+                items, next_token = self.reader.list_changes(calendar_id, None)
+
+            with self._lock:
+                if token is None:
+                    state.events = {}
+                    state.parsed = {}
+                    state.etags.clear()
+                    for item in items:
+                        if item.get('status') != 'cancelled' or item.get('recurringEventId'):
+                            self._put(state, item)
+                    state.windows = []
+                    self._expansions.clear()
+                else:
+                    # Incremental from a token, possibly one loaded from a snapshot, also yields a full copy
+                    self._apply_changes(state, items)
+                state.synced = state.complete = True
+                state.sync_token = next_token
+                state.as_of = time.time()
+                self.version += 1
+            return len(items)
+
+    def desync(self, calendar_id: str):
+        """Stop trusting the synced copy; queries fall back to TTL-bounded window fetches"""
+        with self._lock:
+            state = self._state(calendar_id)
+            state.synced = state.complete = False
+            state.sync_token = None
+            state.windows = []
+
+    def _apply_changes(self, state: CalendarState, items: List[dict]):
+        for item in items:
+            self._invalidate(state, state.events.get(item['id']))
+            self._invalidate(state, item)
+            if item.get('status') == 'cancelled' and not item.get('recurringEventId'):
+                self._drop(state, item['id'])
+            else:
+                self._put(state, item)
+
+    def _invalidate(self, state: CalendarState, event: Optional[dict]):
+        """Drop cached windows (and expansions) that a changed event may affect"""
+        if not event:
+            return
+        if event.get('recurrence'):
+            state.windows = []
+            for key in [k for k in self._expansions if k[0] == event['id']]:
+                del self._expansions[key]
+            return
+        times = [event[k] for k in ('start', 'end', 'originalStartTime') if k in event]
+        if not times:
+            return
+        moments = [parse_event_time(t) for t in times]
+        first, last = min(moments), max(moments)
+        state.windows = [w for w in state.windows if not (w[0] <= last and w[1] >= first)]
+
+    def query_local(self, calendar_id: str, time_min: str, time_max: str, limit: Optional[int] = None):
+        """Answer from memory without calling the API: (events, as_of, covered).
+
+        covered says whether the whole window was ever fetched (or the calendar was
+        synced); as_of is the wall time of the oldest fetch it relies on, or None.
+        """
+        start, end = parse_timestamp(time_min), parse_timestamp(time_max)
+        with self._lock:
+            state = self._state(calendar_id)
+            events = self._materialize(calendar_id, state, start, end, local=True)
+            if state.complete:
+                as_of, covered = state.as_of, True
+            else:
+                as_of, covered = self._coverage(state, start.timestamp(), end.timestamp())
+        events.sort(key=lambda e: e.start)
+        return (events[:limit] if limit else events), as_of, covered
+
+    @staticmethod
+    def _coverage(state: CalendarState, start: float, end: float):
+        """(oldest fetch time, whether fetched windows cover [start, end)), newest fetches preferred"""
+        cursor, oldest = start, None
+        for w_start, w_end, fetched in sorted(state.covered, key=lambda w: (w[0], -w[2])):
+            if w_start > cursor:
+                break
+            if w_end > cursor:
+                cursor = w_end
+                oldest = fetched if oldest is None else min(oldest, fetched)
+            if cursor >= end:
+                return oldest, True
+        return oldest, False
+
+    def export_state(self) -> dict:
+        """Raw events and sync state per calendar, for snapshots"""
+        with self._lock:
+            return {
+                calendar_id: {
+                    'events': list(state.events.values()),
+                    'sync_token': state.sync_token if state.synced else None,
+                    'complete': state.complete,
+                    'as_of': state.as_of,
+                    'covered': list(state.covered),
+                }
+                for calendar_id, state in self._calendars.items() if state.events or state.complete or state.covered
+            }
+
+    def load_state(self, calendars: dict):
+        """Seed from a snapshot. Loaded events only answer queries after a window fetch or sync
+        confirms them, or through query_local; a saved sync token makes the next sync incremental."""
+        with self._lock:
+            for calendar_id, saved in calendars.items():
+                state = self._state(calendar_id)
+                for event in saved['events']:
+                    self._put(state, event)
+                state.sync_token = saved['sync_token']
+                state.complete = saved['complete']
+                state.as_of = saved['as_of']
+                state.covered = saved.get('covered', [])
+
+    def upsert(self, calendar_id: str, event: dict):
+        """Record an event created or changed by this process"""
+        with self._lock:
+            self._put(self._state(calendar_id), event)
+
+    def remove(self, calendar_id: str, event: dict):
+        """Record a deletion; deleting one instance of a series becomes a cancelled exception"""
+        with self._lock:
+            state = self._state(calendar_id)
+            if event.get('recurringEventId') and event['id'] not in state.events:
+                self._put(state, {
+                    'id': event['id'],
+                    'status': 'cancelled',
+                    'recurringEventId': event['recurringEventId'],
+                    'originalStartTime': event.get('originalStartTime', event['start']),
+                })
+            elif event.get('recurringEventId'):
+                self._put(state, dict(state.events[event['id']], status='cancelled'))
+            else:
+                self._drop(state, event['id'])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_hits": self.window_hits,
+                "window_misses": self.window_misses,
+                "prefetch_hits": self.prefetch_hits,
+                "not_modified": self.not_modified,
+                "version": self.version,
+                "events": sum(len(s.events) for s in self._calendars.values()),
+                "recurring_masters": sum(1 for s in self._calendars.values() for e in s.events.values() if e.get('recurrence')),
+                "expansion_cache": len(self._expansions),
+                "synced_calendars": [c for c, s in self._calendars.items() if s.synced],
+            }
@@ -3,6 +3,7 @@ import requests
 import json
 from datetime import datetime
 import time
+import uuid
 
 # Configure the page
 st.set_page_config(
@@ -306,7 +307,7 @@ def send_message_to_agent(message):
     try:
         response = requests.post(
             f"{API_URL}/chat",
-            json={"message": message},
+            json={"message": message, "session_id": st.session_state.session_id},
             timeout=30
         )
         if response.status_code == 200:
@@ -323,12 +324,14 @@ def send_message_to_agent(message):
 def reset_conversation():
     """Reset the conversation history"""
     try:
-        response = requests.post(f"{API_URL}/reset", timeout=10)
+        response = requests.post(f"{API_URL}/reset", json={"session_id": st.session_state.session_id}, timeout=10)
         return response.status_code == 200
     except:
         return False
 
 # Initialize session state
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "conversation_started" not in st.session_state:
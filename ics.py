@@ -0,0 +1,407 @@
+"""
+Streaming iCalendar (RFC 5545) parsing and bulk import into Google Calendar
+"""
+
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from zoneinfo import ZoneInfo
+
+from availability import BusyIndex
+from recurrence import parse_event_time
+
+DURATION_PATTERN = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+def unfold_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield logical content lines from text chunks, joining folded continuation lines"""
+    pending = None
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            line = line.rstrip('\r')
+            if line[:1] in (' ', '\t') and pending is not None:
+                pending += line[1:]
+                continue
+            if pending is not None:
+                yield pending
+            pending = line
+    if buffer:
+        line = buffer.rstrip('\r')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+        else:
+            if pending is not None:
+                yield pending
+            pending = line
+    if pending is not None:
+        yield pending
+
+
+def parse_content_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """'DTSTART;TZID=Europe/Paris:20250707T100000' -> ('DTSTART', {'TZID': 'Europe/Paris'}, '20250707T100000')"""
+    in_quotes = False
+    for i, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        head, value = line, ""
+    name, *raw_params = head.split(';')
+    params = {}
+    for param in raw_params:
+        key, _, val = param.partition('=')
+        params[key.upper()] = val.strip('"')
+    return name.upper(), params, value
+
+
+def unescape_text(value: str) -> str:
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def parse_duration(value: str) -> timedelta:
+    match = DURATION_PATTERN.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"Invalid DURATION '{value}'")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                      minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -delta if sign == '-' else delta
+
+
+def to_event_time(value: str, params: Dict[str, str], default_tz) -> dict:
+    """Convert an iCalendar DATE / DATE-TIME to a Calendar API time dict"""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return {'date': datetime.strptime(value[:8], '%Y%m%d').date().isoformat()}
+    moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return {'dateTime': moment.replace(tzinfo=timezone.utc).isoformat().replace('+00:00', 'Z')}
+    tzid = params.get('TZID')
+    try:
+        tz = ZoneInfo(tzid) if tzid else default_tz
+    except (KeyError, ValueError):
+        tz = default_tz
+    return {'dateTime': moment.replace(tzinfo=tz).isoformat(), 'timeZone': str(tz)}
+
+
+def _shift(time_value: dict, delta: timedelta) -> dict:
+    if 'date' in time_value:
+        return {'date': (date.fromisoformat(time_value['date']) + delta).isoformat()}
+    shifted = dict(time_value)
+    shifted['dateTime'] = (parse_event_time({'dateTime': time_value['dateTime']}) + delta).isoformat()
+    return shifted
+
+
+def vevent_to_event(properties: List[Tuple[str, Dict[str, str], str]], default_tz=timezone.utc) -> dict:
+    """Build a Calendar API event body (for events().import_) from one VEVENT's properties"""
+    event = {}
+    recurrence = []
+    duration = None
+    for name, params, value in properties:
+        if name == 'UID':
+            event['iCalUID'] = value
+        elif name == 'SUMMARY':
+            event['summary'] = unescape_text(value)
+        elif name == 'DESCRIPTION':
+            event['description'] = unescape_text(value)
+        elif name == 'LOCATION':
+            event['location'] = unescape_text(value)
+        elif name == 'DTSTART':
+            event['start'] = to_event_time(value, params, default_tz)
+        elif name == 'DTEND':
+            event['end'] = to_event_time(value, params, default_tz)
+        elif name == 'RECURRENCE-ID':
+            event['originalStartTime'] = to_event_time(value, params, default_tz)
+        elif name == 'DURATION':
+            duration = parse_duration(value)
+        elif name == 'TRANSP' and value.upper() == 'TRANSPARENT':
+            event['transparency'] = 'transparent'
+        elif name == 'STATUS' and value.upper() == 'CANCELLED':
+            event['status'] = 'cancelled'
+        elif name in ('RRULE', 'EXDATE', 'RDATE'):
+            param_text = ''.join(f";{k}={v}" for k, v in params.items())
+            recurrence.append(f"{name}{param_text}:{value}")
+
+    if 'start' not in event:
+        raise ValueError("VEVENT without DTSTART")
+    if 'end' not in event:
+        default = timedelta(days=1) if 'date' in event['start'] else timedelta(0)
+        event['end'] = _shift(event['start'], duration if duration is not None else default)
+    if recurrence:
+        event['recurrence'] = recurrence
+        # Calendar rejects recurring imports without a start/end timeZone; a UTC DTSTART recurs in UTC
+        for key in ('start', 'end'):
+            if 'dateTime' in event[key] and 'timeZone' not in event[key]:
+                event[key]['timeZone'] = 'UTC'
+    return event
+
+
+def iter_ics_events(chunks: Iterable[str], default_tz=timezone.utc) -> Iterator[dict]:
+    """Yield events one VEVENT at a time; only the current VEVENT is held in memory.
+
+    Unparseable VEVENTs are yielded as {'error': message} so callers can report them.
+    """
+    depth = 0
+    properties = None
+    for line in unfold_lines(chunks):
+        if not line:
+            continue
+        name, params, value = parse_content_line(line)
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and properties is None:
+                properties = []
+                depth = 0
+            elif properties is not None:
+                depth += 1
+        elif name == 'END':
+            if properties is not None and depth:
+                depth -= 1
+            elif properties is not None and value.upper() == 'VEVENT':
+                try:
+                    yield vevent_to_event(properties, default_tz)
+                except (ValueError, KeyError) as e:
+                    yield {'error': str(e), 'iCalUID': next((v for n, _, v in properties if n == 'UID'), None)}
+                properties = None
+        elif properties is not None and not depth:
+            properties.append((name, params, value))
+
+
+def escape_text(value: str) -> str:
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold_line(line: str) -> str:
+    """Fold a content line at 75 octets, never splitting a UTF-8 sequence"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_event_time(name: str, time_value: dict, tz_name: str = "") -> str:
+    """DATE, local DATE-TIME with TZID when a timezone is known (so RRULEs keep their wall time
+    across DST), else UTC. TZIDs are IANA names; no VTIMEZONE blocks are written."""
+    if 'date' in time_value:
+        return f"{name};VALUE=DATE:{time_value['date'].replace('-', '')}"
+    moment = parse_event_time({'dateTime': time_value['dateTime']})
+    tz_name = time_value.get('timeZone') or tz_name
+    if tz_name and tz_name != 'UTC':
+        try:
+            local = moment.astimezone(ZoneInfo(tz_name))
+            return f"{name};TZID={tz_name}:{local.strftime('%Y%m%dT%H%M%S')}"
+        except (KeyError, ValueError):
+            pass
+    return f"{name}:{moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def event_to_vevent(event: dict, stamp: str) -> str:
+    """Serialize one Calendar API event as a folded VEVENT block.
+
+    A cancelled occurrence may come without start/end; it is written at its original start.
+    """
+    start = event.get('start') or event['originalStartTime']
+    tz_name = start.get('timeZone', '')
+    lines = ['BEGIN:VEVENT', f"UID:{event.get('iCalUID') or event.get('id')}", f"DTSTAMP:{stamp}",
+             format_event_time('DTSTART', start), format_event_time('DTEND', event.get('end') or start, tz_name)]
+    if event.get('recurringEventId') and 'originalStartTime' in event:
+        lines.append(format_event_time('RECURRENCE-ID', event['originalStartTime'], tz_name))
+    for prop, key in (('SUMMARY', 'summary'), ('DESCRIPTION', 'description'), ('LOCATION', 'location')):
+        if event.get(key):
+            lines.append(f"{prop}:{escape_text(event[key])}")
+    lines.extend(event.get('recurrence', []))
+    if event.get('status') == 'cancelled':
+        lines.append('STATUS:CANCELLED')
+    if event.get('transparency') == 'transparent':
+        lines.append('TRANSP:TRANSPARENT')
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def iter_ics(events: Iterable[dict], name: str = "") -> Iterator[str]:
+    """Stream a VCALENDAR document one VEVENT at a time"""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    header = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//AI Booking Agent//Calendar Export//EN', 'CALSCALE:GREGORIAN']
+    if name:
+        header.append(f"X-WR-CALNAME:{escape_text(name)}")
+    yield ''.join(fold_line(line) for line in header)
+    for event in events:
+        if ('start' in event and 'end' in event) or 'originalStartTime' in event:
+            yield event_to_vevent(event, stamp)
+    yield 'END:VCALENDAR\r\n'
+
+
+def instance_id(master_id: str, original_start: dict) -> str:
+    """Calendar's id for one occurrence of a recurring event: masterId_20250707T100000Z (or _20250707 all-day)"""
+    if 'date' in original_start:
+        return f"{master_id}_{original_start['date'].replace('-', '')}"
+    moment = parse_event_time({'dateTime': original_start['dateTime']}).astimezone(timezone.utc)
+    return f"{master_id}_{moment.strftime('%Y%m%dT%H%M%SZ')}"
+
+
+OVERRIDE_FIELDS = ('summary', 'description', 'location', 'start', 'end', 'status', 'transparency')
+
+
+class ImportSpool:
+    """Overrides waiting for their master and the ids of imported masters, kept in a temporary
+    SQLite file so an import's memory does not grow with the file. Created on first use."""
+
+    def __init__(self):
+        self._connection = None
+        self._path = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            fd, self._path = tempfile.mkstemp(prefix="ics-import-", suffix=".db")
+            os.close(fd)
+            self._connection = sqlite3.connect(self._path)
+            self._connection.execute("CREATE TABLE overrides (position INTEGER PRIMARY KEY, event TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE masters (uid TEXT PRIMARY KEY, id TEXT NOT NULL)")
+        return self._connection
+
+    def add_override(self, position: int, event: dict):
+        self._db().execute("INSERT INTO overrides VALUES (?, ?)", (position, json.dumps(event)))
+
+    def set_master(self, uid: str, event_id: str):
+        self._db().execute("INSERT OR REPLACE INTO masters VALUES (?, ?)", (uid, event_id))
+
+    def master(self, uid: str):
+        if self._connection is None or uid is None:
+            return None
+        row = self._connection.execute("SELECT id FROM masters WHERE uid = ?", (uid,)).fetchone()
+        return row[0] if row else None
+
+    def overrides(self, batch_size: int) -> Iterator[List[Tuple[int, dict]]]:
+        """Overrides in file order, batch_size at a time"""
+        if self._connection is None:
+            return
+        last = -1
+        while True:
+            rows = self._connection.execute("SELECT position, event FROM overrides WHERE position > ? ORDER BY position LIMIT ?",
+                                            (last, batch_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [(position, json.loads(event)) for position, event in rows]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            os.unlink(self._path)
+            self._connection = None
+
+
+def import_events(events: Iterable[dict], reader, calendar_id: str,
+                  busy_lookup: Callable[[str, str], list], store=None,
+                  batch_size: int = 50, skip_conflicts: bool = True) -> Iterator[dict]:
+    """Import events in batches, yielding one result per event plus a progress record per batch.
+
+    Conflicts are checked against a local busy index seeded from one freebusy
+    lookup per batch and extended with every event imported so far, so
+    events in the same file cannot double-book each other either.
+
+    Overrides of single occurrences (VEVENTs with a RECURRENCE-ID) are held back
+    in an ImportSpool until every master has been imported, then patched onto
+    their occurrence; an override whose recurring event is not in the file is
+    reported as an error.
+    """
+    index = BusyIndex()
+    totals = {'processed': 0, 'imported': 0, 'conflicts': 0, 'errors': 0}
+    batch: List[Tuple[int, dict]] = []
+    spool = ImportSpool()
+    position = 0
+
+    def request_for(event):
+        if 'originalStartTime' not in event:
+            return reader.service.events().import_(calendarId=calendar_id, body=event)
+        body = {key: event[key] for key in OVERRIDE_FIELDS if key in event}
+        return reader.service.events().patch(calendarId=calendar_id, body=body,
+                                             eventId=instance_id(spool.master(event['iCalUID']), event['originalStartTime']))
+
+    def flush(batch):
+        results = []
+        to_insert = []
+        windows = [(parse_event_time(e['start']), parse_event_time(e['end'])) for _, e in batch if 'error' not in e]
+        if windows:
+            start = min(w[0] for w in windows).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            end = max(w[1] for w in windows).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            index.update(busy_lookup(start, end))
+
+        for i, event in batch:
+            result = {'type': 'event', 'index': i, 'uid': event.get('iCalUID'), 'summary': event.get('summary')}
+            if 'error' in event:
+                result.update(status='error', error=event['error'])
+            elif 'originalStartTime' in event and spool.master(event.get('iCalUID')) is None:
+                result.update(status='error', error="RECURRENCE-ID override without its recurring event in this file")
+            else:
+                start, end = parse_event_time(event['start']), parse_event_time(event['end'])
+                busy = event.get('transparency') == 'transparent' or event.get('status') == 'cancelled'
+                if not busy and index.overlaps(start, end) and skip_conflicts:
+                    result['status'] = 'conflict'
+                else:
+                    if not busy:
+                        index.add(start, end)
+                    to_insert.append((result, event))
+                    continue
+            results.append(result)
+
+        if not to_insert:
+            return results
+        responses = reader.execute_batch([request_for(event) for _, event in to_insert])
+        for (result, event), (response, error) in zip(to_insert, responses):
+            if error is not None:
+                result.update(status='error', error=str(error))
+            else:
+                result.update(status='imported', id=response.get('id'))
+                if event.get('recurrence') and event.get('iCalUID'):
+                    spool.set_master(event['iCalUID'], response['id'])
+                if store is not None:
+                    store.upsert(calendar_id, response)
+            results.append(result)
+        return sorted(results, key=lambda r: r['index'])
+
+    def summarize(results):
+        for result in results:
+            totals['processed'] += 1
+            if result['status'] == 'imported':
+                totals['imported'] += 1
+            elif result['status'] == 'conflict':
+                totals['conflicts'] += 1
+            else:
+                totals['errors'] += 1
+            yield result
+        yield {'type': 'progress', **totals}
+
+    try:
+        for event in events:
+            if 'originalStartTime' in event and 'error' not in event:
+                spool.add_override(position, event)
+            else:
+                batch.append((position, event))
+            position += 1
+            if len(batch) >= batch_size:
+                yield from summarize(flush(batch))
+                batch = []
+        if batch:
+            yield from summarize(flush(batch))
+        for overrides in spool.overrides(batch_size):
+            yield from summarize(flush(overrides))
+    finally:
+        spool.close()
+    yield {'type': 'done', **totals}
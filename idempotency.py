@@ -0,0 +1,133 @@
+"""
+Idempotency keys and a TTL dedup table so retried calendar writes are safe
+"""
+
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+def idempotency_key(*parts) -> str:
+    """Stable key for a write request; whitespace and case differences are ignored"""
+    normalized = "|".join(" ".join(str(part).split()).lower() for part in parts)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def booking_key(title: str, start, end) -> str:
+    """Key for booking title from start to end (aware datetimes), shared by the agent and the serverless
+    tools so a booking made through one is recognized by the other"""
+    return idempotency_key("booking", title, start.isoformat(), end.isoformat())
+
+
+def deterministic_event_id(key: str, salt: str = "") -> str:
+    """Event id derived from the request alone, so every retry maps to the same event; a salt
+    gives a fresh id once that event was cancelled.
+
+    Hex digits are a subset of the base32hex alphabet Calendar requires for ids.
+    """
+    return hashlib.sha256(f"{key}:{salt}".encode()).hexdigest()[:40]
+
+
+class IdempotencyStore:
+    """Completed write results keyed by idempotency key, expiring after a TTL.
+
+    With a state store (see state.get_state) records are shared by every worker
+    using it; without one they live in this process. Per-key locks are always
+    process-local: a concurrent retry on another worker is caught by the
+    deterministic event id instead.
+    """
+
+    def __init__(self, ttl: float = 86400.0, clock: Callable[[], float] = time.time, state=None):
+        self.ttl = ttl
+        self.clock = clock
+        self.state = state
+        self._records = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @contextmanager
+    def lock(self, key: str):
+        """Per-key lock so concurrent retries of one request run one at a time; dropped when unused"""
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def _read(self, name: str):
+        if self.state is not None:
+            record = self.state.get(f"idempotency:{name}")
+        else:
+            with self._lock:
+                record = self._records.get(name)
+        if record and record[0] > self.clock():
+            return record[1]
+        if record:
+            self._drop(name)
+        return None
+
+    def _write(self, name: str, value):
+        record = (self.clock() + self.ttl, value)
+        if self.state is not None:
+            self.state.set(f"idempotency:{name}", record)
+            return
+        with self._lock:
+            now = self.clock()
+            self._records[name] = record
+            if len(self._records) % 256 == 0:
+                self._records = {k: r for k, r in self._records.items() if r[0] > now}
+
+    def _drop(self, name: str):
+        if self.state is not None:
+            self.state.delete(f"idempotency:{name}")
+        else:
+            with self._lock:
+                self._records.pop(name, None)
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict):
+        """Record a completed write; a value with an event_id is dropped again when that event is deleted"""
+        self._write(key, value)
+        if value.get('event_id'):
+            self._write(f"event:{value['event_id']}", key)
+
+    def invalidate_event(self, event_id: str) -> bool:
+        """Forget the write that created event_id, so retrying it books again instead of replaying"""
+        key = self._read(f"event:{event_id}")
+        if key is None:
+            return False
+        self._drop(key)
+        self._drop(f"event:{event_id}")
+        with self._lock:
+            self.invalidated += 1
+        return True
+
+    def stats(self) -> dict:
+        """Counters; with a state store, entries are counted in the backend (a key scan)"""
+        if self.state is not None:
+            entries = self.state.count("idempotency:") - self.state.count("idempotency:event:")
+        else:
+            with self._lock:
+                entries = sum(1 for name in self._records if not name.startswith("event:"))
+        with self._lock:
+            return {"shared": self.state is not None, "entries": entries, "locks": len(self._locks),
+                    "hits": self.hits, "misses": self.misses, "invalidated": self.invalidated}
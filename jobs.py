@@ -0,0 +1,214 @@
+"""
+Persistent background jobs: a SQLite job table and a small worker pool
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable, Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    message TEXT,
+    checkpoint TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class JobContext:
+    """Handle given to a job handler for reporting progress and saving resumable state"""
+
+    def __init__(self, queue: 'JobQueue', job: dict):
+        self.queue = queue
+        self.id = job['id']
+        self.params = job['params']
+        self.checkpoint = job['checkpoint'] or {}
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        self.queue._update(self.id, done=done, total=total, message=message)
+
+    def save(self, checkpoint: dict):
+        """Persist state so a job interrupted by a restart resumes instead of starting over"""
+        self.checkpoint = checkpoint
+        self.queue._update(self.id, checkpoint=json.dumps(checkpoint))
+
+
+class JobQueue:
+    """Jobs survive restarts; any worker process sharing the database file can claim them.
+
+    Running jobs whose heartbeat is older than stale_after (crashed or
+    redeployed worker) are put back in the queue and resumed from their checkpoint;
+    each such requeue counts as an attempt, so a job that keeps killing its worker
+    fails after max_attempts. A worker heartbeats its running job every
+    stale_after / 3 whether or not the handler reports progress.
+    """
+
+    def __init__(self, path: str = "jobs.db", workers: int = 2, stale_after: float = 300.0,
+                 max_attempts: int = 3, poll_interval: float = 1.0):
+        self.path = path
+        self.workers = workers
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, Callable] = {}
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._connection().execute(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def register(self, kind: str, handler: Callable[[JobContext], dict]):
+        """handler(job) runs in a worker thread and returns a JSON-serializable result"""
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, params: dict) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, json.dumps(params), now, now))
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, limit: int = 20) -> list:
+        rows = self._connection().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._to_dict(row) for row in rows]
+
+    def _to_dict(self, row) -> dict:
+        job = dict(row)
+        for key in ('params', 'checkpoint', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def _update(self, job_id: str, **fields):
+        fields = {k: v for k, v in fields.items() if v is not None}
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        self._connection().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _claim(self) -> Optional[dict]:
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', owner = NULL, updated_at = ?,"
+                " error = 'Worker stopped responding', message = 'Worker stopped responding'"
+                " WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+                (now, now - self.stale_after, self.max_attempts))
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running' AND updated_at < ?",
+                (now - self.stale_after,))
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (self.owner, now, row['id']))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        job = self._to_dict(row)
+        job['attempts'] += 1
+        return job
+
+    def run_next(self) -> bool:
+        """Claim and run one queued job; returns False when the queue is empty"""
+        job = self._claim()
+        if job is None:
+            return False
+        handler = self.handlers.get(job['kind'])
+        beating = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], beating),
+                                     name=f"job-heartbeat-{job['id']}", daemon=True)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind {job['kind']}")
+            result = handler(JobContext(self, job))
+            self._update(job['id'], status="succeeded", result=json.dumps(result), message="Done")
+        except Exception as e:
+            retry = job['attempts'] < self.max_attempts and handler is not None
+            print(f"⚠️ Job {job['id']} ({job['kind']}) failed: {e}")
+            self._update(job['id'], status="queued" if retry else "failed", error=str(e),
+                         message=traceback.format_exception_only(type(e), e)[-1].strip())
+        finally:
+            beating.set()
+        return True
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        """Keep a slow but alive job from being taken for a crashed one"""
+        while not done.wait(self.stale_after / 3):
+            try:
+                self._connection().execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                    (time.time(), job_id, self.owner))
+            except sqlite3.Error as e:
+                print(f"⚠️ Job heartbeat failed for {job_id}: {e}")
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                if self.run_next():
+                    continue
+            except sqlite3.Error as e:
+                print(f"⚠️ Job queue error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the worker threads; they are separate from the request threadpool"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": len(self._threads), **{status: count for status, count in rows}}
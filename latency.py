@@ -0,0 +1,14 @@
+"""
+Shared latency statistics helpers
+"""
+
+import math
+from typing import Optional
+
+
+def percentile(values, q: float) -> Optional[float]:
+    """Nearest-rank percentile of a sequence, or None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
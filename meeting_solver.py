@@ -0,0 +1,113 @@
+"""
+Multi-attendee meeting-time solver over per-attendee busy bitmaps
+"""
+
+import math
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from availability import Interval, MINUTES_PER_DAY, _wall_minutes, rasterize
+
+MeetingSlot = namedtuple('MeetingSlot', ['start', 'end', 'fragments', 'outside_hours'])
+WorkingHours = namedtuple('WorkingHours', ['tz', 'work_start', 'work_end', 'workdays'])
+
+PREFERENCES = ("earliest", "fewest_gaps", "working_hours")
+
+
+def hours_mask(origin: datetime, days: int, resolution: int, hours: WorkingHours) -> np.ndarray:
+    """Flat mask of organizer-grid slots inside someone's working hours in their own timezone"""
+    slots_per_day = MINUTES_PER_DAY // resolution
+    offsets = []
+    for day in range(days):
+        noon = datetime.combine(origin.date() + timedelta(days=day), time(12))
+        shift = noon.replace(tzinfo=hours.tz).utcoffset() - noon.replace(tzinfo=origin.tzinfo).utcoffset()
+        offsets.append(shift.total_seconds() // 60)
+    local = np.arange(days * slots_per_day) * resolution + np.repeat(np.array(offsets, dtype=np.int64), slots_per_day)
+    minute_of_day = local % MINUTES_PER_DAY
+    weekday = (origin.weekday() + local // MINUTES_PER_DAY) % 7
+    return (minute_of_day >= hours.work_start) & (minute_of_day + resolution <= hours.work_end) \
+        & np.isin(weekday, list(hours.workdays))
+
+
+def _window_sums(flags: np.ndarray, need: int) -> np.ndarray:
+    """Count of True values in every window of length need along the last axis"""
+    counts = np.cumsum(flags, axis=-1, dtype=np.int32)
+    counts = np.concatenate([np.zeros(flags.shape[:-1] + (1,), dtype=np.int32), counts], axis=-1)
+    return counts[..., need:] - counts[..., :-need]
+
+
+def _run_lengths(free: np.ndarray) -> np.ndarray:
+    """Length of the free run ending at each position (inclusive) along the last axis"""
+    positions = np.arange(free.shape[-1])
+    last_busy = np.maximum.accumulate(np.where(free, -1, positions), axis=-1)
+    return positions - last_busy
+
+
+def solve_meeting_time(busy_by_attendee: Dict[str, Sequence[Interval]], start_date: date, days: int,
+                       duration_minutes: int, organizer_hours: WorkingHours,
+                       attendee_hours: Optional[Dict[str, WorkingHours]] = None,
+                       preference: str = "earliest", resolution: int = 5, step_minutes: int = 15,
+                       min_fragment_minutes: int = 30, buffer_minutes: int = 0, limit: int = 5,
+                       not_before: Optional[datetime] = None) -> List[MeetingSlot]:
+    """Rank non-overlapping slots when every attendee is free within the organizer's working hours.
+
+    fragments counts attendees left with a free gap shorter than min_fragment_minutes
+    next to the meeting; outside_hours counts attendees outside their own working hours.
+    """
+    if preference not in PREFERENCES:
+        raise ValueError(f"Unknown preference '{preference}', expected one of {', '.join(PREFERENCES)}")
+
+    origin = datetime.combine(start_date, time(), tzinfo=organizer_hours.tz)
+    total = days * (MINUTES_PER_DAY // resolution)
+    need = math.ceil(duration_minutes / resolution)
+    attendees = list(busy_by_attendee)
+    if total < need:
+        return []
+
+    busy = np.stack([rasterize(busy_by_attendee[a], origin, days, resolution, buffer_minutes).ravel()
+                     for a in attendees]) if attendees else np.zeros((0, total), dtype=bool)
+    own_hours = np.stack([hours_mask(origin, days, resolution, (attendee_hours or {}).get(a, organizer_hours))
+                          for a in attendees]) if attendees else np.zeros((0, total), dtype=bool)
+
+    joint_free = hours_mask(origin, days, resolution, organizer_hours) & ~busy.any(axis=0)
+    if not_before is not None:
+        joint_free[:max(0, math.ceil(_wall_minutes(not_before, origin) / resolution))] = False
+
+    starts = np.flatnonzero(_window_sums(joint_free, need) == need)
+    starts = starts[starts % max(1, step_minutes // resolution) == 0]
+    if starts.size == 0:
+        return []
+
+    # Leftover free run before and after the meeting for each attendee, within their own hours
+    person_free = ~busy & own_hours
+    before = np.where(starts > 0, _run_lengths(person_free)[:, np.maximum(starts - 1, 0)], 0)
+    after_index = np.minimum(starts + need, total - 1)
+    after = np.where(starts + need < total, _run_lengths(person_free[:, ::-1])[:, total - 1 - after_index], 0)
+    small = math.ceil(min_fragment_minutes / resolution)
+    fragments = (((before > 0) & (before < small)) | ((after > 0) & (after < small))).sum(axis=0)
+    outside = (_window_sums(own_hours, need)[:, starts] < need).sum(axis=0)
+
+    if preference == "fewest_gaps":
+        order = np.lexsort((starts, outside, fragments))
+    elif preference == "working_hours":
+        order = np.lexsort((starts, fragments, outside))
+    else:
+        order = np.arange(starts.size)
+
+    to_datetime = lambda index: (origin.replace(tzinfo=None) + timedelta(minutes=int(index) * resolution)).replace(tzinfo=organizer_hours.tz)
+    picked = []
+    taken = []
+    for i in order:
+        start = int(starts[i])
+        if any(start < t + need and t < start + need for t in taken):
+            continue
+        taken.append(start)
+        slot_start = to_datetime(start)
+        picked.append(MeetingSlot(slot_start, slot_start + timedelta(minutes=duration_minutes),
+                                  int(fragments[i]), int(outside[i])))
+        if len(picked) >= limit:
+            break
+    return picked
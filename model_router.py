@@ -0,0 +1,232 @@
+"""
+Latency-aware routing across Gemini chat models with circuit breaking and hedging
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, List, Optional, Tuple
+
+from latency import percentile
+
+try:
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.outputs import ChatGeneration, ChatResult
+except ImportError:
+    # The router only needs objects with invoke(); the LangChain adapter below needs LangChain
+    BaseChatModel = None
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """A call was refused because the model's circuit is open or its half-open probe is in flight"""
+
+
+class ModelStats:
+    """Rolling latency/error window and circuit breaker state for one model"""
+
+    def __init__(self, name: str, window: int = 50, error_threshold: float = 0.5,
+                 min_calls: int = 5, cooldown: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.clock = clock
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def _cool_down(self):
+        if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probing = False
+
+    def available(self) -> bool:
+        """Whether a call would be admitted now; an open circuit turns half-open after the cooldown"""
+        with self.lock:
+            self._cool_down()
+            return self.state == CLOSED or (self.state == HALF_OPEN and not self.probing)
+
+    def admit(self) -> bool:
+        """Claim a call slot; while half-open only one probe is let through until it succeeds or fails"""
+        with self.lock:
+            self._cool_down()
+            if self.state == OPEN or (self.state == HALF_OPEN and self.probing):
+                return False
+            if self.state == HALF_OPEN:
+                self.probing = True
+            return True
+
+    def record_success(self, latency: float):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes.append(False)
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.probing = False
+                self.outcomes.clear()
+
+    def record_failure(self):
+        with self.lock:
+            self.outcomes.append(True)
+            if self.state == HALF_OPEN or (
+                len(self.outcomes) >= self.min_calls and self._error_rate() >= self.error_threshold
+            ):
+                self.state = OPEN
+                self.probing = False
+                self.opened_at = self.clock()
+
+    def _error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def latency(self, q: float) -> Optional[float]:
+        """Latency percentile, or None until enough samples have been seen"""
+        with self.lock:
+            if len(self.latencies) < self.min_calls:
+                return None
+            return percentile(self.latencies, q)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "state": self.state,
+                "calls": len(self.outcomes),
+                "error_rate": round(self._error_rate(), 3),
+                "p50": percentile(self.latencies, 0.5),
+                "p95": percentile(self.latencies, 0.95),
+            }
+
+
+class ModelRouter:
+    """Send each call to the fastest healthy model, optionally hedging to the next one"""
+
+    def __init__(self, models: List[Tuple[str, Any]], hedge: bool = False,
+                 hedge_quantile: float = 0.95, hedge_min_delay: float = 0.5,
+                 max_workers: int = 4, clock: Callable[[], float] = time.monotonic,
+                 **stats_kwargs):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = [(name, model, ModelStats(name, clock=clock, **stats_kwargs)) for name, model in models]
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.clock = clock
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-hedge") if hedge else None
+
+    def candidates(self) -> list:
+        """Healthy models, fastest median first; configured order until latencies are known"""
+        healthy = [entry for entry in self.models if entry[2].available()]
+        medians = [entry[2].latency(0.5) for entry in healthy]
+        if all(m is not None for m in medians):
+            healthy = [entry for _, entry in sorted(zip(medians, healthy), key=lambda pair: pair[0])]
+        return healthy
+
+    def invoke(self, messages, **kwargs):
+        candidates = self.candidates()
+        if not candidates:
+            raise RuntimeError("No Gemini models available: all circuits are open")
+
+        tried = set()
+        last_error = None
+        for index, entry in enumerate(candidates):
+            if entry[0] in tried:
+                continue
+            backup = candidates[index + 1] if index + 1 < len(candidates) else None
+            try:
+                return self._hedged_call(entry, backup, messages, kwargs, tried)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def warm_up(self, messages) -> dict:
+        """Call every model once, concurrently, to open connections and seed latency stats"""
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(self.models) or 1, thread_name_prefix="model-warmup") as pool:
+            futures = {entry[0]: pool.submit(self._call, entry, messages, {}) for entry in self.models}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                    results[name] = "ok"
+                except Exception as e:
+                    results[name] = f"error: {e}"
+        return results
+
+    def _call(self, entry, messages, kwargs):
+        name, model, stats = entry
+        if not stats.admit():
+            raise CircuitOpenError(f"{name} is not accepting calls: circuit {stats.state}")
+        started = self.clock()
+        try:
+            result = model.invoke(messages, **kwargs)
+        except Exception:
+            stats.record_failure()
+            raise
+        stats.record_success(self.clock() - started)
+        return result
+
+    def _hedge_delay(self, stats: ModelStats) -> Optional[float]:
+        tail = stats.latency(self.hedge_quantile)
+        return None if tail is None else max(self.hedge_min_delay, tail)
+
+    def _hedged_call(self, entry, backup, messages, kwargs, tried: set):
+        tried.add(entry[0])
+        delay = self._hedge_delay(entry[2]) if self.hedge and backup else None
+        if delay is None:
+            return self._call(entry, messages, kwargs)
+
+        primary = self._executor.submit(self._call, entry, messages, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not backup[2].available():
+            return primary.result()
+
+        with self._lock:
+            self.hedges += 1
+        tried.add(backup[0])
+        secondary = self._executor.submit(self._call, backup, messages, kwargs)
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            hedges, hedge_wins = self.hedges, self.hedge_wins
+        return {
+            "models": {name: stats.snapshot() for name, _, stats in self.models},
+            "hedges": hedges,
+            "hedge_wins": hedge_wins,
+        }
+
+
+if BaseChatModel is not None:
+    class RoutedChatModel(BaseChatModel):
+        """LangChain chat model that delegates every generation to a ModelRouter"""
+
+        router: Any
+
+        @property
+        def _llm_type(self) -> str:
+            return "routed-chat-model"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            message = self.router.invoke(messages, stop=stop, **kwargs)
+            return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,102 @@
+"""
+Speculative prefetch of the date windows a conversation is likely to ask about next
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Tuple
+
+
+def adjacent_window(day: date, tz=timezone.utc) -> Tuple[str, str]:
+    """Window from the day before through the rest of that week (always including the next day), days in tz"""
+    start = datetime(day.year, day.month, day.day, tzinfo=tz) - timedelta(days=1)
+    end = start + timedelta(days=max(3, 8 - day.weekday()))
+    return (start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            end.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+
+class Prefetcher:
+    """Fetches windows into the event store in the background, within a budget.
+
+    At most budget windows are fetched per minute (token bucket) and at most
+    max_pending wait at once; windows the store already covers are skipped.
+    A single worker keeps prefetching from competing with foreground reads.
+    """
+
+    def __init__(self, store, budget: int = 20, max_pending: int = 8, workers: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.store = store
+        self.budget = budget
+        self.max_pending = max_pending
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._tokens = float(budget)
+        self._refilled_at = clock()
+        self.scheduled = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.fetched = 0
+        self.errors = 0
+
+    def _take_token(self) -> bool:
+        now = self.clock()
+        self._tokens = min(self.budget, self._tokens + (now - self._refilled_at) * self.budget / 60)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def prefetch(self, calendar_ids: list, time_min: str, time_max: str):
+        """Queue a window for each calendar; returns immediately"""
+        if self.budget <= 0:
+            return
+        for calendar_id in calendar_ids:
+            key = (calendar_id, time_min, time_max)
+            if self.store.covers(calendar_id, time_min, time_max):
+                with self._lock:
+                    self.skipped += 1
+                continue
+            with self._lock:
+                if key in self._pending:
+                    self.skipped += 1
+                    continue
+                if len(self._pending) >= self.max_pending or not self._take_token():
+                    self.dropped += 1
+                    continue
+                self._pending.add(key)
+                self.scheduled += 1
+            self._executor.submit(self._fetch, key)
+
+    def _fetch(self, key: tuple):
+        try:
+            self.store.refresh(*key, prefetched=True)
+            with self._lock:
+                self.fetched += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"⚠️ Prefetch of {key[0]} {key[1]}..{key[2]} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self) -> dict:
+        used = self.store.prefetch_used
+        with self._lock:
+            return {
+                "budget_per_minute": self.budget,
+                "scheduled": self.scheduled,
+                "skipped": self.skipped,
+                "dropped": self.dropped,
+                "fetched": self.fetched,
+                "errors": self.errors,
+                "pending": len(self._pending),
+                "used": used,
+                "hits": self.store.prefetch_hits,
+                "hit_rate": round(used / self.fetched, 3) if self.fetched else 0.0,
+            }
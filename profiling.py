@@ -0,0 +1,120 @@
+"""
+Opt-in per-request profiling: cProfile dumps or sampled collapsed stacks for flamegraphs
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from typing import Optional
+
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "booking-agent-profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{16}\.(prof|txt|collapsed)$")
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(PROFILE_ADMIN_TOKEN) and bool(token) and secrets.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def requested_mode(header: Optional[str], token: Optional[str]) -> Optional[str]:
+    """Profiling mode for a request: explicit via header + admin token, else by sampling rate"""
+    if header and header.lower() in PROFILE_MODES and is_admin(token):
+        return header.lower()
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval from a helper thread; cheap enough for production"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+
+def _save(suffix: str, data: bytes) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{uuid.uuid4().hex[:16]}.{suffix}"
+    with open(os.path.join(PROFILE_DIR, profile_id), "wb") as f:
+        f.write(data)
+    artifacts = sorted((entry for entry in os.scandir(PROFILE_DIR) if PROFILE_ID_PATTERN.match(entry.name)),
+                       key=lambda entry: entry.stat().st_mtime)
+    for old in artifacts[:-PROFILE_KEEP]:
+        try:
+            os.remove(old.path)
+        except OSError:
+            pass
+    return profile_id
+
+
+def run_profiled(mode: str, fn, *args, **kwargs):
+    """Call fn in the current thread under the given profiler; returns (result, profile ids).
+
+    Only the calling thread is profiled; work fanned out to pool threads shows up as waits.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        # Same format as Profile.dump_stats, readable by pstats, snakeviz or flameprof
+        raw_id = _save("prof", marshal.dumps(profiler.stats))
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        text_id = _save("txt", summary.getvalue().encode())
+        return result, [raw_id, text_id]
+
+    sampler = SamplingProfiler(threading.get_ident())
+    sampler.start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        stacks = sampler.stop()
+    lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+    return result, [_save("collapsed", "\n".join(lines).encode())]
+
+
+def artifact_path(profile_id: str) -> Optional[str]:
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id)
+    return path if os.path.exists(path) else None
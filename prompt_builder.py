@@ -0,0 +1,100 @@
+"""
+Per-turn prompt assembly: a fixed instruction prefix, budgeted history and token accounting
+"""
+
+import math
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+# Byte-identical on every turn so providers can reuse it as a cached prefix; nothing per-turn goes here
+PREFIX = """You are a calendar booking assistant working on the user's Google Calendar.
+Use the tools to check availability, find free time, book and remove events.
+Each message starts with the current date and time. Pass dates as YYYY-MM-DD and times as HH:MM (24h) to tools.
+Answer concisely.
+
+TOOLS:
+------
+
+You have access to the following tools:"""
+
+PLACEHOLDERS = ("{chat_history}", "{input}", "{agent_scratchpad}")
+
+Turn = namedtuple('Turn', ['input', 'history_limit', 'report'])
+
+
+class PromptBuilder:
+    """Builds the per-turn input and trims history so static + history + input fits the token budget"""
+
+    def __init__(self, budget: int = 4000, prefix: str = PREFIX, chars_per_token: int = 4):
+        self.budget = budget
+        self.prefix = prefix
+        self.chars_per_token = chars_per_token
+        self.static_tokens = self.estimate(prefix)
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.trimmed_messages = 0
+        self.over_budget = 0
+        self.last_report = {}
+
+    def estimate(self, text: str) -> int:
+        """Rough token count (about four characters per token for English text)"""
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def set_template(self, template: str):
+        """Measure the agent's rendered static prompt: prefix, tool descriptions and format rules"""
+        for placeholder in PLACEHOLDERS:
+            template = template.replace(placeholder, "")
+        self.static_tokens = self.estimate(template)
+
+    def turn_input(self, message: str, now: datetime) -> str:
+        return f"Current: {now.strftime('%Y-%m-%d %I:%M %p')}\n\n{message}"
+
+    def build(self, message: str, history: list, now: datetime) -> Turn:
+        """Newest history messages are kept first; older ones are dropped once the budget is reached"""
+        text = self.turn_input(message, now)
+        input_tokens = self.estimate(text)
+        remaining = self.budget - self.static_tokens - input_tokens
+        history_tokens = 0
+        kept = 0
+        for msg in reversed(history):
+            role = "Human" if msg.type == "human" else "AI"
+            tokens = self.estimate(f"{role}: {msg.content}\n")
+            if history_tokens + tokens > remaining:
+                break
+            history_tokens += tokens
+            kept += 1
+
+        total = self.static_tokens + history_tokens + input_tokens
+        report = {
+            "static": self.static_tokens,
+            "history": history_tokens,
+            "input": input_tokens,
+            "total": total,
+            "budget": self.budget,
+            "history_messages": kept,
+            "trimmed_messages": len(history) - kept,
+        }
+        with self._lock:
+            self.turns += 1
+            self.total_tokens += total
+            self.max_tokens = max(self.max_tokens, total)
+            self.trimmed_messages += len(history) - kept
+            self.over_budget += total > self.budget
+            self.last_report = report
+        return Turn(text, kept, report)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "static_tokens": self.static_tokens,
+                "turns": self.turns,
+                "avg_tokens": round(self.total_tokens / self.turns) if self.turns else 0,
+                "max_tokens": self.max_tokens,
+                "trimmed_messages": self.trimmed_messages,
+                "over_budget": self.over_budget,
+                "last": self.last_report,
+            }
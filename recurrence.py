@@ -0,0 +1,127 @@
+"""
+Local expansion of recurring Google Calendar events (RRULE / RDATE / EXDATE)
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+from dateutil.rrule import rrulestr, rruleset
+
+
+class RecurrenceError(ValueError):
+    """Raised when a recurrence cannot be expanded locally"""
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an RFC 3339 timestamp as used by the Calendar API into an aware datetime"""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def parse_event_time(value: dict) -> datetime:
+    """Aware start/end of an event time dict; all-day dates are midnight UTC"""
+    if 'dateTime' in value:
+        dt = parse_timestamp(value['dateTime'])
+        if value.get('timeZone'):
+            try:
+                dt = dt.astimezone(ZoneInfo(value['timeZone']))
+            except (KeyError, ValueError):
+                pass
+        return dt
+    return datetime.strptime(value['date'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+def _parse_ical_value(value: str, params: list, tz) -> datetime:
+    """Parse an EXDATE/RDATE value honouring TZID and VALUE=DATE parameters"""
+    if 'VALUE=DATE' in params or len(value) == 8:
+        dt = datetime.strptime(value[:8], '%Y%m%d')
+        return dt if tz is None else dt.replace(tzinfo=tz)
+    dt = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        dt = dt.replace(tzinfo=timezone.utc)
+    else:
+        tzid = next((p[5:] for p in params if p.startswith('TZID=')), None)
+        dt = dt.replace(tzinfo=ZoneInfo(tzid) if tzid else tz)
+    if tz is None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+    return dt
+
+
+def build_ruleset(master: dict) -> rruleset:
+    """Build a dateutil ruleset from a master event; all-day series use naive datetimes"""
+    all_day = 'date' in master['start']
+    start = parse_event_time(master['start'])
+    dtstart = start.replace(tzinfo=None) if all_day else start
+    tz = None if all_day else start.tzinfo
+
+    rules = rruleset()
+    try:
+        for line in master.get('recurrence', []):
+            head, _, value = line.partition(':')
+            name, *params = head.split(';')
+            if name == 'RRULE':
+                rules.rrule(rrulestr(value, dtstart=dtstart))
+            elif name in ('EXDATE', 'RDATE'):
+                for item in value.split(','):
+                    dt = _parse_ical_value(item.strip(), params, tz)
+                    if name == 'EXDATE':
+                        rules.exdate(dt)
+                    else:
+                        rules.rdate(dt)
+    except (ValueError, KeyError) as e:
+        raise RecurrenceError(f"Cannot expand recurrence of {master.get('id')}: {e}") from e
+    return rules
+
+
+def occurrences(master: dict, window_start: datetime, window_end: datetime,
+                rules: Optional[rruleset] = None) -> List[datetime]:
+    """Start times of the master's instances overlapping [window_start, window_end)"""
+    all_day = 'date' in master['start']
+    duration = parse_event_time(master['end']) - parse_event_time(master['start'])
+    rules = rules or build_ruleset(master)
+
+    after = window_start - duration
+    before = window_end
+    if all_day:
+        after = after.astimezone(timezone.utc).replace(tzinfo=None)
+        before = before.astimezone(timezone.utc).replace(tzinfo=None)
+    try:
+        found = rules.between(after, before, inc=False)
+    except TypeError as e:
+        raise RecurrenceError(f"Cannot expand recurrence of {master.get('id')}: {e}") from e
+    if all_day:
+        return [dt.replace(tzinfo=timezone.utc) for dt in found]
+    return found
+
+
+def instance_key(start: datetime) -> str:
+    """Stable UTC key of an instance's original start, shared with exception events"""
+    return start.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def make_instance(master: dict, start: datetime) -> dict:
+    """Materialize one instance in the same shape the API returns with singleEvents=True"""
+    all_day = 'date' in master['start']
+    duration = parse_event_time(master['end']) - parse_event_time(master['start'])
+    end = start + duration
+
+    instance = {k: v for k, v in master.items() if k != 'recurrence'}
+    instance['recurringEventId'] = master['id']
+    if all_day:
+        instance['id'] = f"{master['id']}_{start.strftime('%Y%m%d')}"
+        instance['start'] = {'date': start.date().isoformat()}
+        instance['end'] = {'date': end.date().isoformat()}
+    else:
+        time_zone = master['start'].get('timeZone')
+        instance['id'] = f"{master['id']}_{instance_key(start)}"
+        instance['start'] = {'dateTime': start.isoformat(), **({'timeZone': time_zone} if time_zone else {})}
+        instance['end'] = {'dateTime': end.isoformat(), **({'timeZone': time_zone} if time_zone else {})}
+    instance['originalStartTime'] = dict(instance['start'])
+    return instance
+
+
+def expand(master: dict, window_start: datetime, window_end: datetime) -> List[dict]:
+    """All instances of a recurring master overlapping the window"""
+    return [make_instance(master, start) for start in occurrences(master, window_start, window_end)]
+
@@ -0,0 +1,169 @@
+"""
+Adaptive timeouts, hedged reads and jittered backoff for Calendar API calls
+"""
+
+import copy
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+from latency import percentile
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CallTimeout(TimeoutError):
+    """A Calendar call did not finish within its adaptive timeout"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """429/5xx, rate-limit 403s, timeouts and connection errors are worth retrying"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 403:
+            return b'ateLimitExceeded' in (error.content or b'')
+        return status in RETRYABLE_STATUSES
+    return isinstance(error, (CallTimeout, socket.timeout, ConnectionError, TimeoutError))
+
+
+def clone_request(request):
+    """Independent copy of a request so a hedge can run alongside the original"""
+    clone = copy.copy(request)
+    if isinstance(getattr(request, 'headers', None), dict):
+        clone.headers = dict(request.headers)
+    return clone
+
+
+class ResilientExecutor:
+    """Runs requests with a p99-based timeout, hedges slow reads and backs off on transient errors"""
+
+    def __init__(self, execute: Callable, pool_size: int = 8, window: int = 200, min_samples: int = 20,
+                 min_timeout: float = 2.0, max_timeout: float = 30.0, timeout_multiplier: float = 2.0,
+                 hedge: bool = True, hedge_quantile: float = 0.95, hedge_min_delay: float = 0.05,
+                 max_attempts: int = 4, base_backoff: float = 0.25, max_backoff: float = 8.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 jitter: Callable[[], float] = random.random):
+        self._execute = execute
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="calendar-call")
+        # Only reads feed the timeout and hedge quantiles; writes and batches are slower by nature
+        self.latencies = deque(maxlen=window)
+        self.write_latencies = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "retries": 0, "failures": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            return percentile(self.latencies, q)
+
+    def timeout(self) -> float:
+        """Adaptive per-attempt timeout: a multiple of the observed p99, clamped"""
+        p99 = self._quantile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        tail = self._quantile(self.hedge_quantile)
+        return None if tail is None or not self.hedge else max(self.hedge_min_delay, tail)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return self.jitter() * min(self.max_backoff, self.base_backoff * (2 ** attempt))
+
+    def _timed(self, request, samples=None):
+        started = self.clock()
+        result = self._execute(request)
+        with self._lock:
+            (self.latencies if samples is None else samples).append(self.clock() - started)
+        return result
+
+    def read(self, request):
+        """Idempotent call: adaptive timeout, hedged duplicate after the p95 delay, retries"""
+        return self._with_retries(lambda: self._hedged(request))
+
+    def write(self, request):
+        """Mutating call: no hedging or abandonment, only backoff on transient errors"""
+        return self._with_retries(lambda: self._timed(clone_request(request), self.write_latencies))
+
+    def _with_retries(self, attempt_fn):
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            try:
+                return attempt_fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                self.sleep(self.backoff(attempt))
+
+    def _hedged(self, request):
+        deadline = self.clock() + self.timeout()
+        delay = self.hedge_delay()
+        primary = self._pool.submit(self._timed, clone_request(request))
+        pending = {primary}
+        hedged = None
+
+        if delay is not None:
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                self._count("hedges")
+                hedged = self._pool.submit(self._timed, clone_request(request))
+                pending.add(hedged)
+
+        error = None
+        try:
+            while pending:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedged:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = error or future.exception()
+            if error is not None and not pending:
+                raise error
+            self._count("timeouts")
+            raise CallTimeout(f"Calendar call exceeded {self.timeout():.2f}s")
+        finally:
+            # The loser (or a hedge still queued behind a busy pool) must not run or hold a worker
+            for future in pending:
+                future.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["p50"] = percentile(self.latencies, 0.5)
+            stats["p99"] = percentile(self.latencies, 0.99)
+            stats["write_p50"] = percentile(self.write_latencies, 0.5)
+            stats["write_p99"] = percentile(self.write_latencies, 0.99)
+        stats["timeout"] = self.timeout()
+        return stats
@@ -0,0 +1,159 @@
+"""
+Cold-start benchmark for the serverless entry point (api/main.py)
+
+Each run is a fresh interpreter, as on a new serverless instance: it imports
+the app, answers one tool-calling chat against the fake Calendar and a scripted
+Gemini stand-in, then a second (warm) one. Fails if the medians exceed the budget.
+
+    python scripts/bench_coldstart.py --runs 10 --budget-ms 1500 --rss-budget-mb 150
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+FORBIDDEN_MODULES = ("langchain", "langchain_core", "langchain_google_genai", "numpy")
+
+
+class FakeFunctionCall:
+    def __init__(self, name: str = "", args: dict = None):
+        self.name = name
+        self.args = args or {}
+
+
+class FakePart:
+    def __init__(self, text: str = "", function_call: FakeFunctionCall = None):
+        self.text = text
+        self.function_call = function_call
+
+
+class FakeResponse:
+    def __init__(self, parts: list):
+        content = type("Content", (), {"parts": parts})()
+        self.candidates = [type("Candidate", (), {"content": content})()]
+        self.text = "".join(part.text for part in parts)
+
+
+class FakeChat:
+    """Asks for a slot suggestion, then a booking, then answers with the tool results"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.turn = 0
+
+    def send_message(self, content):
+        time.sleep(self.latency)
+        self.turn += 1
+        if self.turn == 1:
+            return FakeResponse([FakePart(function_call=FakeFunctionCall("suggest_time_slots", {"date": "2030-01-07"}))])
+        if self.turn == 2:
+            return FakeResponse([FakePart(function_call=FakeFunctionCall(
+                "book_appointment", {"title": "Bench", "date": "2030-01-07", "start_time": "10:00", "duration_minutes": 30.0}))])
+        return FakeResponse([FakePart(text=content[0]["function_response"]["response"]["result"])])
+
+
+class FakeModel:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def start_chat(self):
+        return FakeChat(self.latency)
+
+
+def child(model_latency: float):
+    started = time.perf_counter()
+    sys.path.insert(0, root_dir)
+    sys.path.insert(0, current_dir)
+    import api.main
+    import_ms = (time.perf_counter() - started) * 1000
+
+    from fake_calendar import FakeCalendarService
+    from api.calendar_tools import set_calendar_service
+
+    set_calendar_service(FakeCalendarService())
+    api.main.set_model(FakeModel(model_latency))
+    chat_started = time.perf_counter()
+    result = api.main.run_chat("Book me 30 minutes on January 7th 2030")
+    first_chat_ms = (time.perf_counter() - chat_started) * 1000
+    chat_started = time.perf_counter()
+    api.main.run_chat("Book me 30 minutes on January 7th 2030")
+    warm_chat_ms = (time.perf_counter() - chat_started) * 1000
+
+    sdk_import_ms = None
+    sdk_started = time.perf_counter()
+    try:
+        import google.generativeai  # noqa: F401 - the real model is built on the first live chat
+        sdk_import_ms = (time.perf_counter() - sdk_started) * 1000
+    except ImportError:
+        pass
+
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "import_ms": import_ms,
+        "first_chat_ms": first_chat_ms,
+        "warm_chat_ms": warm_chat_ms,
+        "sdk_import_ms": sdk_import_ms,
+        "max_rss_mb": rss_kb / 1024 if sys.platform != "darwin" else rss_kb / 1024 / 1024,
+        "tool_calls": [call["name"] for call in result["tool_calls"]],
+        "forbidden": sorted({name.split(".")[0] for name in sys.modules} & set(FORBIDDEN_MODULES)),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLDSTART_BUDGET_MS", "1500")),
+                        help="median import + SDK import + first chat")
+    parser.add_argument("--rss-budget-mb", type=float, default=float(os.getenv("COLDSTART_RSS_BUDGET_MB", "150")))
+    parser.add_argument("--model-latency", type=float, default=0.0, help="seconds per fake Gemini call")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.model_latency)
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, __file__, "--child", "--model-latency", str(args.model_latency)],
+                                capture_output=True, text=True, cwd=root_dir)
+        if output.returncode != 0:
+            print(output.stderr)
+            sys.exit(output.returncode)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    def median(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return statistics.median(values) if values else 0.0
+
+    cold_ms = median("import_ms") + median("sdk_import_ms") + median("first_chat_ms")
+    print(f"Cold start over {len(runs)} fresh interpreters (medians):")
+    print(f"  import api.main   {median('import_ms'):8.1f} ms")
+    print(f"  import Gemini SDK {median('sdk_import_ms'):8.1f} ms{'' if runs[0]['sdk_import_ms'] is not None else ' (not installed)'}")
+    print(f"  first chat        {median('first_chat_ms'):8.1f} ms  tools: {', '.join(runs[0]['tool_calls'])}")
+    print(f"  warm chat         {median('warm_chat_ms'):8.1f} ms")
+    print(f"  max RSS           {median('max_rss_mb'):8.1f} MB")
+
+    failures = []
+    if cold_ms > args.budget_ms:
+        failures.append(f"cold start {cold_ms:.0f} ms > budget {args.budget_ms:.0f} ms")
+    if median("max_rss_mb") > args.rss_budget_mb:
+        failures.append(f"RSS {median('max_rss_mb'):.0f} MB > budget {args.rss_budget_mb:.0f} MB")
+    forbidden = sorted({name for run in runs for name in run["forbidden"]})
+    if forbidden:
+        failures.append(f"heavy modules imported: {', '.join(forbidden)}")
+    if failures:
+        print("❌ Over budget: " + "; ".join(failures))
+        sys.exit(1)
+    print(f"✅ Within budget ({cold_ms:.0f} ms of {args.budget_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
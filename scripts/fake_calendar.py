@@ -0,0 +1,391 @@
+"""
+In-process stand-in for the Google Calendar API with latency spikes and error injection
+
+Run directly to exercise the resilient call wrapper against injected faults:
+    python scripts/fake_calendar.py
+
+Post a push notification to a running backend, as Google would after a change:
+    python scripts/fake_calendar.py notify http://localhost:8000/calendar/notifications CHANNEL_ID TOKEN
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from latency import percentile
+from recurrence import parse_event_time, parse_timestamp
+
+
+def http_error(status: int, message: str = "") -> HttpError:
+    content = json.dumps({"error": {"code": status, "message": message}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+class FaultProfile:
+    """Latency and error injection applied to every fake request"""
+
+    def __init__(self, latency: float = 0.02, spike_rate: float = 0.0, spike_latency: float = 1.0,
+                 error_rate: float = 0.0, error_status: int = 503, seed=None):
+        self.latency = latency
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def apply(self):
+        with self.lock:
+            self.requests += 1
+            spike = self.random.random() < self.spike_rate
+            fail = self.random.random() < self.error_rate
+        time.sleep(self.spike_latency if spike else self.latency)
+        if fail:
+            raise http_error(self.error_status, "Injected failure")
+
+
+class FakeRequest:
+    """Mimics googleapiclient.http.HttpRequest closely enough for CalendarReader"""
+
+    def __init__(self, calendar, handler, method: str = "", params: dict = None):
+        self.calendar = calendar
+        self.handler = handler
+        self.method = method
+        self.params = params or {}
+        self.headers = {}
+
+    def execute(self, http=None, num_retries=0):
+        self.calendar.faults.apply()
+        with self.calendar.lock:
+            return self.handler(self)
+
+
+class FakeBatch:
+    """Mimics BatchHttpRequest: one round trip, per-request callbacks"""
+
+    def __init__(self, calendar, callback=None):
+        self.calendar = calendar
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self, http=None):
+        self.calendar.faults.apply()
+        for request_id, request, callback in self.requests:
+            try:
+                with self.calendar.lock:
+                    response, error = request.handler(request), None
+            except HttpError as e:
+                response, error = None, e
+            if callback:
+                callback(request_id, response, error)
+
+
+class FakeEvents:
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def list(self, **params):
+        return FakeRequest(self.calendar, self.calendar._list, "list", params)
+
+    def list_next(self, previous_request, previous_response):
+        token = previous_response.get("nextPageToken")
+        if not token:
+            return None
+        return self.list(**dict(previous_request.params, pageToken=token))
+
+    def instances(self, **params):
+        return FakeRequest(self.calendar, lambda request: {"items": []}, "instances", params)
+
+    def instances_next(self, previous_request, previous_response):
+        return None
+
+    def get(self, calendarId, eventId):
+        return FakeRequest(self.calendar, lambda request: self.calendar._get(calendarId, eventId), "get")
+
+    def insert(self, calendarId, body):
+        return FakeRequest(self.calendar, lambda request: self.calendar._insert(calendarId, body), "insert")
+
+    def import_(self, calendarId, body):
+        return FakeRequest(self.calendar, lambda request: self.calendar._import(calendarId, body), "import")
+
+    def patch(self, calendarId, eventId, body):
+        return FakeRequest(self.calendar, lambda request: self.calendar._patch(calendarId, eventId, body), "patch")
+
+    def delete(self, calendarId, eventId):
+        return FakeRequest(self.calendar, lambda request: self.calendar._delete(calendarId, eventId), "delete")
+
+    def watch(self, calendarId, body):
+        return FakeRequest(self.calendar, lambda request: self.calendar._watch(calendarId, body), "watch")
+
+
+class FakeCalendarService:
+    """Minimal in-memory Calendar v3 service: events, freebusy and calendarList"""
+
+    def __init__(self, faults: FaultProfile = None, calendars=("primary",), push: bool = True):
+        self.faults = faults or FaultProfile(latency=0.0)
+        self.lock = threading.RLock()
+        self.events_by_calendar = {calendar_id: {} for calendar_id in calendars}
+        self.sequence = 0
+        self.changed_at = {}
+        self.watch_channels = {}
+        self.push = push
+        self.sync_tokens_valid_from = 0
+
+    def events(self):
+        return FakeEvents(self)
+
+    def freebusy(self):
+        service = self
+
+        class FakeFreeBusy:
+            def query(self, body):
+                return FakeRequest(service, lambda request: service._freebusy(body), "freebusy")
+
+        return FakeFreeBusy()
+
+    def channels(self):
+        service = self
+
+        class FakeChannels:
+            def stop(self, body):
+                return FakeRequest(service, lambda request: service._stop_channel(body), "stop")
+
+        return FakeChannels()
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def calendarList(self):
+        service = self
+
+        class FakeCalendarList:
+            def list(self):
+                return FakeRequest(service, lambda request: {"items": [
+                    {"id": calendar_id, "accessRole": "owner"} for calendar_id in service.events_by_calendar
+                ]}, "calendarList")
+
+        return FakeCalendarList()
+
+    def _calendar(self, calendar_id: str) -> dict:
+        if calendar_id not in self.events_by_calendar:
+            raise http_error(404, f"Calendar {calendar_id} not found")
+        return self.events_by_calendar[calendar_id]
+
+    def _live(self, calendar_id: str, time_min: str, time_max: str):
+        start, end = parse_timestamp(time_min), parse_timestamp(time_max)
+        for event in self._calendar(calendar_id).values():
+            if event.get("status") == "cancelled":
+                continue
+            if parse_event_time(event["start"]) < end and parse_event_time(event["end"]) > start:
+                yield event
+
+    def _list(self, request) -> dict:
+        params = request.params
+        calendar_id = params["calendarId"]
+        if "syncToken" in params:
+            since = int(params["syncToken"])
+            if since < self.sync_tokens_valid_from:
+                raise http_error(410, "Sync token is no longer valid, a full sync is required.")
+            items = [dict(e) for e in self._calendar(calendar_id).values() if self.changed_at.get((calendar_id, e["id"]), 0) > since]
+        elif "timeMin" not in params:
+            items = [e for e in self._calendar(calendar_id).values()
+                     if params.get("showDeleted") or e.get("status") != "cancelled"]
+        else:
+            items = sorted(self._live(calendar_id, params["timeMin"], params["timeMax"]),
+                           key=lambda e: parse_event_time(e["start"]))
+        offset = int(params.get("pageToken") or 0)
+        page_size = params.get("maxResults", 250)
+        page = items[offset:offset + page_size]
+        response = {"items": [dict(e) for e in page]}
+        if "timeMin" in params and "syncToken" not in params:
+            etag = f'"{zlib.crc32(json.dumps(response, sort_keys=True).encode())}"'
+            if request.headers.get("If-None-Match") == etag:
+                raise http_error(304, "Not Modified")
+            response["etag"] = etag
+        if offset + page_size < len(items):
+            response["nextPageToken"] = str(offset + page_size)
+        elif "timeMin" not in params:
+            response["nextSyncToken"] = str(self.sequence)
+        return response
+
+    def expire_sync_tokens(self):
+        """Invalidate every sync token handed out so far, as Google does after a while"""
+        with self.lock:
+            self.sequence += 1
+            self.sync_tokens_valid_from = self.sequence
+
+    def _changed(self, calendar_id: str, event_id: str):
+        self.sequence += 1
+        self.changed_at[(calendar_id, event_id)] = self.sequence
+        if self.push:
+            for channel_id, channel in list(self.watch_channels.items()):
+                if channel["calendar_id"] == calendar_id:
+                    threading.Thread(target=post_notification, daemon=True, args=(
+                        channel["address"], channel_id, channel.get("token", ""), "exists", channel["resource_id"])).start()
+
+    def _stop_channel(self, body: dict) -> dict:
+        self.watch_channels.pop(body["id"], None)
+        return {}
+
+    def _watch(self, calendar_id: str, body: dict) -> dict:
+        self._calendar(calendar_id)
+        channel = {"calendar_id": calendar_id, "address": body["address"], "token": body.get("token"),
+                   "resource_id": f"resource-{calendar_id}"}
+        self.watch_channels[body["id"]] = channel
+        expiration = int((time.time() + int(body.get("params", {}).get("ttl", 3600))) * 1000)
+        return {"kind": "api#channel", "id": body["id"], "resourceId": channel["resource_id"], "expiration": str(expiration)}
+
+    def _get(self, calendar_id: str, event_id: str) -> dict:
+        event = self._calendar(calendar_id).get(event_id)
+        if event is None:
+            raise http_error(404, "Not Found")
+        return dict(event)
+
+    def _insert(self, calendar_id: str, body: dict) -> dict:
+        events = self._calendar(calendar_id)
+        event = dict(body)
+        event.setdefault("id", uuid.uuid4().hex)
+        if event["id"] in events:
+            raise http_error(409, "The requested identifier already exists.")
+        event.setdefault("status", "confirmed")
+        event["etag"] = f'"{time.time_ns()}"'
+        event["htmlLink"] = f"https://calendar.example/event?eid={event['id']}"
+        events[event["id"]] = event
+        self._changed(calendar_id, event["id"])
+        return dict(event)
+
+    def _import(self, calendar_id: str, body: dict) -> dict:
+        """Insert, or update the existing event with the same iCalUID"""
+        events = self._calendar(calendar_id)
+        if body.get("recurrence") and any("dateTime" in body[key] and not body[key].get("timeZone") for key in ("start", "end")):
+            raise http_error(400, "Missing time zone definition for start time.")
+        existing = next((e for e in events.values() if body.get("iCalUID") and e.get("iCalUID") == body["iCalUID"]), None)
+        if existing is None:
+            return self._insert(calendar_id, body)
+        existing.update(body, status=body.get("status", "confirmed"), etag=f'"{time.time_ns()}"')
+        self._changed(calendar_id, existing["id"])
+        return dict(existing)
+
+    def _patch(self, calendar_id: str, event_id: str, body: dict) -> dict:
+        """Update fields; patching an unmaterialized instance (masterId_YYYYMMDDTHHMMSSZ) creates an exception"""
+        events = self._calendar(calendar_id)
+        event = events.get(event_id)
+        if event is None:
+            master_id, _, stamp = event_id.rpartition("_")
+            master = events.get(master_id)
+            if master is None or not master.get("recurrence"):
+                raise http_error(404, "Not Found")
+            original = datetime.strptime(stamp, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            event = {k: v for k, v in master.items() if k != "recurrence"}
+            event.update(id=event_id, recurringEventId=master_id,
+                         originalStartTime={"dateTime": original.strftime("%Y-%m-%dT%H:%M:%SZ")})
+            events[event_id] = event
+        event.update(body, etag=f'"{time.time_ns()}"')
+        self._changed(calendar_id, event_id)
+        return dict(event)
+
+    def _delete(self, calendar_id: str, event_id: str) -> dict:
+        event = self._calendar(calendar_id).get(event_id)
+        if event is None or event.get("status") == "cancelled":
+            raise http_error(410, "Resource has been deleted")
+        event["status"] = "cancelled"
+        self._changed(calendar_id, event_id)
+        return {}
+
+    def _freebusy(self, body: dict) -> dict:
+        calendars = {}
+        for item in body["items"]:
+            if item["id"] not in self.events_by_calendar:
+                calendars[item["id"]] = {"errors": [{"reason": "notFound"}], "busy": []}
+                continue
+            busy = sorted(
+                (parse_event_time(e["start"]), parse_event_time(e["end"]))
+                for e in self._live(item["id"], body["timeMin"], body["timeMax"])
+                if e.get("transparency") != "transparent" and "dateTime" in e["start"]
+            )
+            utc = lambda moment: moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            calendars[item["id"]] = {"busy": [{"start": utc(s), "end": utc(e)} for s, e in busy]}
+        return {"calendars": calendars}
+
+
+def post_notification(address: str, channel_id: str, token: str = "", state: str = "exists",
+                      resource_id: str = "resource-primary") -> int:
+    """POST a Calendar-style push notification and return the HTTP status"""
+    request = urllib.request.Request(address, data=b"", method="POST", headers={
+        "X-Goog-Channel-ID": channel_id,
+        "X-Goog-Channel-Token": token,
+        "X-Goog-Resource-ID": resource_id,
+        "X-Goog-Resource-State": state,
+        "X-Goog-Message-Number": str(int(time.time())),
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError as e:
+        print(f"⚠️ Notification to {address} failed: {e}")
+        return 0
+
+
+def _run_reads(reader, count: int) -> list:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        reader.execute(reader.service.events().list(
+            calendarId="primary", timeMin="2025-07-07T00:00:00Z", timeMax="2025-07-08T00:00:00Z"))
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    from calendar_client import CalendarReader
+    from resilience import ResilientExecutor
+
+    print("Reads with 5% latency spikes (20 ms normal, 1.5 s spike):")
+    for hedge in (False, True):
+        service = FakeCalendarService(FaultProfile(latency=0.02, spike_rate=0.05, spike_latency=1.5, seed=7))
+        reader = CalendarReader(service)
+        reader.resilience = ResilientExecutor(reader._execute_once, hedge=hedge, min_samples=10)
+        latencies = _run_reads(reader, 200)
+        print(f"  hedging={'on ' if hedge else 'off'} p50={percentile(latencies, 0.5) * 1000:.0f} ms "
+              f"p99={percentile(latencies, 0.99) * 1000:.0f} ms stats={reader.resilience.stats()}")
+
+    print("Writes with 30% injected 503s:")
+    service = FakeCalendarService(FaultProfile(latency=0.005, error_rate=0.3, seed=11))
+    reader = CalendarReader(service)
+    reader.resilience = ResilientExecutor(reader._execute_once, base_backoff=0.01, max_attempts=6)
+    failures = 0
+    for i in range(100):
+        body = {"id": f"evt{i:04d}", "summary": f"Load {i}",
+                "start": {"dateTime": "2025-07-07T10:00:00Z"}, "end": {"dateTime": "2025-07-07T11:00:00Z"}}
+        try:
+            reader.execute_write(service.events().insert(calendarId="primary", body=body))
+        except HttpError:
+            failures += 1
+    print(f"  inserted={len(service.events_by_calendar['primary'])} failed={failures} stats={reader.resilience.stats()}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "notify":
+        print(post_notification(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else ""))
+    else:
+        main()
@@ -0,0 +1,147 @@
+"""
+Local Redis stand-in speaking enough RESP for the state backend
+
+Serve on a port (point STATE_BACKEND_URL=redis://localhost:6390/0 at it):
+    python scripts/fake_redis.py 6390
+
+Check every state backend, including Redis against this server:
+    python scripts/fake_redis.py check
+"""
+
+import fnmatch
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RESPHandler)
+        self.databases = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def db(self, index: int) -> dict:
+        return self.databases.setdefault(index, {})
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.db_index = 0
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self._dispatch(args))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _dispatch(self, args) -> bytes:
+        server = self.server
+        name = args[0].decode().upper()
+        with server.lock:
+            server.commands += 1
+            data = server.db(self.db_index)
+            now = time.time()
+            for key in [k for k, (_, expires) in data.items() if expires is not None and expires <= now]:
+                del data[key]
+            if name == 'PING':
+                return b'+PONG\r\n'
+            if name == 'AUTH':
+                return b'+OK\r\n'
+            if name == 'SELECT':
+                self.db_index = int(args[1])
+                return b'+OK\r\n'
+            if name == 'GET':
+                item = data.get(args[1])
+                return b'$-1\r\n' if item is None else b'$%d\r\n%s\r\n' % (len(item[0]), item[0])
+            if name == 'SET':
+                expires = None
+                options = [a.decode().upper() for a in args[3:]]
+                if 'EX' in options:
+                    expires = now + int(options[options.index('EX') + 1])
+                if 'PX' in options:
+                    expires = now + int(options[options.index('PX') + 1]) / 1000
+                data[args[1]] = (args[2], expires)
+                return b'+OK\r\n'
+            if name == 'DEL':
+                removed = sum(1 for key in args[1:] if data.pop(key, None) is not None)
+                return b':%d\r\n' % removed
+            if name == 'EXISTS':
+                return b':%d\r\n' % sum(1 for key in args[1:] if key in data)
+            if name == 'SCAN':
+                # One pass returns everything; cursor 0 ends the iteration
+                options = [a.decode().upper() for a in args[2:]]
+                pattern = args[2:][options.index('MATCH') + 1].decode() if 'MATCH' in options else '*'
+                keys = [k for k in data if fnmatch.fnmatchcase(k.decode(), pattern)]
+                return b'*2\r\n$1\r\n0\r\n*%d\r\n' % len(keys) + b''.join(b'$%d\r\n%s\r\n' % (len(k), k) for k in keys)
+            if name == 'FLUSHDB':
+                data.clear()
+                return b'+OK\r\n'
+        return b'-ERR unknown command \'%s\'\r\n' % name.encode()
+
+
+def serve(port: int = 0) -> FakeRedisServer:
+    """Start a server on a background thread; port 0 picks a free port"""
+    server = FakeRedisServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    return server
+
+
+def check():
+    from state import StateStore, create_backend
+
+    server = serve()
+    port = server.server_address[1]
+    history = [["human", f"message {i} " * 20] for i in range(30)]
+    with tempfile.TemporaryDirectory() as tmp:
+        urls = ["memory://", f"sqlite:///{tmp}/state.db", f"redis://localhost:{port}/1"]
+        for url in urls:
+            worker_a, worker_b = StateStore(create_backend(url)), StateStore(create_backend(url))
+            if url == "memory://":
+                worker_b = StateStore(worker_a.backend)
+            worker_a.set("session:demo", history)
+            assert worker_b.get("session:demo") == history
+            worker_b.set("session:demo", history + [["ai", "reply"]])
+            assert worker_a.get("session:demo")[-1] == ["ai", "reply"], "stale read after another worker's write"
+            worker_a.get("session:demo")
+            size = len(worker_a.backend.get("session:demo"))
+            worker_a.delete("session:demo")
+            assert worker_b.get("session:demo") is None
+            print(f"  {url.split(':')[0]:<7} ok  stored_bytes={size} raw_json_bytes={len(json.dumps(history))} "
+                  f"worker_a={worker_a.stats()}")
+    print(f"  fake redis handled {server.commands} commands")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        check()
+    else:
+        port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+        server = FakeRedisServer(("127.0.0.1", port))
+        print(f"Fake Redis listening on 127.0.0.1:{port}")
+        server.serve_forever()
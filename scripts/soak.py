@@ -0,0 +1,365 @@
+"""
+Soak test: concurrent conversations against backend/main.py for a long stretch, watching for slow degradation
+
+The FastAPI app runs in-process over ASGI (no sockets) with the fake Calendar
+and a scripted Gemini stand-in, so memory growth and latency drift are the
+app's own. Every interval it records RSS, tracemalloc usage, live objects,
+throughput and latency percentiles; at the end it reports leaks, throughput
+decay and latency drift, and exits non-zero if it found any.
+
+    python scripts/soak.py --users 20 --duration 3600 --think-time 0.5 --interval 30 --csv soak.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+sys.path.insert(0, current_dir)
+
+from latency import percentile
+
+# The agent answers 200 even when a tool or the agent itself failed; these replies count as errors
+FAILURE_PREFIXES = ("I apologize, but I encountered an error", "Error", "❌")
+
+
+def conversation_scripts(day: date) -> list:
+    """Turns of (message, tool the scripted model calls, tool input); each conversation ends with /reset"""
+    d1, d2 = day.isoformat(), (day + timedelta(days=1)).isoformat()
+    return [
+        [
+            (f"Am I free on {d1}?", "check_calendar_availability", d1),
+            (f"What about {d2}?", "check_calendar_availability", d2),
+            (f"Suggest a time on {d2}", "suggest_available_time_slots", d2),
+            (f"Book a team sync on {d2} at 10", "book_appointment", f"Soak team sync|{d2}|10:00|1|"),
+        ],
+        [
+            ("What's coming up?", "check_calendar_availability", ""),
+            (f"Find me 90 minutes from {d1}", "find_available_time", f"90|{d1}|5"),
+            ("Thanks, that's all", None, None),
+        ],
+        [
+            (f"Show me {d1}", "check_calendar_availability", d1),
+            (f"Book a 1:1 on {d1} at 14", "book_appointment", f"Soak 1:1|{d1}|14:00|1|"),
+            (f"Now what does {d1} look like?", "check_calendar_availability", d1),
+        ],
+    ]
+
+
+def make_scripted_gemini(actions: dict, latency: float):
+    """Chat model that answers the ReAct prompt from the conversation scripts instead of calling Gemini"""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class ScriptedGemini(BaseChatModel):
+        model: str = "scripted"
+        temperature: float = 0.0
+        max_retries: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "scripted-gemini"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            time.sleep(latency)
+            prompt = "\n".join(str(m.content) for m in messages)
+            turn = prompt.rsplit("New input:", 1)[-1]
+            if "Observation:" in turn:
+                observation = turn.rsplit("Observation:", 1)[1].strip().splitlines()
+                text = f"Do I need to use a tool? No\nAI: {observation[0] if observation else 'Done.'}"
+            else:
+                message = turn.split("\n\n", 1)[-1].strip().splitlines()[0]
+                tool, tool_input = actions.get(message, (None, None))
+                if tool:
+                    text = f"Thought: Do I need to use a tool? Yes\nAction: {tool}\nAction Input: {tool_input}"
+                else:
+                    text = "Do I need to use a tool? No\nAI: You're welcome!"
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    return ScriptedGemini
+
+
+def install_fakes(scripts: list, model_latency: float, calendar_latency: float, workdir: str):
+    """Point the agent at the fake Calendar and the scripted model before backend/main.py imports it"""
+    os.environ.update({
+        "GOOGLE_API_KEY": "soak",
+        "GOOGLE_CREDENTIALS_JSON": "{}",
+        "STATE_BACKEND_URL": "memory://",
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "CALENDAR_SNAPSHOT_PATH": "",
+        "WARMUP_ON_STARTUP": "false",
+        "CALENDAR_HEDGING": "false",
+    })
+    import googleapiclient.discovery
+    import langchain_google_genai
+    from google.oauth2 import service_account
+    from fake_calendar import FakeCalendarService, FaultProfile
+
+    service = FakeCalendarService(FaultProfile(latency=calendar_latency), push=False)
+    service_account.Credentials.from_service_account_info = staticmethod(lambda info, scopes=None: None)
+    googleapiclient.discovery.build = lambda *args, **kwargs: service
+    actions = {message: (tool, tool_input) for script in scripts for message, tool, tool_input in script}
+    langchain_google_genai.ChatGoogleGenerativeAI = make_scripted_gemini(actions, model_latency)
+    return service
+
+
+async def asgi_request(app, method: str, path: str, payload=None):
+    """One HTTP request straight into the ASGI app; returns (status, body)"""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("soak", 80),
+    }
+    received = False
+    status = None
+    chunks = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+class Recorder:
+    """Latencies and errors of the current sampling window"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.total = 0
+        self.seen_failures = set()
+
+    def record(self, seconds: float, ok: bool):
+        self.latencies.append(seconds)
+        self.total += 1
+        self.errors += not ok
+
+    def drain(self):
+        latencies, errors = self.latencies, self.errors
+        self.latencies, self.errors = [], 0
+        return latencies, errors
+
+
+async def user_loop(app, user_id: int, scripts: list, think_time: float, deadline: float, recorder: Recorder):
+    session_id = f"soak-{user_id}"
+    while time.monotonic() < deadline:
+        for message, _, _ in random.choice(scripts):
+            started = time.perf_counter()
+            try:
+                status, body = await asgi_request(app, "POST", "/chat", {"message": message, "session_id": session_id})
+                reply = json.loads(body).get("response") if status == 200 else None
+                ok = isinstance(reply, str) and not reply.strip().startswith(FAILURE_PREFIXES)
+                first_line = reply.strip().splitlines()[0][:120] if isinstance(reply, str) and reply.strip() else ""
+                if not ok and first_line and first_line not in recorder.seen_failures:
+                    # Each distinct failure is printed once
+                    recorder.seen_failures.add(first_line)
+                    print(f"⚠️ user {user_id}: {first_line}")
+            except Exception as e:
+                print(f"⚠️ user {user_id}: {e}")
+                ok = False
+            recorder.record(time.perf_counter() - started, ok)
+            if think_time:
+                await asyncio.sleep(random.expovariate(1 / think_time))
+            if time.monotonic() >= deadline:
+                return
+        await asgi_request(app, "POST", "/reset", {"session_id": session_id})
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def slope_per_hour(points: list) -> float:
+    """Least-squares slope of (seconds, value) points, scaled to one hour"""
+    if len(points) < 2:
+        return 0.0
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance * 3600
+
+
+async def sampler(recorder: Recorder, started: float, interval: float, deadline: float, samples: list, writer):
+    window_start = time.monotonic()
+    while True:
+        await asyncio.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+        latencies, errors = recorder.drain()
+        now = time.monotonic()
+        window, window_start = max(now - window_start, 1e-6), now
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        sample = {
+            "elapsed": round(now - started, 1),
+            "requests": len(latencies),
+            "throughput": round(len(latencies) / window, 2),
+            "errors": errors,
+            "p50_ms": round((percentile(latencies, 0.5) or 0) * 1000, 1),
+            "p95_ms": round((percentile(latencies, 0.95) or 0) * 1000, 1),
+            "p99_ms": round((percentile(latencies, 0.99) or 0) * 1000, 1),
+            "rss_mb": round(rss_mb(), 1),
+            "traced_mb": round(current / 1024 / 1024, 2),
+            "objects": len(gc.get_objects()),
+        }
+        samples.append(sample)
+        if writer:
+            writer.writerow(sample)
+        print(f"  t={sample['elapsed']:>7}s  {sample['throughput']:>6} req/s  p50={sample['p50_ms']}ms "
+              f"p95={sample['p95_ms']}ms p99={sample['p99_ms']}ms  errors={errors}  rss={sample['rss_mb']}MB "
+              f"traced={sample['traced_mb']}MB  objects={sample['objects']}")
+        if time.monotonic() >= deadline:
+            return
+
+
+def third_means(values: list):
+    third = max(1, len(values) // 3)
+    return sum(values[:third]) / third, sum(values[-third:]) / third
+
+
+def analyze(samples: list, warmup: float, args, baseline, final) -> list:
+    """Findings after the warm-up period: memory and object growth, throughput decay, latency drift"""
+    steady = [s for s in samples if s["elapsed"] > warmup and s["requests"]]
+    if len(steady) < 3:
+        return ["not enough samples after warm-up to judge; run longer or sample more often"]
+    findings = []
+    hours = (steady[-1]["elapsed"] - steady[0]["elapsed"]) / 3600
+    for key, unit, limit in (("rss_mb", "MB", args.leak_mb_per_hour), ("traced_mb", "MB", args.leak_mb_per_hour),
+                             ("objects", "objects", args.leak_objects_per_hour)):
+        rate = slope_per_hour([(s["elapsed"], s[key]) for s in steady])
+        print(f"  {key:<10} {rate:+12.1f} {unit}/hour over {hours:.2f}h")
+        if rate > limit:
+            findings.append(f"{key} grows {rate:+.1f} {unit}/hour (limit {limit})")
+    first, last = third_means([s["throughput"] for s in steady])
+    print(f"  throughput {first:.2f} -> {last:.2f} req/s")
+    if first and last < first * (1 - args.max_throughput_decay):
+        findings.append(f"throughput fell {100 * (1 - last / first):.0f}% ({first:.2f} -> {last:.2f} req/s)")
+    first, last = third_means([s["p95_ms"] for s in steady])
+    print(f"  p95        {first:.1f} -> {last:.1f} ms")
+    if first and last > first * args.max_latency_drift:
+        findings.append(f"p95 latency drifted {last / first:.2f}x ({first:.1f} -> {last:.1f} ms)")
+    errors = sum(s["errors"] for s in steady)
+    if errors:
+        findings.append(f"{errors} failed requests")
+    if baseline is not None and final is not None:
+        print("  top allocation growth since warm-up:")
+        for stat in final.compare_to(baseline, "lineno")[:args.top]:
+            print(f"    {stat}")
+    return findings
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="soak-")
+    day = date.today() + timedelta(days=30)
+    day += timedelta(days=(7 - day.weekday()) % 7)
+    scripts = conversation_scripts(day)
+    install_fakes(scripts, args.model_latency, args.calendar_latency, workdir)
+    if args.tracemalloc:
+        tracemalloc.start(args.frames)
+
+    import backend.main as backend
+    if not backend.AGENT_AVAILABLE:
+        raise SystemExit("❌ Agent failed to import; see the log above")
+    await backend.app.router.startup()
+
+    recorder = Recorder()
+    samples = []
+    started = time.monotonic()
+    deadline = started + args.duration
+    warmup = args.warmup if args.warmup is not None else args.duration * 0.1
+    csv_file = open(args.csv, "w", newline="") if args.csv else None
+    writer = None
+    if csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=["elapsed", "requests", "throughput", "errors", "p50_ms",
+                                                      "p95_ms", "p99_ms", "rss_mb", "traced_mb", "objects"])
+        writer.writeheader()
+
+    print(f"Soaking backend/main.py: {args.users} users, think time {args.think_time}s, {args.duration}s "
+          f"(warm-up {warmup:.0f}s), model latency {args.model_latency}s, calendar latency {args.calendar_latency}s")
+    baseline = None
+
+    async def take_baseline():
+        nonlocal baseline
+        await asyncio.sleep(warmup)
+        if tracemalloc.is_tracing():
+            gc.collect()
+            baseline = tracemalloc.take_snapshot()
+
+    tasks = [asyncio.create_task(user_loop(backend.app, i, scripts, args.think_time, deadline, recorder))
+             for i in range(args.users)]
+    baseline_task = asyncio.create_task(take_baseline())
+    await sampler(recorder, started, args.interval, deadline, samples, writer)
+    await asyncio.gather(*tasks)
+    baseline_task.cancel()
+
+    gc.collect()
+    final = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+    await backend.app.router.shutdown()
+    if csv_file:
+        csv_file.close()
+
+    print(f"\nSummary ({recorder.total} requests):")
+    findings = analyze(samples, warmup, args, baseline, final)
+    if findings:
+        print("❌ Degradation found:\n  - " + "\n  - ".join(findings))
+        return 1
+    print("✅ No leaks, throughput decay or latency drift beyond the limits")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=600, help="seconds to run")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between a user's messages")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between samples")
+    parser.add_argument("--warmup", type=float, default=None, help="seconds excluded from trends (default 10%%)")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="seconds per scripted model call")
+    parser.add_argument("--calendar-latency", type=float, default=0.02, help="seconds per fake Calendar call")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="skip allocation tracing (it slows the app down)")
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc frames per allocation")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to list")
+    parser.add_argument("--leak-mb-per-hour", type=float, default=20)
+    parser.add_argument("--leak-objects-per-hour", type=float, default=50000)
+    parser.add_argument("--max-throughput-decay", type=float, default=0.2, help="allowed fractional drop")
+    parser.add_argument("--max-latency-drift", type=float, default=1.5, help="allowed p95 growth factor")
+    parser.add_argument("--csv", help="write every sample to this file")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+On-disk snapshot of the event store so a restarted process starts warm and can answer while Google is down
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from event_store import COVERED_PER_CALENDAR, overlaps
+from state import decode, encode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calendars (
+    calendar_id TEXT PRIMARY KEY,
+    events BLOB NOT NULL,
+    sync_token TEXT,
+    complete INTEGER NOT NULL,
+    as_of REAL,
+    covered BLOB
+)
+"""
+COLUMNS = "calendar_id, events, sync_token, complete, as_of, covered"
+
+
+def merge_saved(ours: dict, theirs: dict) -> dict:
+    """Combine this worker's view of a calendar with the one another worker already saved.
+
+    A newer complete (synced) view replaces the older one. Otherwise the older view only
+    keeps events outside the windows the newer one fetched since, so a deletion one worker
+    saw is not brought back by another worker's stale copy.
+    """
+    newer, older = sorted((theirs, ours), key=lambda saved: saved['as_of'] or 0, reverse=True)
+    if newer['complete']:
+        return newer
+    refetched = [(w_start, w_end) for w_start, w_end, fetched in newer['covered'] if fetched >= (older['as_of'] or 0)]
+
+    def superseded(event: dict) -> bool:
+        if event.get('recurrence') or 'start' not in event or 'end' not in event:
+            return False
+        return any(overlaps(event, datetime.fromtimestamp(w_start, timezone.utc),
+                            datetime.fromtimestamp(w_end, timezone.utc)) for w_start, w_end in refetched)
+
+    events = {event['id']: event for event in older['events'] if not superseded(event)}
+    events.update((event['id'], event) for event in newer['events'])
+    covered = sorted({tuple(w) for w in older['covered'] + newer['covered']}, key=lambda w: w[2])
+    source = newer if newer['sync_token'] or not older['complete'] else older
+    return {
+        'events': list(events.values()),
+        'sync_token': source['sync_token'],
+        'complete': source['complete'],
+        'as_of': source['as_of'],
+        'covered': [list(w) for w in covered[-COVERED_PER_CALENDAR:]],
+    }
+
+
+class Snapshot:
+    """One compressed row per calendar: raw events, sync token, when the data was last known current
+    and which windows were ever fetched.
+
+    Every worker saves into the same file; a save only touches the calendars the worker
+    holds and merges them with what is already there.
+    """
+
+    def __init__(self, path: str = "calendar_snapshot.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(SCHEMA)
+        try:
+            # Snapshots written before fetched windows were recorded
+            self._connection().execute("ALTER TABLE calendars ADD COLUMN covered BLOB")
+        except sqlite3.OperationalError:
+            pass
+        self._stopped = threading.Event()
+        self._thread = None
+        self.saved_version = None
+        self.saves = 0
+        self.bytes = 0
+        self.loaded_events = 0
+        self.load_ms = None
+        self.last_saved_at = None
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def save(self, store) -> int:
+        """Merge the store's current contents into the snapshot; returns bytes written"""
+        version = store.version
+        calendars = store.export_state()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = []
+            for calendar_id, saved in calendars.items():
+                existing = connection.execute(
+                    f"SELECT {COLUMNS} FROM calendars WHERE calendar_id = ?", (calendar_id,)).fetchone()
+                if existing:
+                    saved = merge_saved(saved, self._decode_row(existing)[1])
+                rows.append((calendar_id, encode(saved['events']), saved['sync_token'], int(saved['complete']),
+                             saved['as_of'], encode(saved['covered'])))
+            connection.executemany(f"INSERT OR REPLACE INTO calendars ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self.saved_version = version
+        self.saves += 1
+        self.bytes = sum(len(row[1]) for row in rows)
+        self.last_saved_at = time.time()
+        return self.bytes
+
+    @staticmethod
+    def _decode_row(row) -> tuple:
+        calendar_id, events, sync_token, complete, as_of, covered = row
+        return calendar_id, {'events': decode(events), 'sync_token': sync_token, 'complete': bool(complete),
+                             'as_of': as_of, 'covered': decode(covered) if covered else []}
+
+    def load(self, store) -> int:
+        """Seed the store from the snapshot; returns the number of events loaded"""
+        started = time.perf_counter()
+        calendars = dict(self._decode_row(row) for row in self._connection().execute(f"SELECT {COLUMNS} FROM calendars"))
+        store.load_state(calendars)
+        self.saved_version = store.version
+        self.loaded_events = sum(len(saved['events']) for saved in calendars.values())
+        self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        return self.loaded_events
+
+    def _run(self, store, interval: float):
+        while not self._stopped.wait(interval):
+            if store.version == self.saved_version:
+                continue
+            try:
+                self.save(store)
+            except Exception as e:
+                print(f"⚠️ Could not save calendar snapshot: {e}")
+
+    def start(self, store, interval: float = 60.0):
+        """Save in the background whenever the store has changed since the last save"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(store, interval), name="calendar-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "saves": self.saves,
+            "bytes": self.bytes,
+            "last_saved_at": self.last_saved_at,
+            "loaded_events": self.loaded_events,
+            "load_ms": self.load_ms,
+        }
@@ -0,0 +1,315 @@
+"""
+Shared state for chat memory and OAuth tokens: in-memory, SQLite or Redis backends
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+COMPRESS_OVER_BYTES = 512
+VERSION_BYTES = 16
+
+
+def encode(value: Any) -> bytes:
+    """Compact JSON, zlib-compressed when it pays off; the first byte tags the format"""
+    data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(data) > COMPRESS_OVER_BYTES:
+        return b'z' + zlib.compress(data, 6)
+    return b'j' + data
+
+
+def decode(data: bytes) -> Any:
+    if data[:1] == b'z':
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class MemoryBackend:
+    """Process-local storage; only correct with a single worker"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[1] is not None and item[1] <= time.time():
+                del self._data[key]
+                return None
+            return item[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self, prefix: str) -> list:
+        now = time.time()
+        with self._lock:
+            return [k for k, (_, expires) in self._data.items()
+                    if k.startswith(prefix) and (expires is None or expires > now)]
+
+
+class SQLiteBackend:
+    """File-backed storage shared by every worker on one host"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None))
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def keys(self, prefix: str) -> list:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        rows = self._connection().execute(
+            "SELECT key FROM state WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?)",
+            (escaped + '%', time.time())).fetchall()
+        return [row[0] for row in rows]
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+
+class RESPClient:
+    """Minimal Redis protocol (RESP2) client with one connection per thread"""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.reader = sock, sock.makefile('rb')
+        if self.password:
+            self._roundtrip('AUTH', self.password)
+        if self.db:
+            self._roundtrip('SELECT', self.db)
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _roundtrip(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._local.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RedisError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def command(self, *args):
+        """Send a command, reconnecting once if the pooled connection went stale"""
+        for attempt in range(2):
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            try:
+                return self._roundtrip(*args)
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt:
+                    raise
+
+
+class RedisBackend:
+    """Storage shared by every worker and replica through a Redis server"""
+
+    name = "redis"
+
+    def __init__(self, client: RESPClient):
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.command('GET', key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self.client.command('SET', key, value, 'PX', int(ttl * 1000))
+        else:
+            self.client.command('SET', key, value)
+
+    def delete(self, key: str):
+        self.client.command('DEL', key)
+
+    def keys(self, prefix: str) -> list:
+        """Incremental SCAN, so a large keyspace never blocks the server"""
+        pattern = ''.join('\\' + c if c in '*?[]\\' else c for c in prefix) + '*'
+        found, cursor = [], '0'
+        while True:
+            cursor, batch = self.client.command('SCAN', cursor, 'MATCH', pattern, 'COUNT', 1000)
+            found.extend(k.decode() if isinstance(k, bytes) else k for k in batch)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+            if cursor == '0':
+                return found
+
+
+class StateStore:
+    """Write-through cache over a backend.
+
+    Each value is stored with a small version key. A read fetches only the
+    version and reuses the locally decoded value when it still matches, so
+    another worker's write is always seen without re-reading large values.
+    Returned values are shared with the cache and must not be mutated.
+    """
+
+    def __init__(self, backend, ttl: Optional[float] = None, cache_size: int = 1024):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        version = self.backend.get(f"{key}:v")
+        if version is None:
+            with self._lock:
+                self._cache.pop(key, None)
+            return default
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        data = self.backend.get(key)
+        if data is None:
+            return default
+        # The value carries its own version, so a write racing this read stays consistent
+        version, value = data[:VERSION_BYTES], decode(data[VERSION_BYTES:])
+        self._remember(key, version, value)
+        return value
+
+    def _remember(self, key: str, version: bytes, value: Any):
+        with self._lock:
+            self._cache[key] = (version, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def set(self, key: str, value: Any):
+        version = uuid.uuid4().hex[:VERSION_BYTES].encode()
+        self.backend.set(key, version + encode(value), self.ttl)
+        self.backend.set(f"{key}:v", version, self.ttl)
+        self._remember(key, version, value)
+        with self._lock:
+            self.writes += 1
+
+    def delete(self, key: str):
+        self.backend.delete(f"{key}:v")
+        self.backend.delete(key)
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def count(self, prefix: str) -> int:
+        """Number of live values whose key starts with prefix; scans the backend, so for stats only"""
+        return sum(1 for key in self.backend.keys(prefix) if not key.endswith(':v'))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.backend.name, "cached": len(self._cache),
+                    "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+def create_backend(url: str):
+    """memory:// | sqlite:///path/to/state.db | redis://[:password@]host:port/db"""
+    parsed = urlparse(url)
+    if parsed.scheme in ("", "memory"):
+        return MemoryBackend()
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(parsed.path[1:] or "state.db")
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisBackend(RESPClient(parsed.hostname or "localhost", parsed.port or 6379, db, parsed.password))
+    raise ValueError(f"Unsupported STATE_BACKEND_URL scheme: {parsed.scheme}")
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_state() -> StateStore:
+    """Process-wide store configured by STATE_BACKEND_URL and STATE_TTL"""
+    global _state
+    with _state_lock:
+        if _state is None:
+            ttl = float(os.getenv("STATE_TTL", str(7 * 24 * 3600)))
+            _state = StateStore(create_backend(os.getenv("STATE_BACKEND_URL", "memory://")), ttl=ttl or None)
+        return _state
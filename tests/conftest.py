@@ -0,0 +1,7 @@
+import os
+import sys
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+# The fake Calendar and Redis servers used by the benchmarks double as test doubles
+sys.path.insert(0, os.path.join(root_dir, "scripts"))
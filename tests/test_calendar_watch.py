@@ -0,0 +1,89 @@
+"""
+WatchManager against the fake Calendar: notification validation, shared channels and sync-token resync
+"""
+
+import pytest
+
+from calendar_client import CalendarReader
+from calendar_watch import WatchManager
+from event_store import EventStore
+from fake_calendar import FakeCalendarService
+from state import MemoryBackend, StateStore
+
+
+def event(summary: str, day: int) -> dict:
+    return {'summary': summary, 'start': {'dateTime': f'2030-01-{day:02d}T10:00:00Z'},
+            'end': {'dateTime': f'2030-01-{day:02d}T11:00:00Z'}}
+
+
+def titles(store: EventStore) -> set:
+    events, _, _ = store.query_local('primary', '2030-01-01T00:00:00Z', '2030-02-01T00:00:00Z')
+    return {e.title for e in events}
+
+
+@pytest.fixture
+def service():
+    return FakeCalendarService(push=False)
+
+
+def manager(service, state=None, token="secret") -> WatchManager:
+    reader = CalendarReader(service)
+    return WatchManager(reader, EventStore(reader), "https://example.com/calendar/notifications",
+                        token=token, state=state)
+
+
+def headers(channel_id: str, token: str = "secret", resource_state: str = "exists") -> dict:
+    return {'X-Goog-Channel-ID': channel_id, 'X-Goog-Channel-Token': token, 'X-Goog-Resource-State': resource_state}
+
+
+def test_notifications_are_validated(service):
+    watcher = manager(service)
+    watcher.watch('primary')
+    [channel_id] = watcher.channels
+    assert watcher.handle_notification(headers(channel_id)) == 'primary'
+    assert watcher.handle_notification(headers(channel_id, resource_state='sync')) is None
+    with pytest.raises(PermissionError):
+        watcher.handle_notification(headers(channel_id, token="forged"))
+    with pytest.raises(PermissionError):
+        watcher.handle_notification(headers("unknown-channel"))
+    with pytest.raises(PermissionError):
+        watcher.handle_notification({})
+    assert watcher.notifications == 2
+
+
+def test_any_worker_accepts_a_channel_opened_by_another(service):
+    state = StateStore(MemoryBackend())
+    opener, other = manager(service, state, token="first"), manager(service, state, token="second")
+    opener.watch('primary')
+    [channel_id] = opener.channels
+    assert other.handle_notification(headers(channel_id, token="first")) == 'primary'
+    other.start(['primary'])
+    assert other.channels == {} and len(service.watch_channels) == 1, "a live channel is not opened twice"
+    other.shutdown()
+
+
+def test_notification_sync_applies_changes_incrementally(service):
+    watcher = manager(service)
+    service.events().insert(calendarId='primary', body=event('Standup', 7)).execute()
+    watcher.watch('primary')
+    assert titles(watcher.store) == {'Standup'}
+    service.events().insert(calendarId='primary', body=event('Review', 8)).execute()
+    [channel_id] = watcher.channels
+    assert watcher.sync(watcher.handle_notification(headers(channel_id))) == 1, "only the change is fetched"
+    assert titles(watcher.store) == {'Standup', 'Review'}
+
+
+def test_expired_sync_token_falls_back_to_a_full_sync(service):
+    watcher = manager(service)
+    standup = service.events().insert(calendarId='primary', body=event('Standup', 7)).execute()
+    watcher.watch('primary')
+    service.events().delete(calendarId='primary', eventId=standup['id']).execute()
+    service.events().insert(calendarId='primary', body=event('Review', 8)).execute()
+    # Only a full sync forgets an event the server never had
+    watcher.store.upsert('primary', dict(event('Ghost', 9), id='ghost'))
+    service.expire_sync_tokens()
+    watcher.sync('primary')
+    assert titles(watcher.store) == {'Review'}
+    service.events().insert(calendarId='primary', body=event('Retro', 9)).execute()
+    assert watcher.sync('primary') == 1, "the token from the full sync is incremental again"
+    assert titles(watcher.store) == {'Review', 'Retro'}
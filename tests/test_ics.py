@@ -0,0 +1,81 @@
+"""
+iCalendar export and re-import of recurring series
+"""
+
+import tempfile
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from calendar_client import CalendarReader
+from fake_calendar import FakeCalendarService
+from ics import import_events, iter_ics, iter_ics_events
+from recurrence import occurrences
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def round_trip(events: list) -> list:
+    return list(iter_ics_events(iter_ics(events), default_tz=ZoneInfo("UTC")))
+
+
+def test_weekly_series_keeps_wall_time_across_dst():
+    # 2030-03-10 is the US DST change; the series runs from before it to after it
+    master = {
+        'id': 'standup', 'iCalUID': 'standup@example.com', 'summary': 'Standup',
+        'start': {'dateTime': '2030-02-25T09:00:00-05:00', 'timeZone': 'America/New_York'},
+        'end': {'dateTime': '2030-02-25T09:30:00-05:00', 'timeZone': 'America/New_York'},
+        'recurrence': ['RRULE:FREQ=WEEKLY;COUNT=6'],
+    }
+    document = ''.join(iter_ics([master]))
+    assert 'DTSTART;TZID=America/New_York:20300225T090000' in document
+
+    [imported] = round_trip([master])
+    assert imported['start']['timeZone'] == 'America/New_York'
+    starts = occurrences(imported, datetime(2030, 2, 1, tzinfo=NEW_YORK), datetime(2030, 5, 1, tzinfo=NEW_YORK))
+    assert len(starts) == 6
+    assert {start.astimezone(NEW_YORK).strftime('%H:%M') for start in starts} == {'09:00'}
+
+
+def test_exception_recurrence_id_uses_series_timezone():
+    exception = {
+        'id': 'standup_20300311T130000Z', 'iCalUID': 'standup@example.com', 'recurringEventId': 'standup',
+        'originalStartTime': {'dateTime': '2030-03-11T13:00:00Z', 'timeZone': 'America/New_York'},
+        'start': {'dateTime': '2030-03-11T14:00:00Z', 'timeZone': 'America/New_York'},
+        'end': {'dateTime': '2030-03-11T14:30:00Z', 'timeZone': 'America/New_York'},
+    }
+    document = ''.join(iter_ics([exception]))
+    assert 'RECURRENCE-ID;TZID=America/New_York:20300311T090000' in document
+    [imported] = round_trip([exception])
+    assert datetime.fromisoformat(imported['originalStartTime']['dateTime']) == datetime(2030, 3, 11, 9, tzinfo=NEW_YORK)
+
+
+def test_event_without_timezone_is_written_in_utc():
+    event = {'id': 'x', 'start': {'dateTime': '2030-01-07T10:00:00Z'}, 'end': {'dateTime': '2030-01-07T11:00:00Z'}}
+    assert 'DTSTART:20300107T100000Z' in ''.join(iter_ics([event]))
+
+
+def test_recurring_utc_event_gets_a_timezone_for_import():
+    document = "BEGIN:VEVENT\nUID:s1\nDTSTART:20300107T100000Z\nDTEND:20300107T110000Z\nRRULE:FREQ=DAILY;COUNT=3\nEND:VEVENT\n"
+    [event] = iter_ics_events([document])
+    assert event['start']['timeZone'] == 'UTC' and event['end']['timeZone'] == 'UTC'
+
+
+def test_override_is_patched_onto_its_occurrence_after_the_master(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    service = FakeCalendarService()
+    document = (
+        "BEGIN:VEVENT\nUID:s1\nRECURRENCE-ID:20300108T100000Z\nDTSTART:20300108T140000Z\nDTEND:20300108T150000Z\n"
+        "SUMMARY:Moved\nEND:VEVENT\n"
+        "BEGIN:VEVENT\nUID:s1\nDTSTART:20300107T100000Z\nDTEND:20300107T110000Z\nRRULE:FREQ=DAILY;COUNT=5\n"
+        "SUMMARY:Standup\nEND:VEVENT\n"
+        "BEGIN:VEVENT\nUID:orphan\nRECURRENCE-ID:20300108T100000Z\nDTSTART:20300108T160000Z\nDTEND:20300108T170000Z\n"
+        "END:VEVENT\n"
+    )
+    results = [r for r in import_events(iter_ics_events([document]), CalendarReader(service), 'primary', lambda a, b: [])
+               if r['type'] == 'event']
+    statuses = {r['index']: r['status'] for r in results}
+    assert statuses == {0: 'imported', 1: 'imported', 2: 'error'}
+    master_id = next(r['id'] for r in results if r['index'] == 1)
+    override = service.events_by_calendar['primary'][f"{master_id}_20300108T100000Z"]
+    assert override['summary'] == 'Moved' and override['recurringEventId'] == master_id
+    assert list(tmp_path.iterdir()) == [], "the override spool is removed"
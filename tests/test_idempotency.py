@@ -0,0 +1,52 @@
+"""
+Idempotency keys, event ids and the dedup table, in-process and over a shared state store
+"""
+
+import pytest
+
+from idempotency import IdempotencyStore, deterministic_event_id, idempotency_key
+from state import MemoryBackend, StateStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_event_id_depends_only_on_the_request():
+    key = idempotency_key("booking", "Sync", "2030-01-07T10:00:00+00:00")
+    assert deterministic_event_id(key) == deterministic_event_id(key)
+    assert deterministic_event_id(key, salt="a") != deterministic_event_id(key)
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_records_expire_and_are_invalidated_by_event(shared):
+    clock = FakeClock()
+    store = IdempotencyStore(ttl=10, clock=clock, state=StateStore(MemoryBackend()) if shared else None)
+    store.put("k1", {"event_id": "e1", "response": "booked"})
+    store.put("k2", {"event_id": "e2", "response": "booked"})
+    assert store.stats()["entries"] == 2
+    assert store.invalidate_event("e1")
+    assert store.get("k1") is None and store.get("k2")["response"] == "booked"
+    clock.now = 10
+    assert store.get("k2") is None
+
+
+def test_records_are_shared_through_the_state_store():
+    state = StateStore(MemoryBackend())
+    first, second = IdempotencyStore(state=state), IdempotencyStore(state=state)
+    first.put("k", {"event_id": "e", "response": "booked"})
+    assert second.get("k")["response"] == "booked"
+    assert second.invalidate_event("e")
+    assert first.get("k") is None
+
+
+def test_per_key_locks_are_released_after_use():
+    store = IdempotencyStore(state=StateStore(MemoryBackend()))
+    for i in range(100):
+        with store.lock(f"k{i}"):
+            assert store.stats()["locks"] == 1
+    assert store.stats()["locks"] == 0
@@ -0,0 +1,63 @@
+"""
+JobQueue retries, stale-job recovery and heartbeats
+"""
+
+import threading
+import time
+
+from jobs import JobQueue
+
+
+def make_queue(tmp_path, **kwargs) -> JobQueue:
+    return JobQueue(str(tmp_path / "jobs.db"), workers=0, **kwargs)
+
+
+def test_stale_requeues_count_as_attempts(tmp_path):
+    queue = make_queue(tmp_path, stale_after=60, max_attempts=2)
+    queue.register("crash", lambda job: {})
+    job_id = queue.submit("crash", {})
+    for attempts in (1, 2):
+        # Claimed by a worker that then dies without a heartbeat
+        assert queue._claim()["attempts"] == attempts
+        queue._connection().execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 120, job_id))
+    assert queue._claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["error"] == "Worker stopped responding"
+
+
+def test_slow_job_without_progress_is_not_claimed_twice(tmp_path):
+    queue = make_queue(tmp_path, stale_after=0.3)
+    release = threading.Event()
+    runs = []
+
+    def slow(job):
+        runs.append(job.id)
+        release.wait(5)
+        return {"ok": True}
+
+    queue.register("slow", slow)
+    job_id = queue.submit("slow", {})
+    worker = threading.Thread(target=queue.run_next)
+    worker.start()
+    try:
+        time.sleep(0.6)
+        assert queue._claim() is None, "the heartbeat keeps the running job owned"
+    finally:
+        release.set()
+        worker.join()
+    assert runs == [job_id]
+    assert queue.get(job_id)["status"] == "succeeded"
+
+
+def test_failed_job_is_retried_then_failed(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    calls = []
+
+    def failing(job):
+        calls.append(job.id)
+        raise RuntimeError("boom")
+
+    queue.register("fail", failing)
+    job_id = queue.submit("fail", {})
+    assert queue.run_next() and queue.run_next() and not queue.run_next()
+    assert len(calls) == 2 and queue.get(job_id)["status"] == "failed"
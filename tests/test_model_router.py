@@ -0,0 +1,205 @@
+"""
+ModelRouter and ModelStats with fake chat models: circuit transitions, failover and hedging
+"""
+
+import threading
+import time
+
+import pytest
+
+from model_router import CLOSED, HALF_OPEN, OPEN, ModelRouter, ModelStats
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeModel:
+    """invoke() returns a reply or raises; latency advances the fake clock"""
+
+    def __init__(self, name: str, clock: FakeClock = None, latency: float = 0.0, fail: bool = False,
+                 block: threading.Event = None):
+        self.name = name
+        self.clock = clock
+        self.latency = latency
+        self.fail = fail
+        self.block = block
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        if self.block is not None:
+            self.block.wait(5)
+        if self.clock is not None:
+            self.clock.now += self.latency
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return f"reply from {self.name}"
+
+
+def test_circuit_opens_at_error_threshold_after_min_calls():
+    stats = ModelStats("m", error_threshold=0.5, min_calls=4, clock=FakeClock())
+    stats.record_failure()
+    stats.record_failure()
+    stats.record_failure()
+    assert stats.state == CLOSED, "fewer than min_calls outcomes never open the circuit"
+    stats.record_failure()
+    assert stats.state == OPEN
+    assert not stats.available()
+
+
+def test_circuit_stays_closed_below_error_threshold():
+    stats = ModelStats("m", error_threshold=0.5, min_calls=4, clock=FakeClock())
+    for _ in range(3):
+        stats.record_success(0.1)
+    stats.record_failure()
+    assert stats.state == CLOSED
+    assert stats.available()
+
+
+def test_open_circuit_goes_half_open_after_cooldown_and_closes_on_success():
+    clock = FakeClock()
+    stats = ModelStats("m", min_calls=1, cooldown=30, clock=clock)
+    stats.record_failure()
+    assert stats.state == OPEN
+    clock.now = 29
+    assert not stats.available()
+    clock.now = 30
+    assert stats.available()
+    assert stats.state == HALF_OPEN
+    stats.record_success(0.1)
+    assert stats.state == CLOSED
+    assert stats.snapshot()["calls"] == 0, "closing forgets the failures that opened the circuit"
+
+
+def test_half_open_failure_reopens_circuit():
+    clock = FakeClock()
+    stats = ModelStats("m", min_calls=1, cooldown=10, clock=clock)
+    stats.record_failure()
+    clock.now = 10
+    assert stats.available()
+    stats.record_failure()
+    assert stats.state == OPEN
+    assert stats.opened_at == 10
+    assert not stats.available()
+
+
+def test_router_fails_over_and_opens_circuit_of_failing_model():
+    clock = FakeClock()
+    broken, healthy = FakeModel("broken", clock, fail=True), FakeModel("healthy", clock, latency=0.2)
+    router = ModelRouter([("broken", broken), ("healthy", healthy)], clock=clock, min_calls=2)
+    assert router.invoke([]) == "reply from healthy"
+    assert router.invoke([]) == "reply from healthy"
+    assert router.stats()["models"]["broken"]["state"] == OPEN
+    router.invoke([])
+    assert broken.calls == 2, "an open circuit is skipped"
+
+
+def test_router_raises_when_every_circuit_is_open():
+    clock = FakeClock()
+    router = ModelRouter([("a", FakeModel("a", clock, fail=True))], clock=clock, min_calls=1)
+    with pytest.raises(RuntimeError):
+        router.invoke([])
+    with pytest.raises(RuntimeError, match="all circuits are open"):
+        router.invoke([])
+
+
+def test_router_prefers_lowest_median_latency_once_known():
+    clock = FakeClock()
+    slow, fast = FakeModel("slow", clock, latency=2.0), FakeModel("fast", clock, latency=0.1)
+    router = ModelRouter([("slow", slow), ("fast", fast)], clock=clock, min_calls=2)
+    for entry in router.models:
+        for _ in range(2):
+            router._call(entry, [], {})
+    assert [entry[0] for entry in router.candidates()] == ["fast", "slow"]
+    assert router.invoke([]) == "reply from fast"
+
+
+def test_hedge_delay_uses_tail_latency_with_floor():
+    clock = FakeClock()
+    router = ModelRouter([("a", FakeModel("a")), ("b", FakeModel("b"))], hedge=True,
+                         hedge_min_delay=0.5, clock=clock, min_calls=3)
+    stats = router.models[0][2]
+    assert router._hedge_delay(stats) is None, "no hedging until min_calls latencies are known"
+    for latency in (0.1, 0.2, 0.3):
+        stats.record_success(latency)
+    assert router._hedge_delay(stats) == 0.5
+    for latency in (2.0, 2.0, 2.0):
+        stats.record_success(latency)
+    assert router._hedge_delay(stats) == 2.0
+
+
+def test_slow_primary_is_hedged_to_backup():
+    release = threading.Event()
+    slow, backup = FakeModel("slow", block=release), FakeModel("backup")
+    router = ModelRouter([("slow", slow), ("backup", backup)], hedge=True, hedge_min_delay=0.05, min_calls=2)
+    for _ in range(2):
+        router.models[0][2].record_success(0.01)
+    try:
+        assert router.invoke([]) == "reply from backup"
+        assert router.hedges == 1 and router.hedge_wins == 1
+    finally:
+        release.set()
+
+
+def test_fast_primary_is_not_hedged():
+    primary, backup = FakeModel("primary"), FakeModel("backup")
+    router = ModelRouter([("primary", primary), ("backup", backup)], hedge=True, hedge_min_delay=1.0, min_calls=2)
+    for _ in range(2):
+        router.models[0][2].record_success(0.01)
+    assert router.invoke([]) == "reply from primary"
+    assert router.hedges == 0 and backup.calls == 0
+
+
+def test_half_open_admits_a_single_probe():
+    clock = FakeClock()
+    stats = ModelStats("m", min_calls=1, cooldown=10, clock=clock)
+    stats.record_failure()
+    clock.now = 10
+    assert stats.admit()
+    assert not stats.admit() and not stats.available(), "a second caller waits for the probe's outcome"
+    stats.record_success(0.1)
+    assert stats.admit() and stats.admit()
+
+
+def test_concurrent_calls_go_to_fallback_while_probe_is_in_flight():
+    clock = FakeClock()
+    release = threading.Event()
+    recovering, fallback = FakeModel("recovering", block=release), FakeModel("fallback")
+    router = ModelRouter([("recovering", recovering), ("fallback", fallback)], clock=clock, min_calls=1, cooldown=10)
+    router.models[0][2].record_failure()
+    clock.now = 10
+    probe = threading.Thread(target=router.invoke, args=([],))
+    probe.start()
+    try:
+        while recovering.calls == 0:
+            time.sleep(0.001)
+        replies = [router.invoke([]) for _ in range(5)]
+        assert replies == ["reply from fallback"] * 5
+        assert recovering.calls == 1
+    finally:
+        release.set()
+        probe.join()
+    assert router.stats()["models"]["recovering"]["state"] == CLOSED
+
+
+def test_hedge_counters_are_exact_under_concurrency():
+    release = threading.Event()
+    slow, backup = FakeModel("slow", block=release), FakeModel("backup")
+    router = ModelRouter([("slow", slow), ("backup", backup)], hedge=True, hedge_min_delay=0.01,
+                         max_workers=64, min_calls=2)
+    for _ in range(2):
+        router.models[0][2].record_success(0.001)
+    threads = [threading.Thread(target=router.invoke, args=([],)) for _ in range(16)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        release.set()
+    assert router.stats()["hedges"] == 16 and router.stats()["hedge_wins"] == 16
@@ -0,0 +1,69 @@
+"""
+ResilientExecutor against the fake Calendar: hedged reads, adaptive timeouts and backoff
+"""
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from fake_calendar import FakeCalendarService, FaultProfile
+from resilience import CallTimeout, ResilientExecutor
+
+
+def executor(service: FakeCalendarService, **kwargs) -> ResilientExecutor:
+    """Executor whose latency window already holds fast reads, so hedging and timeouts are active"""
+    sleeps = []
+    resilient = ResilientExecutor(lambda request: request.execute(), min_samples=5, sleep=sleeps.append,
+                                  jitter=lambda: 1.0, **kwargs)
+    resilient.latencies.extend([0.01] * 5)
+    resilient.sleeps = sleeps
+    return resilient
+
+
+def list_request(service: FakeCalendarService):
+    return service.events().list(calendarId='primary')
+
+
+def test_slow_read_is_hedged_and_the_duplicate_wins():
+    # Seed 1 makes the first request a latency spike and the second one fast
+    service = FakeCalendarService(FaultProfile(latency=0.0, spike_rate=0.5, spike_latency=0.5, seed=1))
+    resilient = executor(service, hedge_min_delay=0.05)
+    assert resilient.read(list_request(service))['items'] == []
+    stats = resilient.stats()
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+    assert service.faults.requests == 2
+
+
+def test_writes_are_never_hedged():
+    service = FakeCalendarService(FaultProfile(latency=0.2))
+    resilient = executor(service, hedge_min_delay=0.05)
+    body = {'summary': 'Sync', 'start': {'dateTime': '2030-01-07T10:00:00Z'}, 'end': {'dateTime': '2030-01-07T11:00:00Z'}}
+    resilient.write(service.events().insert(calendarId='primary', body=body))
+    assert resilient.stats()['hedges'] == 0
+    assert len(service.events_by_calendar['primary']) == 1 and service.faults.requests == 1
+
+
+def test_read_slower_than_the_adaptive_timeout_is_abandoned():
+    service = FakeCalendarService(FaultProfile(latency=0.5))
+    resilient = executor(service, hedge=False, min_timeout=0.05, max_attempts=1)
+    assert resilient.timeout() == 0.05, "the timeout follows the observed p99, clamped to min_timeout"
+    with pytest.raises(CallTimeout):
+        resilient.read(list_request(service))
+    assert resilient.stats()['timeouts'] == 1
+
+
+def test_transient_errors_back_off_exponentially_then_give_up():
+    service = FakeCalendarService(FaultProfile(latency=0.0, error_rate=1.0, error_status=503))
+    resilient = executor(service, hedge=False, max_attempts=3, base_backoff=0.25)
+    with pytest.raises(HttpError):
+        resilient.read(list_request(service))
+    assert resilient.sleeps == [0.25, 0.5]
+    assert resilient.stats()['retries'] == 2 and resilient.stats()['failures'] == 1
+    assert service.faults.requests == 3
+
+
+def test_client_errors_are_not_retried():
+    service = FakeCalendarService(FaultProfile(latency=0.0, error_rate=1.0, error_status=404))
+    resilient = executor(service, hedge=False)
+    with pytest.raises(HttpError):
+        resilient.read(list_request(service))
+    assert resilient.sleeps == [] and service.faults.requests == 1
@@ -0,0 +1,59 @@
+"""
+Several workers saving their event stores into one snapshot file
+"""
+
+from event_store import EventStore
+from snapshot import Snapshot
+
+JAN_7 = 1893974400.0  # 2030-01-07T00:00:00Z
+
+
+def event(event_id: str, day: int) -> dict:
+    return {'id': event_id, 'summary': event_id,
+            'start': {'dateTime': f'2030-01-{day:02d}T10:00:00Z'}, 'end': {'dateTime': f'2030-01-{day:02d}T11:00:00Z'}}
+
+
+def worker(calendars: dict) -> EventStore:
+    store = EventStore(reader=None)
+    store.load_state(calendars)
+    return store
+
+
+def window(events: list, fetched: float, start: float = JAN_7, days: int = 7) -> dict:
+    return {'events': events, 'sync_token': None, 'complete': False, 'as_of': fetched,
+            'covered': [[start, start + days * 86400, fetched]]}
+
+
+def saved(path) -> dict:
+    restored = EventStore(reader=None)
+    Snapshot(str(path)).load(restored)
+    return restored.export_state()
+
+
+def test_workers_keep_each_others_calendars(tmp_path):
+    path = tmp_path / "snapshot.db"
+    Snapshot(str(path)).save(worker({'team': window([event('a', 7)], fetched=100)}))
+    Snapshot(str(path)).save(worker({'room': window([event('b', 8)], fetched=200)}))
+    calendars = saved(path)
+    assert set(calendars) == {'team', 'room'}
+
+
+def test_newer_window_drops_events_deleted_since(tmp_path):
+    path = tmp_path / "snapshot.db"
+    # The first worker fetched the week with 'gone' in it; the second fetched it after 'gone' was deleted
+    stale = worker({'team': window([event('gone', 7), event('kept', 20)], fetched=100, days=21)})
+    fresh = worker({'team': window([event('new', 8)], fetched=200)})
+    Snapshot(str(path)).save(fresh)
+    Snapshot(str(path)).save(stale)
+    [team] = saved(path).values()
+    assert {e['id'] for e in team['events']} == {'new', 'kept'}
+    assert sorted(w[2] for w in team['covered']) == [100, 200]
+
+
+def test_newer_full_sync_replaces_older_windows(tmp_path):
+    path = tmp_path / "snapshot.db"
+    Snapshot(str(path)).save(worker({'team': window([event('old', 7)], fetched=100)}))
+    synced = {'events': [event('current', 9)], 'sync_token': 'token', 'complete': True, 'as_of': 300, 'covered': []}
+    Snapshot(str(path)).save(worker({'team': synced}))
+    [team] = saved(path).values()
+    assert [e['id'] for e in team['events']] == ['current'] and team['complete']
@@ -0,0 +1,26 @@
+"""
+Short smoke run of scripts/soak.py: the whole backend, fake Calendar and scripted model, without failed requests
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+for module in ("fastapi", "langchain_google_genai", "google_auth_oauthlib", "googleapiclient"):
+    pytest.importorskip(module)
+
+SOAK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "soak.py")
+
+
+def test_short_soak_has_no_failed_requests(tmp_path):
+    # Too short to judge growth or drift; those limits are lifted so only failed requests fail the run
+    result = subprocess.run(
+        [sys.executable, SOAK, "--users", "4", "--duration", "12", "--interval", "2", "--warmup", "2",
+         "--think-time", "0.01", "--model-latency", "0.01", "--calendar-latency", "0.005", "--no-tracemalloc",
+         "--leak-mb-per-hour", "1e9", "--leak-objects-per-hour", "1e12",
+         "--max-throughput-decay", "1", "--max-latency-drift", "1e6"],
+        cwd=tmp_path, capture_output=True, text=True, timeout=180)
+    assert result.returncode == 0, result.stdout[-3000:] + result.stderr[-3000:]
+    assert "Summary (0 requests)" not in result.stdout
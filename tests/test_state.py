@@ -0,0 +1,76 @@
+"""
+StateStore over every backend, with Redis served by the local RESP stand-in
+"""
+
+import time
+
+import pytest
+
+from fake_redis import serve
+from state import RESPClient, RedisBackend, StateStore, create_backend
+
+
+@pytest.fixture(scope="module")
+def redis_server():
+    server = serve()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend_factory(request, tmp_path, redis_server):
+    """Returns a function opening another handle on the same storage, as a second worker would"""
+    if request.param == "memory":
+        backend = create_backend("memory://")
+        return lambda: backend
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path}/state.db"
+    else:
+        db = len(redis_server.databases) + 1
+        url = f"redis://localhost:{redis_server.server_address[1]}/{db}"
+    return lambda: create_backend(url)
+
+
+def test_write_by_one_worker_is_seen_by_another(backend_factory):
+    worker_a, worker_b = StateStore(backend_factory()), StateStore(backend_factory())
+    history = [["human", f"message {i} " * 20] for i in range(30)]
+    worker_a.set("chat:demo", history)
+    assert worker_b.get("chat:demo") == history
+    worker_b.set("chat:demo", history + [["ai", "reply"]])
+    assert worker_a.get("chat:demo")[-1] == ["ai", "reply"], "stale read after another worker's write"
+    worker_a.delete("chat:demo")
+    assert worker_b.get("chat:demo") is None
+
+
+def test_unchanged_value_is_served_from_the_local_cache(backend_factory):
+    store = StateStore(backend_factory())
+    store.set("k", {"a": 1})
+    fresh = StateStore(backend_factory())
+    assert fresh.get("k") == {"a": 1} and fresh.get("k") == {"a": 1}
+    assert fresh.stats()["misses"] == 1 and fresh.stats()["hits"] == 1
+
+
+def test_count_ignores_version_keys(backend_factory):
+    store = StateStore(backend_factory())
+    for i in range(3):
+        store.set(f"idempotency:k{i}", i)
+    store.set("idempotency:event:e1", "k1")
+    store.set("other", 1)
+    assert store.count("idempotency:") == 4
+    assert store.count("idempotency:event:") == 1
+
+
+def test_values_expire_with_the_store_ttl(backend_factory):
+    store = StateStore(backend_factory(), ttl=0.05)
+    store.set("short", "lived")
+    time.sleep(0.1)
+    assert StateStore(backend_factory()).get("short") is None
+
+
+def test_redis_client_reconnects_after_the_connection_drops(redis_server):
+    client = RESPClient("localhost", redis_server.server_address[1])
+    store = StateStore(RedisBackend(client))
+    store.set("k", "v")
+    client._local.sock.close()
+    assert store.get("k") == "v"